@@ -0,0 +1,146 @@
+"""
+Кэш ответов LLM по хэшу промпта: LRU в памяти контейнера + таблица ai_completion_cache в PostgreSQL
+"""
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from psycopg2.extras import execute_values
+
+# Сколько дней ответ LLM считается актуальным
+TTL_DAYS = int(os.environ.get('AI_CACHE_TTL_DAYS', '30'))
+# Размер LRU в памяти тёплого контейнера (0 — отключить)
+MEMORY_SIZE = int(os.environ.get('AI_CACHE_MEMORY_SIZE', '256'))
+
+_memory = OrderedDict()
+
+
+def make_key(model: str, system_prompt: str, title: str, content: str, source_url: str, temperature: float) -> str:
+    """Хэш всех параметров, от которых зависит ответ модели"""
+    raw = json.dumps(
+        [model, system_prompt, title, content, source_url, temperature],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _remember(key: str, completion: str, ttl_seconds: float):
+    if MEMORY_SIZE <= 0 or ttl_seconds <= 0:
+        return
+    # Запись в памяти живёт не дольше строки в БД: AI_CACHE_TTL_DAYS от её создания
+    _memory[key] = (completion, time.monotonic() + ttl_seconds)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_SIZE:
+        _memory.popitem(last=False)
+
+
+def lookup(conn, schema: str, keys: list) -> dict:
+    """Найти готовые ответы: сначала в памяти, затем в БД; попадания в память тоже учитываются в hit_count"""
+    found = {}
+    now = time.monotonic()
+    for key in keys:
+        entry = _memory.get(key)
+        if entry is None:
+            continue
+        completion, expires_at = entry
+        if expires_at <= now:
+            del _memory[key]
+            continue
+        _memory.move_to_end(key)
+        found[key] = completion
+
+    if not keys:
+        return found
+
+    # Один запрос на все ключи: попаданиям в память — только счётчик, промахам — ещё и текст ответа
+    missing = [key for key in keys if key not in found]
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {schema}.ai_completion_cache
+        SET hit_count = hit_count + 1, last_hit_at = NOW()
+        WHERE prompt_hash = ANY(%(keys)s)
+          AND created_at > NOW() - make_interval(days => %(ttl_days)s)
+        RETURNING prompt_hash,
+                  CASE WHEN prompt_hash = ANY(%(missing)s) THEN completion END,
+                  EXTRACT(EPOCH FROM created_at + make_interval(days => %(ttl_days)s) - NOW())
+    """, {'keys': list(keys), 'missing': missing, 'ttl_days': TTL_DAYS})
+    for prompt_hash, completion, ttl_seconds in cursor.fetchall():
+        if completion is not None:
+            found[prompt_hash] = completion
+            _remember(prompt_hash, completion, float(ttl_seconds))
+    cursor.close()
+
+    return found
+
+
+def store(conn, schema: str, entries: list):
+    """Сохранить новые ответы: список (key, model, completion, usage)"""
+    if not entries:
+        return
+
+    for key, _, completion, _ in entries:
+        _remember(key, completion, TTL_DAYS * 86400)
+
+    cursor = conn.cursor()
+    execute_values(
+        cursor,
+        f"""
+            INSERT INTO {schema}.ai_completion_cache
+            (prompt_hash, model, completion, prompt_tokens, completion_tokens)
+            VALUES %s
+            ON CONFLICT (prompt_hash) DO UPDATE
+            SET completion = EXCLUDED.completion,
+                prompt_tokens = EXCLUDED.prompt_tokens,
+                completion_tokens = EXCLUDED.completion_tokens,
+                created_at = NOW()
+        """,
+        [
+            (key, model, completion, usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+            for key, model, completion, usage in entries
+        ]
+    )
+    cursor.close()
+
+
+def record_run(conn, schema: str, hits: int, misses: int):
+    """Учесть попадания/промахи запуска и удалить устаревшие ответы"""
+    cursor = conn.cursor()
+    execute_values(
+        cursor,
+        f"""
+            INSERT INTO {schema}.ai_cache_counters (name, value)
+            VALUES %s
+            ON CONFLICT (name) DO UPDATE
+            SET value = {schema}.ai_cache_counters.value + EXCLUDED.value
+        """,
+        [('hits', hits), ('misses', misses)]
+    )
+    cursor.execute(f"""
+        DELETE FROM {schema}.ai_completion_cache
+        WHERE created_at < NOW() - make_interval(days => %s)
+    """, (TTL_DAYS,))
+    cursor.close()
+
+
+def get_stats(conn, schema: str) -> dict:
+    """Статистика кэша для get_agent_stats"""
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT name, value FROM {schema}.ai_cache_counters")
+    counters = {row[0]: row[1] for row in cursor.fetchall()}
+
+    cursor.execute(f"""
+        SELECT COUNT(*), COALESCE(SUM(hit_count * (prompt_tokens + completion_tokens)), 0)
+        FROM {schema}.ai_completion_cache
+    """)
+    entries, tokens_saved = cursor.fetchone()
+    cursor.close()
+
+    return {
+        'hits': counters.get('hits', 0),
+        'misses': counters.get('misses', 0),
+        'entries': entries,
+        'tokens_saved': int(tokens_saved),
+        'memory_entries': len(_memory)
+    }
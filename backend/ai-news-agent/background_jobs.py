@@ -0,0 +1,178 @@
+"""
+Фоновые запуски долгих задач: постановка, захват исполнителем, прогресс по стадиям и long-poll статуса
+"""
+import json
+import os
+import socket
+import time
+import uuid
+from typing import Optional
+
+import requests
+from psycopg2.extras import RealDictCursor
+
+import db_pool
+
+# Сколько раз запуск можно начать заново после падения исполнителя (истекла аренда)
+MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', '2'))
+# Дольше этого GET не держит соединение в ожидании изменений
+MAX_WAIT_SECONDS = int(os.environ.get('JOBS_MAX_WAIT_SECONDS', '25'))
+# Как часто long-poll перечитывает строку запуска
+POLL_INTERVAL_SECONDS = 0.5
+# Прогресс пишется в БД не чаще этого интервала (и всегда при смене стадии)
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+FINISHED = ('succeeded', 'failed')
+COLUMNS = 'id, kind, status, stage, progress, result, error, version, attempts, created_at, started_at, finished_at'
+
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def create(conn, schema: str, kind: str, params: dict) -> str:
+    """Поставить запуск в очередь и вернуть его id"""
+    job_id = uuid.uuid4().hex
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {schema}.background_jobs (id, kind, params)
+        VALUES (%s, %s, %s)
+    """, (job_id, kind, json.dumps(params, ensure_ascii=False)))
+    conn.commit()
+    cursor.close()
+    return job_id
+
+
+def trigger(url: str, job_id: str):
+    """Запустить исполнителя отдельным вызовом функции, не дожидаясь ответа
+
+    Если вызов не дошёл, запуск останется в очереди, и его заберёт планировщик.
+    """
+    try:
+        requests.post(url, json={'action': 'work', 'job_id': job_id}, timeout=(3, 0.5))
+    except requests.exceptions.ReadTimeout:
+        pass
+    except requests.RequestException as e:
+        print(f'[Jobs] trigger {job_id} failed: {e}')
+
+
+def claim(conn, schema: str, kinds: list, lease_seconds: int, job_id: Optional[str] = None) -> Optional[dict]:
+    """Захватить один ожидающий запуск (или брошенный с истёкшей арендой); None — брать нечего"""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+    # Исчерпавшие попытки после падений исполнителя больше не перезапускаются
+    cursor.execute(f"""
+        UPDATE {schema}.background_jobs
+        SET status = 'failed', error = 'Worker lease expired', finished_at = NOW(),
+            locked_by = NULL, locked_until = NULL, version = version + 1, updated_at = NOW()
+        WHERE status = 'running' AND locked_until < NOW() AND attempts >= %s
+    """, (MAX_ATTEMPTS,))
+
+    cursor.execute(f"""
+        UPDATE {schema}.background_jobs
+        SET status = 'running', attempts = attempts + 1, started_at = COALESCE(started_at, NOW()),
+            locked_by = %(worker)s, locked_until = NOW() + make_interval(secs => %(lease)s),
+            version = version + 1, updated_at = NOW()
+        WHERE id = (
+            SELECT id FROM {schema}.background_jobs
+            WHERE (status = 'queued' OR (status = 'running' AND locked_until < NOW()))
+              AND kind = ANY(%(kinds)s)
+              AND (%(job_id)s::text IS NULL OR id = %(job_id)s)
+            ORDER BY created_at
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, kind, params, attempts
+    """, {'worker': WORKER_ID, 'lease': lease_seconds, 'kinds': kinds, 'job_id': job_id})
+    job = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+
+    if job and isinstance(job['params'], str):
+        job['params'] = json.loads(job['params'])
+    return job
+
+
+def report_progress(database_url: str, schema: str, job_id: str, stage: Optional[str], progress: dict):
+    """Записать текущий отчёт стадий; пишет только владелец аренды"""
+    conn = db_pool.getconn(database_url)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {schema}.background_jobs
+        SET stage = %s, progress = %s, version = version + 1, updated_at = NOW()
+        WHERE id = %s AND locked_by = %s
+    """, (stage, json.dumps(progress, ensure_ascii=False, default=str), job_id, WORKER_ID))
+    conn.commit()
+    cursor.close()
+    db_pool.putconn(conn)
+
+
+def complete(database_url: str, schema: str, job_id: str, result: Optional[dict], error: Optional[str] = None):
+    """Завершить запуск результатом или ошибкой"""
+    conn = db_pool.getconn(database_url)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {schema}.background_jobs
+        SET status = %s, stage = NULL, result = %s, error = %s, finished_at = NOW(),
+            locked_by = NULL, locked_until = NULL, version = version + 1, updated_at = NOW()
+        WHERE id = %s AND locked_by = %s
+    """, (
+        'failed' if error else 'succeeded',
+        json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+        error,
+        job_id,
+        WORKER_ID
+    ))
+    conn.commit()
+    cursor.close()
+    db_pool.putconn(conn)
+
+
+def progress_reporter(database_url: str, schema: str, job_id: str):
+    """Колбэк для pipeline.Pipeline: пишет прогресс не чаще PROGRESS_INTERVAL_SECONDS и при смене стадии"""
+    state = {'written_at': 0.0, 'stage': None}
+
+    def on_progress(stage: Optional[str], report: dict):
+        now = time.monotonic()
+        if stage == state['stage'] and now - state['written_at'] < PROGRESS_INTERVAL_SECONDS:
+            return
+        state.update({'written_at': now, 'stage': stage})
+        report_progress(database_url, schema, job_id, stage, report)
+
+    return on_progress
+
+
+def execute(database_url: str, schema: str, job: dict, runners: dict, context) -> dict:
+    """Выполнить захваченный запуск: runners — kind → функция(params, context, on_progress)"""
+    on_progress = progress_reporter(database_url, schema, job['id'])
+    try:
+        result = runners[job['kind']](job['params'] or {}, context, on_progress)
+    except Exception as e:
+        result = {'success': False, 'error': f'{type(e).__name__}: {e}'}
+    error = None if result.get('success', True) else (result.get('error') or 'Job failed')
+    complete(database_url, schema, job['id'], result, error)
+    return result
+
+
+def fetch(conn, schema: str, job_id: str) -> Optional[dict]:
+    """Текущее состояние запуска"""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"SELECT {COLUMNS} FROM {schema}.background_jobs WHERE id = %s", (job_id,))
+    job = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    return job
+
+
+def wait_for(database_url: str, schema: str, job_id: str, version: Optional[int], timeout: float) -> Optional[dict]:
+    """Long-poll: вернуть запуск, как только он завершится, его версия станет новее version или выйдет timeout"""
+    deadline = time.monotonic() + max(0.0, min(timeout, MAX_WAIT_SECONDS))
+    conn = db_pool.getconn(database_url)
+    try:
+        while True:
+            job = fetch(conn, schema, job_id)
+            if job is None or job['status'] in FINISHED or (version is not None and job['version'] > version):
+                return job
+            if time.monotonic() + POLL_INTERVAL_SECONDS > deadline:
+                return job
+            time.sleep(POLL_INTERVAL_SECONDS)
+    finally:
+        db_pool.putconn(conn)
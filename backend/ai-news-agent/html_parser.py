@@ -0,0 +1,84 @@
+"""
+Разбор HTML с выбором движка: lxml, selectolax или встроенный html.parser как запасной вариант
+"""
+import os
+from typing import List, Optional
+
+# Предпочитаемый движок; если он не установлен, используется html.parser
+BACKEND = os.environ.get('HTML_PARSER_BACKEND', 'lxml')
+
+BACKENDS = ('lxml', 'selectolax', 'html.parser')
+
+
+class SoupNode:
+    """Узел документа BeautifulSoup (движки lxml и html.parser)"""
+
+    def __init__(self, node):
+        self._node = node
+
+    def select(self, css: str) -> List['SoupNode']:
+        return [SoupNode(node) for node in self._node.select(css)]
+
+    def select_one(self, css: str) -> Optional['SoupNode']:
+        node = self._node.select_one(css)
+        return SoupNode(node) if node is not None else None
+
+    def text(self) -> str:
+        return self._node.get_text(strip=True)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self._node.get(name)
+
+
+class SelectolaxNode:
+    """Узел документа selectolax (Lexbor)"""
+
+    def __init__(self, node):
+        self._node = node
+
+    def select(self, css: str) -> List['SelectolaxNode']:
+        return [SelectolaxNode(node) for node in self._node.css(css)]
+
+    def select_one(self, css: str) -> Optional['SelectolaxNode']:
+        node = self._node.css_first(css)
+        return SelectolaxNode(node) if node is not None else None
+
+    def text(self) -> str:
+        return self._node.text(strip=True)
+
+    def attr(self, name: str) -> Optional[str]:
+        return self._node.attributes.get(name)
+
+
+def is_available(backend: str) -> bool:
+    """Установлен ли движок в текущем окружении"""
+    try:
+        if backend == 'lxml':
+            import lxml  # noqa: F401
+        elif backend == 'selectolax':
+            import selectolax.lexbor  # noqa: F401
+        else:
+            import bs4  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def resolve_backend(backend: Optional[str] = None) -> str:
+    """Выбранный движок или html.parser, если выбранный не установлен"""
+    backend = backend or BACKEND
+    if backend in BACKENDS and is_available(backend):
+        return backend
+    return 'html.parser'
+
+
+def parse(markup: str, backend: Optional[str] = None):
+    """Разбор HTML в корневой узел с методами select / select_one / text / attr"""
+    backend = resolve_backend(backend)
+
+    if backend == 'selectolax':
+        from selectolax.lexbor import LexborHTMLParser
+        return SelectolaxNode(LexborHTMLParser(markup))
+
+    from bs4 import BeautifulSoup
+    return SoupNode(BeautifulSoup(markup, backend))
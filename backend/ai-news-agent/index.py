@@ -3,11 +3,21 @@
 """
 import json
 import os
-from datetime import datetime
-import requests
-import psycopg2
+import time
+import ai_cache
+import background_jobs
+import db_pool
+import news_agent
 from psycopg2.extras import RealDictCursor
 
+# Адрес этой же функции: фоновый запуск выполняет отдельный её вызов
+SELF_URL = os.environ.get('AI_NEWS_AGENT_URL', 'https://functions.poehali.dev/c42f2362-0697-4b7f-acd6-202c45772cba')
+
+# Фоновые запуски, которые умеет выполнять эта функция
+JOB_RUNNERS = {
+    'auto_pipeline': news_agent.run_pipeline_job
+}
+
 
 def handler(event: dict, context) -> dict:
     """ИИ-агент для автоматической обработки и публикации новостей"""
@@ -19,7 +29,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, Prefer'
             },
             'body': ''
         }
@@ -34,13 +44,19 @@ def handler(event: dict, context) -> dict:
         
         if action == 'process':
             # Обрабатываем черновики новостей через ИИ
-            result = process_draft_news()
+            result = news_agent.process_draft_news(context)
         elif action == 'publish':
             # Публикуем готовые новости
-            result = publish_news()
+            result = news_agent.publish_news(context)
+        elif action == 'auto' and wants_async(event, body):
+            # Фоновый запуск: сразу 202 с id, статус и прогресс — через GET ?job_id=
+            return start_background_job('auto_pipeline', {'force': bool(body.get('force'))})
         elif action == 'auto':
-            # Полный цикл: парсинг → обработка → публикация
-            result = auto_pipeline()
+            # Полный цикл в этом же процессе: парсинг → обработка → публикация
+            result = news_agent.auto_pipeline(context, force=bool(body.get('force')))
+        elif action == 'work':
+            # Вызов-исполнитель фонового запуска
+            result = run_background_job(body.get('job_id'), context)
         elif action == 'migrate':
             # Применение миграции БД
             result = apply_migration()
@@ -57,6 +73,10 @@ def handler(event: dict, context) -> dict:
         }
     
     if method == 'GET':
+        params = event.get('queryStringParameters') or {}
+        if params.get('job_id'):
+            return get_background_job(params, context)
+        
         # Получаем статистику агента
         stats = get_agent_stats()
         return {
@@ -78,301 +98,90 @@ def handler(event: dict, context) -> dict:
     }
 
 
-def process_draft_news():
-    """Обработка черновиков через ИИ"""
+def wants_async(event: dict, body: dict) -> bool:
+    """Клиент просит фоновый запуск: {"async": true} или заголовок Prefer: respond-async"""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return bool(body.get('async')) or 'respond-async' in headers.get('prefer', '')
+
+
+def start_background_job(kind: str, params: dict) -> dict:
+    """Поставить фоновый запуск, разбудить исполнителя и сразу ответить 202"""
     database_url = os.environ.get('DATABASE_URL')
-    api_key = os.environ.get('POLZA_AI_API_KEY')
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     
-    if not database_url or not api_key:
-        return {'success': False, 'error': 'Missing credentials'}
-    
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Получаем черновики (прямая интерполяция схемы из env)
-    query = f"SELECT id, title, content, source_url, image_url FROM {schema}.news_articles WHERE status = 'draft' ORDER BY created_at DESC LIMIT 5"
-    cursor.execute(query)
-    
-    drafts = cursor.fetchall()
-    processed = 0
+    conn = db_pool.getconn(database_url)
+    job_id = background_jobs.create(conn, schema, kind, params)
+    db_pool.putconn(conn)
     
-    for draft in drafts:
-        # Улучшаем контент через ИИ
-        improved = improve_content_with_ai(
-            draft['title'],
-            draft['content'],
-            draft['source_url'],
-            api_key
-        )
-        
-        if improved:
-            # Обновляем статью
-            query = f"UPDATE {schema}.news_articles SET content = %s, status = 'ready', updated_at = %s WHERE id = %s"
-            cursor.execute(query, (improved, datetime.now(), draft['id']))
-            processed += 1
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
+    background_jobs.trigger(SELF_URL, job_id)
     
+    status_url = f'{SELF_URL}?job_id={job_id}'
     return {
-        'success': True,
-        'processed': processed,
-        'total_drafts': len(drafts)
+        'statusCode': 202,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Location': status_url
+        },
+        'body': json.dumps({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
     }
 
 
-def improve_content_with_ai(title, content, source_url, api_key):
-    """Улучшение контента через ChatGPT"""
-    try:
-        response = requests.post(
-            'https://api.polza.ai/chat/completions',
-            headers={
-                'Authorization': f'Bearer {api_key}',
-                'Content-Type': 'application/json'
-            },
-            json={
-                'model': 'openai/gpt-4o-mini',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': 'Ты - редактор новостного канала для бизнеса. Перепиши короткое описание продукта в интересную новость для Telegram-канала. Добавь эмодзи, сделай текст живым и привлекательным. Максимум 3-4 предложения.'
-                    },
-                    {
-                        'role': 'user',
-                        'content': f"Заголовок: {title}\n\nОписание: {content}\n\nСсылка: {source_url}"
-                    }
-                ],
-                'temperature': 0.7,
-                'max_tokens': 300
-            },
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            return data['choices'][0]['message']['content']
-        
-        return None
-        
-    except Exception:
-        return None
-
-
-def publish_news():
-    """Публикация готовых новостей в Telegram и VK"""
+def run_background_job(job_id, context):
+    """Выполнить поставленный фоновый запуск в этом вызове"""
     database_url = os.environ.get('DATABASE_URL')
-    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-    channel_id = os.environ.get('TELEGRAM_CHANNEL_ID')
-    vk_token = os.environ.get('VK_ACCESS_TOKEN')
-    vk_group_id = os.environ.get('VK_GROUP_ID')
     schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     
-    if not all([database_url, bot_token, channel_id]):
-        return {'success': False, 'error': 'Missing Telegram credentials'}
-    
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    # Получаем готовые к публикации новости
-    query = f"SELECT id, title, content, source_url, image_url FROM {schema}.news_articles WHERE status = 'ready' ORDER BY created_at DESC LIMIT 3"
-    cursor.execute(query)
+    lease_seconds = max(60, int(news_agent.run_deadline(context) - time.monotonic()) + news_agent.DEADLINE_MARGIN_SECONDS)
+    conn = db_pool.getconn(database_url)
+    job = background_jobs.claim(conn, schema, list(JOB_RUNNERS), lease_seconds, job_id)
+    db_pool.putconn(conn)
     
-    ready_news = cursor.fetchall()
-    published_tg = 0
-    published_vk = 0
+    if job is None:
+        return {'success': False, 'error': 'Job not found or already running'}
     
-    for news in ready_news:
-        # Публикуем в Telegram
-        tg_success = send_to_telegram(
-            news['title'],
-            news['content'],
-            news['source_url'],
-            news['image_url'],
-            bot_token,
-            channel_id
-        )
-        
-        if tg_success:
-            published_tg += 1
-        
-        # Публикуем в VK (если настроен)
-        vk_success = False
-        if vk_token and vk_group_id:
-            vk_success = send_to_vk(
-                news['title'],
-                news['content'],
-                news['source_url'],
-                news['image_url'],
-                vk_token,
-                vk_group_id
-            )
-            if vk_success:
-                published_vk += 1
-        
-        # Обновляем статус если хотя бы в одну площадку опубликовали
-        if tg_success or vk_success:
-            query = f"UPDATE {schema}.news_articles SET status = 'published', published_at = %s, updated_at = %s WHERE id = %s"
-            cursor.execute(query, (datetime.now(), datetime.now(), news['id']))
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    return {
-        'success': True,
-        'published_telegram': published_tg,
-        'published_vk': published_vk,
-        'total_ready': len(ready_news)
-    }
+    return background_jobs.execute(database_url, schema, job, JOB_RUNNERS, context)
 
 
-def send_to_telegram(title, content, source_url, image_url, bot_token, channel_id):
-    """Отправка новости в Telegram-канал"""
-    try:
-        message = f"<b>{title}</b>\n\n{content}"
-        
-        if source_url:
-            message += f"\n\n🔗 <a href='{source_url}'>Подробнее</a>"
-        
-        # Если есть изображение - отправляем с фото
-        if image_url:
-            requests.post(
-                f'https://api.telegram.org/bot{bot_token}/sendPhoto',
-                data={
-                    'chat_id': channel_id,
-                    'photo': image_url,
-                    'caption': message,
-                    'parse_mode': 'HTML'
-                },
-                timeout=10
-            )
-        else:
-            # Иначе только текст
-            requests.post(
-                f'https://api.telegram.org/bot{bot_token}/sendMessage',
-                json={
-                    'chat_id': channel_id,
-                    'text': message,
-                    'parse_mode': 'HTML',
-                    'disable_web_page_preview': False
-                },
-                timeout=10
-            )
-        
-        return True
-        
-    except Exception:
-        return False
-
-
-def send_to_vk(title, content, source_url, image_url, access_token, group_id):
-    """Отправка новости в VK-сообщество"""
-    try:
-        message = f"{title}\n\n{content}"
-        
-        if source_url:
-            message += f"\n\n🔗 Подробнее: {source_url}"
-        
-        attachments = []
-        
-        # Если есть изображение - загружаем на сервер VK
-        if image_url:
-            # 1. Получаем адрес сервера для загрузки
-            upload_server_response = requests.get(
-                'https://api.vk.com/method/photos.getWallUploadServer',
-                params={
-                    'access_token': access_token,
-                    'group_id': group_id,
-                    'v': '5.131'
-                },
-                timeout=10
-            ).json()
-            
-            if 'response' in upload_server_response:
-                upload_url = upload_server_response['response']['upload_url']
-                
-                # 2. Скачиваем изображение
-                image_data = requests.get(image_url, timeout=10).content
-                
-                # 3. Загружаем на сервер VK
-                upload_response = requests.post(
-                    upload_url,
-                    files={'photo': ('image.jpg', image_data, 'image/jpeg')},
-                    timeout=10
-                ).json()
-                
-                # 4. Сохраняем фото
-                save_response = requests.get(
-                    'https://api.vk.com/method/photos.saveWallPhoto',
-                    params={
-                        'access_token': access_token,
-                        'group_id': group_id,
-                        'photo': upload_response['photo'],
-                        'server': upload_response['server'],
-                        'hash': upload_response['hash'],
-                        'v': '5.131'
-                    },
-                    timeout=10
-                ).json()
-                
-                if 'response' in save_response and len(save_response['response']) > 0:
-                    photo = save_response['response'][0]
-                    attachments.append(f"photo{photo['owner_id']}_{photo['id']}")
-        
-        # Публикуем пост
-        post_params = {
-            'access_token': access_token,
-            'owner_id': f'-{group_id}',
-            'from_group': 1,
-            'message': message,
-            'v': '5.131'
-        }
-        
-        if attachments:
-            post_params['attachments'] = ','.join(attachments)
-        
-        post_response = requests.post(
-            'https://api.vk.com/method/wall.post',
-            data=post_params,
-            timeout=10
-        ).json()
-        
-        return 'response' in post_response
-        
-    except Exception:
-        return False
-
-
-def auto_pipeline():
-    """Полный автоматический цикл обработки новостей"""
-    results = {
-        'scrape': None,
-        'process': None,
-        'publish': None
-    }
+def get_background_job(params: dict, context) -> dict:
+    """Статус фонового запуска; wait=N держит запрос до N секунд, пока не появится версия новее version"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
     
-    # 1. Парсим новости
     try:
-        scraper_response = requests.post(
-            'https://functions.poehali.dev/news-scraper',
-            timeout=30
-        )
-        if scraper_response.status_code == 200:
-            results['scrape'] = scraper_response.json()
-    except Exception as e:
-        results['scrape'] = {'error': str(e)}
+        wait_seconds = float(params.get('wait') or 0)
+        version = int(params['version']) if params.get('version') not in (None, '') else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'wait and version must be numbers'})
+        }
     
-    # 2. Обрабатываем через ИИ
-    results['process'] = process_draft_news()
+    # Ожидание не переживает таймаут самого вызова
+    wait_seconds = min(wait_seconds, news_agent.run_deadline(context) - time.monotonic())
+    job = background_jobs.wait_for(database_url, schema, params['job_id'], version, wait_seconds)
     
-    # 3. Публикуем
-    results['publish'] = publish_news()
+    if job is None:
+        return {
+            'statusCode': 404,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Job not found'})
+        }
     
     return {
-        'success': True,
-        'pipeline': results
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(job, ensure_ascii=False, default=str)
     }
 
 
@@ -384,22 +193,25 @@ def get_agent_stats():
     if not database_url:
         return {'error': 'Database not configured'}
     
-    conn = psycopg2.connect(database_url)
+    conn = db_pool.getconn(database_url)
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     query = f"SELECT status, COUNT(*) as count FROM {schema}.news_articles GROUP BY status"
     cursor.execute(query)
     
     stats = {row['status']: row['count'] for row in cursor.fetchall()}
+    cache_stats = ai_cache.get_stats(conn, schema)
     
     cursor.close()
-    conn.close()
+    db_pool.putconn(conn)
     
     return {
         'drafts': stats.get('draft', 0),
         'ready': stats.get('ready', 0),
+        'in_progress': stats.get('processing', 0) + stats.get('publishing', 0),
         'published': stats.get('published', 0),
-        'total': sum(stats.values())
+        'total': sum(stats.values()),
+        'ai_cache': cache_stats
     }
 
 
@@ -428,7 +240,7 @@ def apply_migration():
     """
     
     try:
-        conn = psycopg2.connect(database_url)
+        conn = db_pool.getconn(database_url)
         cursor = conn.cursor()
         
         # Выполняем миграцию
@@ -446,7 +258,7 @@ def apply_migration():
         table_exists = cursor.fetchone()[0] > 0
         
         cursor.close()
-        conn.close()
+        db_pool.putconn(conn)
         
         if table_exists:
             return {
@@ -0,0 +1,86 @@
+"""
+HyperLogLog: приблизительный подсчёт уникальных пользователей с объединением скетчей по дням
+"""
+import hashlib
+import math
+import struct
+from typing import Iterable, Optional
+
+# 2^12 регистров: стандартная ошибка около 1.6%
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+
+FORMAT_DENSE = 1
+FORMAT_SPARSE = 2
+
+
+def _hash(value) -> int:
+    return int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), 'big')
+
+
+class HLL:
+    """Скетч из REGISTERS регистров; объединение — поэлементный максимум"""
+
+    def __init__(self, registers: Optional[bytearray] = None):
+        self.registers = registers if registers is not None else bytearray(REGISTERS)
+
+    def add(self, value):
+        h = _hash(value)
+        index = h >> (64 - PRECISION)
+        rest = h & ((1 << (64 - PRECISION)) - 1)
+        rank = (64 - PRECISION) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HLL'):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Поправка для малых кардинальностей (linear counting)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        """Разреженный формат (индекс, значение), пока он короче плотного"""
+        filled = [(i, r) for i, r in enumerate(self.registers) if r]
+        if len(filled) * 3 < REGISTERS:
+            return bytes([FORMAT_SPARSE, PRECISION]) + b''.join(struct.pack('>HB', i, r) for i, r in filled)
+        return bytes([FORMAT_DENSE, PRECISION]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data) -> 'HLL':
+        data = bytes(data)
+        if data[1] != PRECISION:
+            raise ValueError(f'Unsupported sketch precision {data[1]}')
+        if data[0] == FORMAT_DENSE:
+            return cls(bytearray(data[2:]))
+        registers = bytearray(REGISTERS)
+        for i, r in struct.iter_unpack('>HB', data[2:]):
+            registers[i] = r
+        return cls(registers)
+
+
+def merge_all(sketches: Iterable) -> HLL:
+    """Объединение сериализованных скетчей (например, за диапазон дат)"""
+    result = HLL()
+    registers = result.registers
+    for data in sketches:
+        data = bytes(data)
+        if data[0] == FORMAT_SPARSE and data[1] == PRECISION:
+            # Дневные скетчи обычно разреженные: обновляются только заполненные регистры
+            for i, r in struct.iter_unpack('>HB', data[2:]):
+                if r > registers[i]:
+                    registers[i] = r
+        else:
+            result.merge(HLL.from_bytes(data))
+            registers = result.registers
+    return result
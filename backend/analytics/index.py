@@ -1,10 +1,58 @@
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import db_pool
+import hll
+import partitions
+import recommendations
+import rollups
+from psycopg2.extras import RealDictCursor, execute_values
 from datetime import datetime, timedelta
 
 DSN = os.environ.get('DATABASE_URL')
+# Максимум событий в одном пакетном запросе
+MAX_BATCH_EVENTS = int(os.environ.get('ANALYTICS_MAX_BATCH_EVENTS', '500'))
+# Окно по умолчанию для списков последних действий, чтобы читались только свежие партиции
+RECENT_DAYS = int(os.environ.get('ANALYTICS_RECENT_DAYS', '90'))
+# Сколько последних просмотренных элементов клиента используется как основа рекомендаций
+RECOMMENDATION_SEEDS = int(os.environ.get('RECOMMENDATION_SEEDS', '20'))
+
+EVENT_ID_FIELDS = ('user_id', 'service_id', 'partner_offer_id')
+
+
+def validate_event(event_data) -> str:
+    '''Проверка одного события из пакета, возвращает текст ошибки или пустую строку'''
+    if not isinstance(event_data, dict):
+        return 'Event must be an object'
+    if not isinstance(event_data.get('action_type'), str) or not event_data['action_type']:
+        return 'action_type is required'
+    for field in EVENT_ID_FIELDS:
+        value = event_data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int)):
+            return f'{field} must be an integer'
+    if not isinstance(event_data.get('metadata', {}), dict):
+        return 'metadata must be an object'
+    return ''
+
+
+def parse_day(value):
+    '''Дата YYYY-MM-DD из параметра запроса или None'''
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def event_row(event_data: dict) -> tuple:
+    return (
+        event_data.get('user_id'),
+        event_data.get('action_type'),
+        event_data.get('action_description'),
+        event_data.get('page_url'),
+        event_data.get('service_id'),
+        event_data.get('partner_offer_id'),
+        json.dumps(event_data.get('metadata', {})),
+        event_data.get('ip_address'),
+        event_data.get('user_agent')
+    )
 
 def handler(event: dict, context) -> dict:
     '''API для аналитики действий клиентов и формирования рекомендаций'''
@@ -22,7 +70,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(DSN)
+        conn = db_pool.getconn(DSN)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
@@ -31,8 +79,40 @@ def handler(event: dict, context) -> dict:
             action_type = query_params.get('type')
             report_type = query_params.get('report')
             
+            # Отчёты читают агрегаты; ?fresh=1 добавляет ещё не свёрнутый хвост user_actions
+            fresh = query_params.get('fresh') == '1'
+            watermark, since = rollups.get_watermark(cur) if fresh else (0, None)
+            tail = {'fresh': fresh, 'watermark': watermark, 'since': since}
+            
             if report_type == 'user_profile':
-                cur.execute('''
+                params = {**tail, 'user_id': user_id}
+                user_actions_cte = '''
+                    WITH actions AS (
+                        SELECT action_type, actions, last_action_at
+                        FROM t_p81470733_business_helper_app.user_actions_daily
+                        WHERE user_id = %(user_id)s
+                        UNION ALL
+                        SELECT action_type, 1, created_at
+                        FROM t_p81470733_business_helper_app.user_actions
+                        WHERE %(fresh)s AND id > %(watermark)s AND created_at >= %(since)s AND user_id = %(user_id)s
+                    ), items AS (
+                        SELECT item_type, item_id, views
+                        FROM t_p81470733_business_helper_app.user_item_views
+                        WHERE user_id = %(user_id)s
+                        UNION ALL
+                        SELECT 'service', service_id, 1
+                        FROM t_p81470733_business_helper_app.user_actions
+                        WHERE %(fresh)s AND id > %(watermark)s AND created_at >= %(since)s AND user_id = %(user_id)s
+                          AND action_type = 'view_service' AND service_id IS NOT NULL
+                        UNION ALL
+                        SELECT 'offer', partner_offer_id, 1
+                        FROM t_p81470733_business_helper_app.user_actions
+                        WHERE %(fresh)s AND id > %(watermark)s AND created_at >= %(since)s AND user_id = %(user_id)s
+                          AND action_type = 'view_offer' AND partner_offer_id IS NOT NULL
+                    )
+                '''
+                
+                cur.execute(user_actions_cte + '''
                     SELECT 
                         u.id,
                         u.email,
@@ -41,52 +121,49 @@ def handler(event: dict, context) -> dict:
                         u.company_name,
                         u.created_at,
                         u.last_login,
-                        COUNT(DISTINCT ua.id) as total_actions,
-                        COUNT(DISTINCT CASE WHEN ua.action_type = 'view_service' THEN ua.service_id END) as viewed_services,
-                        COUNT(DISTINCT CASE WHEN ua.action_type = 'view_offer' THEN ua.partner_offer_id END) as viewed_offers,
-                        COUNT(DISTINCT CASE WHEN ua.action_type = 'submit_order' THEN ua.id END) as orders_count,
-                        MAX(ua.created_at) as last_activity
+                        (SELECT COALESCE(SUM(actions), 0) FROM actions) as total_actions,
+                        (SELECT COUNT(DISTINCT item_id) FROM items WHERE item_type = 'service') as viewed_services,
+                        (SELECT COUNT(DISTINCT item_id) FROM items WHERE item_type = 'offer') as viewed_offers,
+                        (SELECT COALESCE(SUM(actions), 0) FROM actions WHERE action_type = 'submit_order') as orders_count,
+                        (SELECT MAX(last_action_at) FROM actions) as last_activity
                     FROM t_p81470733_business_helper_app.users u
-                    LEFT JOIN t_p81470733_business_helper_app.user_actions ua ON u.id = ua.user_id
-                    WHERE u.id = %s
-                    GROUP BY u.id
-                ''', (user_id,))
+                    WHERE u.id = %(user_id)s
+                ''', params)
                 profile = cur.fetchone()
                 
-                cur.execute('''
-                    SELECT action_type, COUNT(*) as count
-                    FROM t_p81470733_business_helper_app.user_actions
-                    WHERE user_id = %s
+                cur.execute(user_actions_cte + '''
+                    SELECT action_type, SUM(actions) as count
+                    FROM actions
                     GROUP BY action_type
                     ORDER BY count DESC
-                ''', (user_id,))
+                ''', params)
                 action_stats = cur.fetchall()
                 
-                cur.execute('''
+                cur.execute(user_actions_cte + '''
                     SELECT 
                         s.title as service_name,
-                        COUNT(*) as views
-                    FROM t_p81470733_business_helper_app.user_actions ua
-                    JOIN t_p81470733_business_helper_app.services s ON ua.service_id = s.id
-                    WHERE ua.user_id = %s AND ua.action_type = 'view_service'
+                        SUM(i.views) as views
+                    FROM items i
+                    JOIN t_p81470733_business_helper_app.services s ON i.item_id = s.id
+                    WHERE i.item_type = 'service'
                     GROUP BY s.id, s.title
                     ORDER BY views DESC
                     LIMIT 5
-                ''', (user_id,))
+                ''', params)
                 top_services = cur.fetchall()
                 
-                cur.execute('''
+                cur.execute(user_actions_cte + '''
                     SELECT 
                         po.title as offer_name,
                         po.partner,
-                        COUNT(*) as views
-                    FROM t_p81470733_business_helper_app.user_actions ua
-                    JOIN t_p81470733_business_helper_app.partner_offers po ON ua.partner_offer_id = po.id
-                    WHERE ua.user_id = %s AND ua.action_type = 'view_offer'
+                        SUM(i.views) as views
+                    FROM items i
+                    JOIN t_p81470733_business_helper_app.partner_offers po ON i.item_id = po.id
+                    WHERE i.item_type = 'offer'
                     GROUP BY po.id, po.title, po.partner
                     ORDER BY views DESC
                     LIMIT 5
-                ''', (user_id,))
+                ''', params)
                 top_offers = cur.fetchall()
                 
                 return {
@@ -109,15 +186,29 @@ def handler(event: dict, context) -> dict:
                         u.company_name,
                         u.created_at,
                         u.last_login,
-                        COUNT(DISTINCT ua.id) as total_actions,
-                        COUNT(DISTINCT CASE WHEN ua.action_type = 'submit_order' THEN ua.id END) as orders_count,
-                        MAX(ua.created_at) as last_activity
+                        COALESCE(a.total_actions, 0) as total_actions,
+                        COALESCE(a.orders_count, 0) as orders_count,
+                        a.last_activity
                     FROM t_p81470733_business_helper_app.users u
-                    LEFT JOIN t_p81470733_business_helper_app.user_actions ua ON u.id = ua.user_id
+                    LEFT JOIN (
+                        SELECT 
+                            user_id,
+                            SUM(actions) as total_actions,
+                            SUM(actions) FILTER (WHERE action_type = 'submit_order') as orders_count,
+                            MAX(last_action_at) as last_activity
+                        FROM (
+                            SELECT user_id, action_type, actions, last_action_at
+                            FROM t_p81470733_business_helper_app.user_actions_daily
+                            UNION ALL
+                            SELECT user_id, action_type, 1, created_at
+                            FROM t_p81470733_business_helper_app.user_actions
+                            WHERE %(fresh)s AND id > %(watermark)s AND created_at >= %(since)s AND user_id IS NOT NULL
+                        ) merged
+                        GROUP BY user_id
+                    ) a ON u.id = a.user_id
                     WHERE u.is_active = true
-                    GROUP BY u.id
                     ORDER BY total_actions DESC
-                ''')
+                ''', tail)
                 users_analytics = cur.fetchall()
                 
                 return {
@@ -127,42 +218,199 @@ def handler(event: dict, context) -> dict:
                 }
             
             elif report_type == 'popular_services':
+                # Необязательный диапазон дат ?date_from=YYYY-MM-DD&date_to=YYYY-MM-DD (включительно)
+                try:
+                    date_from = parse_day(query_params.get('date_from'))
+                    date_to = parse_day(query_params.get('date_to'))
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'date_from and date_to must be YYYY-MM-DD'})
+                    }
+                params = {**tail, 'date_from': date_from, 'date_to': date_to}
+                
                 cur.execute('''
                     SELECT 
                         s.id,
                         s.title,
                         s.price,
-                        COUNT(ua.id) as view_count,
-                        COUNT(DISTINCT ua.user_id) as unique_users
+                        COALESCE(v.views, 0) + COALESCE(tv.views, 0) as view_count
                     FROM t_p81470733_business_helper_app.services s
-                    LEFT JOIN t_p81470733_business_helper_app.user_actions ua 
-                        ON s.id = ua.service_id AND ua.action_type = 'view_service'
-                    GROUP BY s.id
+                    LEFT JOIN (
+                        SELECT service_id, SUM(views) as views
+                        FROM t_p81470733_business_helper_app.service_views_daily
+                        WHERE (%(date_from)s::date IS NULL OR day >= %(date_from)s)
+                          AND (%(date_to)s::date IS NULL OR day <= %(date_to)s)
+                        GROUP BY service_id
+                    ) v ON s.id = v.service_id
+                    LEFT JOIN (
+                        SELECT service_id, COUNT(*) as views
+                        FROM t_p81470733_business_helper_app.user_actions
+                        WHERE %(fresh)s AND id > %(watermark)s AND created_at >= %(since)s
+                          AND action_type = 'view_service' AND service_id IS NOT NULL
+                          AND (%(date_from)s::date IS NULL OR created_at >= %(date_from)s)
+                          AND (%(date_to)s::date IS NULL OR created_at < %(date_to)s::date + 1)
+                        GROUP BY service_id
+                    ) tv ON s.id = tv.service_id
                     ORDER BY view_count DESC
-                ''')
-                services = cur.fetchall()
+                ''', params)
+                services = [dict(s) for s in cur.fetchall()]
+                
+                if query_params.get('exact') == '1':
+                    # Точный подсчёт по сырому журналу — медленно, для сверки
+                    cur.execute('''
+                        SELECT service_id, COUNT(DISTINCT user_id) as users
+                        FROM t_p81470733_business_helper_app.user_actions
+                        WHERE action_type = 'view_service' AND service_id IS NOT NULL AND user_id IS NOT NULL
+                          AND (%(date_from)s::date IS NULL OR created_at >= %(date_from)s)
+                          AND (%(date_to)s::date IS NULL OR created_at < %(date_to)s::date + 1)
+                        GROUP BY service_id
+                    ''', params)
+                    unique_users = {row['service_id']: row['users'] for row in cur.fetchall()}
+                else:
+                    # Дневные HLL-скетчи объединяются за диапазон, ошибка около 1.6%
+                    cur.execute('''
+                        SELECT service_id, sketch
+                        FROM t_p81470733_business_helper_app.service_user_sketches_daily
+                        WHERE (%(date_from)s::date IS NULL OR day >= %(date_from)s)
+                          AND (%(date_to)s::date IS NULL OR day <= %(date_to)s)
+                        ORDER BY service_id
+                    ''', params)
+                    sketches = {}
+                    for row in cur.fetchall():
+                        sketches.setdefault(row['service_id'], []).append(row['sketch'])
+                    merged = {service_id: hll.merge_all(items) for service_id, items in sketches.items()}
+                    
+                    if fresh:
+                        cur.execute('''
+                            SELECT DISTINCT service_id, user_id
+                            FROM t_p81470733_business_helper_app.user_actions
+                            WHERE id > %(watermark)s AND created_at >= %(since)s
+                              AND action_type = 'view_service' AND service_id IS NOT NULL AND user_id IS NOT NULL
+                              AND (%(date_from)s::date IS NULL OR created_at >= %(date_from)s)
+                              AND (%(date_to)s::date IS NULL OR created_at < %(date_to)s::date + 1)
+                        ''', params)
+                        for row in cur.fetchall():
+                            merged.setdefault(row['service_id'], hll.HLL()).add(row['user_id'])
+                    
+                    unique_users = {service_id: sketch.count() for service_id, sketch in merged.items()}
+                
+                for service in services:
+                    service['unique_users'] = unique_users.get(service['id'], 0)
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps([dict(s) for s in services], default=str)
+                    'body': json.dumps(services, default=str)
+                }
+            
+            elif report_type == 'recommendations':
+                limit = query_params.get('limit', '10')
+                if not user_id or not limit.isdigit():
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'user_id is required and limit must be an integer'})
+                    }
+                
+                # Стоимость запроса ограничена числом seed-элементов и TOP_K, а не объёмом журнала
+                cur.execute('''
+                    WITH seeds AS (
+                        SELECT item_type, item_id, MAX(seen_at) as seen_at
+                        FROM (
+                            SELECT item_type, item_id, last_viewed_at as seen_at
+                            FROM t_p81470733_business_helper_app.user_item_views
+                            WHERE user_id = %(user_id)s
+                            UNION ALL
+                            SELECT
+                                CASE WHEN action_type = 'view_service' THEN 'service' ELSE 'offer' END,
+                                COALESCE(service_id, partner_offer_id),
+                                created_at
+                            FROM (
+                                SELECT action_type, service_id, partner_offer_id, created_at
+                                FROM t_p81470733_business_helper_app.user_actions
+                                WHERE user_id = %(user_id)s
+                                  AND action_type IN ('view_service', 'view_offer')
+                                  AND COALESCE(service_id, partner_offer_id) IS NOT NULL
+                                  AND created_at >= NOW() - make_interval(days => %(days)s)
+                                ORDER BY created_at DESC
+                                LIMIT 100
+                            ) recent
+                        ) seen
+                        GROUP BY item_type, item_id
+                        ORDER BY seen_at DESC
+                        LIMIT %(seeds)s
+                    ), scored AS (
+                        SELECT sim.similar_type, sim.similar_id, SUM(sim.score) as score
+                        FROM seeds
+                        JOIN t_p81470733_business_helper_app.item_similarities sim
+                          ON sim.item_type = seeds.item_type AND sim.item_id = seeds.item_id
+                        WHERE NOT EXISTS (
+                            SELECT 1 FROM seeds viewed
+                            WHERE viewed.item_type = sim.similar_type AND viewed.item_id = sim.similar_id
+                        ) AND NOT EXISTS (
+                            SELECT 1 FROM t_p81470733_business_helper_app.user_item_views uiv
+                            WHERE uiv.user_id = %(user_id)s
+                              AND uiv.item_type = sim.similar_type AND uiv.item_id = sim.similar_id
+                        )
+                        GROUP BY sim.similar_type, sim.similar_id
+                    )
+                    SELECT 
+                        sc.similar_type as item_type,
+                        sc.similar_id as item_id,
+                        COALESCE(s.title, po.title) as title,
+                        s.price,
+                        po.partner,
+                        sc.score
+                    FROM scored sc
+                    LEFT JOIN t_p81470733_business_helper_app.services s
+                      ON sc.similar_type = 'service' AND s.id = sc.similar_id
+                    LEFT JOIN t_p81470733_business_helper_app.partner_offers po
+                      ON sc.similar_type = 'offer' AND po.id = sc.similar_id
+                    WHERE COALESCE(s.id, po.id) IS NOT NULL
+                    ORDER BY sc.score DESC
+                    LIMIT %(limit)s
+                ''', {
+                    'user_id': user_id,
+                    'days': RECENT_DAYS,
+                    'seeds': RECOMMENDATION_SEEDS,
+                    'limit': min(int(limit), 50)
+                })
+                items = cur.fetchall()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps([dict(i) for i in items], default=str)
+                }
+            
+            days = query_params.get('days', str(RECENT_DAYS))
+            if not days.isdigit() or int(days) < 1:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'days must be a positive integer'})
                 }
+            days = int(days)
             
-            elif user_id:
+            if user_id:
                 if action_type:
                     cur.execute('''
                         SELECT * FROM t_p81470733_business_helper_app.user_actions
                         WHERE user_id = %s AND action_type = %s
+                          AND created_at >= NOW() - make_interval(days => %s)
                         ORDER BY created_at DESC
                         LIMIT 100
-                    ''', (user_id, action_type))
+                    ''', (user_id, action_type, days))
                 else:
                     cur.execute('''
                         SELECT * FROM t_p81470733_business_helper_app.user_actions
                         WHERE user_id = %s
+                          AND created_at >= NOW() - make_interval(days => %s)
                         ORDER BY created_at DESC
                         LIMIT 100
-                    ''', (user_id,))
+                    ''', (user_id, days))
                 
                 actions = cur.fetchall()
                 return {
@@ -173,9 +421,10 @@ def handler(event: dict, context) -> dict:
             else:
                 cur.execute('''
                     SELECT * FROM t_p81470733_business_helper_app.user_actions
+                    WHERE created_at >= NOW() - make_interval(days => %s)
                     ORDER BY created_at DESC
                     LIMIT 100
-                ''')
+                ''', (days,))
                 actions = cur.fetchall()
                 return {
                     'statusCode': 200,
@@ -186,23 +435,95 @@ def handler(event: dict, context) -> dict:
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
             
+            if body.get('action') == 'rollup':
+                # Периодическое сворачивание новых событий в агрегаты
+                result = rollups.compact(conn)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
+            if body.get('action') == 'partitions':
+                # Ежемесячное обслуживание: будущие партиции и политика хранения сырых событий
+                result = partitions.maintain(conn)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
+            if body.get('action') == 'recommendations':
+                # Пакетный пересчёт похожих элементов по совместным просмотрам
+                result = recommendations.rebuild(conn)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
+            if body.get('action') == 'rebuild_sketches':
+                # Пересборка HLL-скетчей уникальных пользователей по уже свёрнутой истории
+                result = rollups.rebuild_sketches(conn)
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
+            if 'events' in body:
+                events = body['events']
+                if not isinstance(events, list) or not events:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'events must be a non-empty array'})
+                    }
+                if len(events) > MAX_BATCH_EVENTS:
+                    return {
+                        'statusCode': 413,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': f'Too many events, max {MAX_BATCH_EVENTS}'})
+                    }
+                
+                errors = []
+                rows = []
+                for index, event_data in enumerate(events):
+                    error = validate_event(event_data)
+                    if error:
+                        errors.append({'index': index, 'error': error})
+                    else:
+                        rows.append(event_row(event_data))
+                
+                inserted = []
+                if rows:
+                    # Все валидные события одним INSERT в одной транзакции
+                    inserted = execute_values(cur, '''
+                        INSERT INTO t_p81470733_business_helper_app.user_actions
+                        (user_id, action_type, action_description, page_url, 
+                         service_id, partner_offer_id, metadata, ip_address, user_agent)
+                        VALUES %s
+                        RETURNING id
+                    ''', rows, page_size=len(rows), fetch=True)
+                    conn.commit()
+                
+                return {
+                    'statusCode': 201 if rows else 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({
+                        'inserted': len(inserted),
+                        'ids': [row['id'] for row in inserted],
+                        'errors': errors
+                    })
+                }
+            
             cur.execute('''
                 INSERT INTO t_p81470733_business_helper_app.user_actions
                 (user_id, action_type, action_description, page_url, 
                  service_id, partner_offer_id, metadata, ip_address, user_agent)
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id, created_at
-            ''', (
-                body.get('user_id'),
-                body.get('action_type'),
-                body.get('action_description'),
-                body.get('page_url'),
-                body.get('service_id'),
-                body.get('partner_offer_id'),
-                json.dumps(body.get('metadata', {})),
-                body.get('ip_address'),
-                body.get('user_agent')
-            ))
+            ''', event_row(body))
             
             result = cur.fetchone()
             conn.commit()
@@ -229,4 +550,4 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            db_pool.putconn(conn)
@@ -0,0 +1,86 @@
+"""
+Обслуживание помесячных партиций user_actions: создание на месяцы вперёд и удаление/архивация старых
+"""
+import os
+
+SCHEMA = 't_p81470733_business_helper_app'
+
+# На сколько месяцев вперёд держать готовые партиции
+MONTHS_AHEAD = int(os.environ.get('ANALYTICS_PARTITION_MONTHS_AHEAD', '3'))
+# Сколько месяцев сырых событий хранить; 0 — хранить всё
+RETENTION_MONTHS = int(os.environ.get('ANALYTICS_RETENTION_MONTHS', '0'))
+# archive — отсоединить и переименовать в user_actions_archive_YYYYMM, drop — удалить
+RETENTION_MODE = os.environ.get('ANALYTICS_RETENTION_MODE', 'archive')
+
+
+def list_partitions(cur) -> list:
+    """Помесячные партиции user_actions в порядке возрастания месяца"""
+    cur.execute('''
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = %s AND p.relname = 'user_actions'
+          AND c.relname ~ '^user_actions_[0-9]{6}$'
+        ORDER BY c.relname
+    ''', (SCHEMA,))
+    return [row[0] for row in cur.fetchall()]
+
+
+def maintain(conn) -> dict:
+    """Создать будущие партиции и применить политику хранения; повторный запуск безопасен"""
+    cur = conn.cursor()
+
+    cur.execute(
+        f'SELECT {SCHEMA}.ensure_user_actions_partitions(CURRENT_DATE, %s)',
+        (MONTHS_AHEAD,)
+    )
+    created = cur.fetchone()[0]
+
+    removed = []
+    kept_unrolled = []
+    if RETENTION_MONTHS > 0:
+        cur.execute('''
+            SELECT to_char(date_trunc('month', CURRENT_DATE) - make_interval(months => %s), 'YYYYMM')
+        ''', (RETENTION_MONTHS,))
+        cutoff = cur.fetchone()[0]
+
+        cur.execute(f'''
+            SELECT last_action_id FROM {SCHEMA}.analytics_rollup_state
+            WHERE name = 'user_actions'
+        ''')
+        row = cur.fetchone()
+        watermark = row[0] if row else 0
+
+        for name in list_partitions(cur):
+            if name[-6:] >= cutoff:
+                break
+
+            # Не удалять события, которые ещё не попали в агрегаты
+            cur.execute(f'SELECT MAX(id) FROM {SCHEMA}.{name}')
+            max_id = cur.fetchone()[0]
+            if max_id is not None and max_id > watermark:
+                kept_unrolled.append(name)
+                continue
+
+            # Отсоединение и удаление партиции — операции над метаданными, без построчного DELETE
+            cur.execute(f'ALTER TABLE {SCHEMA}.user_actions DETACH PARTITION {SCHEMA}.{name}')
+            if RETENTION_MODE == 'drop':
+                cur.execute(f'DROP TABLE {SCHEMA}.{name}')
+            else:
+                cur.execute(f'ALTER TABLE {SCHEMA}.{name} RENAME TO user_actions_archive_{name[-6:]}')
+            removed.append(name)
+
+    conn.commit()
+    cur.close()
+
+    if removed or kept_unrolled:
+        print(f'[Partitions] {RETENTION_MODE}: {removed}, not rolled up yet: {kept_unrolled}')
+
+    return {
+        'created': created,
+        'removed': removed,
+        'mode': RETENTION_MODE,
+        'kept_unrolled': kept_unrolled
+    }
@@ -0,0 +1,80 @@
+"""
+Рекомендации «с этим также смотрят»: item-item косинусная близость по совместным просмотрам услуг и предложений
+"""
+import os
+
+from psycopg2.extras import execute_values
+
+SCHEMA = 't_p81470733_business_helper_app'
+
+# Сколько похожих элементов хранить на каждый элемент
+TOP_K = int(os.environ.get('RECOMMENDATIONS_TOP_K', '20'))
+# Минимум пользователей, просмотревших оба элемента
+MIN_CO_USERS = int(os.environ.get('RECOMMENDATIONS_MIN_CO_USERS', '1'))
+
+
+def rebuild(conn) -> dict:
+    """Пересчитать таблицу item_similarities по агрегату user_item_views"""
+    # numpy/scipy нужны только пакетному пересчёту, обычные запросы аналитики их не загружают
+    import numpy as np
+    from scipy import sparse
+
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT user_id, item_type, item_id
+        FROM {SCHEMA}.user_item_views
+    ''')
+    rows = cur.fetchall()
+
+    items = sorted({(item_type, item_id) for _, item_type, item_id in rows})
+    item_index = {item: i for i, item in enumerate(items)}
+    user_index = {}
+    user_idx = np.fromiter(
+        (user_index.setdefault(user_id, len(user_index)) for user_id, _, _ in rows),
+        dtype=np.int32, count=len(rows)
+    )
+    item_idx = np.fromiter(
+        (item_index[(item_type, item_id)] for _, item_type, item_id in rows),
+        dtype=np.int32, count=len(rows)
+    )
+
+    similarities = []
+    if rows:
+        # Матрица пользователь × элемент (1 — просматривал), совместные просмотры — X^T X
+        views = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float64), (user_idx, item_idx)),
+            shape=(len(user_index), len(items))
+        )
+        co_users = (views.T @ views).tocsr()
+        # На диагонали — число зрителей элемента; косинус = общие / sqrt(зрители_i * зрители_j)
+        norms = np.sqrt(co_users.diagonal())
+
+        for i in range(len(items)):
+            start, end = co_users.indptr[i], co_users.indptr[i + 1]
+            neighbours = co_users.indices[start:end]
+            counts = co_users.data[start:end]
+            scores = counts / (norms[i] * norms[neighbours])
+
+            mask = (neighbours != i) & (counts >= MIN_CO_USERS)
+            neighbours, counts, scores = neighbours[mask], counts[mask], scores[mask]
+            if len(neighbours) > TOP_K:
+                top = np.argpartition(-scores, TOP_K)[:TOP_K]
+                neighbours, counts, scores = neighbours[top], counts[top], scores[top]
+
+            item_type, item_id = items[i]
+            for j, count, score in zip(neighbours, counts, scores):
+                similar_type, similar_id = items[j]
+                similarities.append((item_type, item_id, similar_type, similar_id, float(score), int(count)))
+
+    # Полная замена в одной транзакции: читатели видят либо старую, либо новую таблицу
+    cur.execute(f'DELETE FROM {SCHEMA}.item_similarities')
+    if similarities:
+        execute_values(cur, f'''
+            INSERT INTO {SCHEMA}.item_similarities
+            (item_type, item_id, similar_type, similar_id, score, co_users)
+            VALUES %s
+        ''', similarities, page_size=1000)
+    conn.commit()
+    cur.close()
+
+    return {'users': len(user_index), 'items': len(items), 'similarities': len(similarities)}
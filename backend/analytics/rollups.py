@@ -0,0 +1,194 @@
+"""
+Инкрементальные агрегаты по user_actions: просмотры услуг/предложений по дням, действия клиентов по дням
+"""
+import os
+
+from psycopg2.extras import execute_values
+
+import hll
+
+SCHEMA = 't_p81470733_business_helper_app'
+
+# События моложе этого порога не сворачиваются: их транзакции могут быть ещё не закоммичены
+SETTLE_SECONDS = int(os.environ.get('ANALYTICS_ROLLUP_SETTLE_SECONDS', '60'))
+# Запас по времени перед последним свёрнутым событием: отсекает старые партиции user_actions
+LOOKBACK_SECONDS = int(os.environ.get('ANALYTICS_ROLLUP_LOOKBACK_SECONDS', '3600'))
+REBUILD_CHUNK_ROWS = 10000
+
+
+def get_watermark(cur) -> tuple:
+    """(последний id, уже учтённый в агрегатах; нижняя граница created_at для несвёрнутого хвоста)"""
+    cur.execute(f'''
+        SELECT last_action_id,
+               COALESCE(last_action_at - make_interval(secs => %s), '-infinity') AS since
+        FROM {SCHEMA}.analytics_rollup_state
+        WHERE name = 'user_actions'
+    ''', (LOOKBACK_SECONDS,))
+    row = cur.fetchone()
+    if not row:
+        return 0, None
+    if isinstance(row, dict):
+        return row['last_action_id'], row['since']
+    return row[0], row[1]
+
+
+def compact(conn) -> dict:
+    """Свернуть новые события в агрегаты; повторный запуск безопасен"""
+    cur = conn.cursor()
+
+    # Блокировка строки состояния не даёт двум запускам учесть события дважды
+    cur.execute(f'''
+        SELECT last_action_id,
+               COALESCE(last_action_at - make_interval(secs => %s), '-infinity')
+        FROM {SCHEMA}.analytics_rollup_state
+        WHERE name = 'user_actions'
+        FOR UPDATE
+    ''', (LOOKBACK_SECONDS,))
+    low, since = cur.fetchone()
+
+    # Условие на created_at позволяет планировщику читать только свежие партиции
+    cur.execute(f'''
+        SELECT COALESCE(MAX(id), %s), MAX(created_at) FROM {SCHEMA}.user_actions
+        WHERE id > %s AND created_at >= %s AND created_at < NOW() - make_interval(secs => %s)
+    ''', (low, low, since, SETTLE_SECONDS))
+    high, last_action_at = cur.fetchone()
+
+    if high <= low:
+        conn.rollback()
+        cur.close()
+        return {'from_action_id': low, 'last_action_id': low}
+
+    bounds = {'low': low, 'high': high, 'since': since}
+
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.service_views_daily (service_id, day, views)
+        SELECT service_id, created_at::date, COUNT(*)
+        FROM {SCHEMA}.user_actions
+        WHERE id > %(low)s AND id <= %(high)s AND created_at >= %(since)s
+          AND action_type = 'view_service' AND service_id IS NOT NULL
+        GROUP BY service_id, created_at::date
+        ON CONFLICT (service_id, day) DO UPDATE
+        SET views = {SCHEMA}.service_views_daily.views + EXCLUDED.views
+    ''', bounds)
+
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.offer_views_daily (partner_offer_id, day, views)
+        SELECT partner_offer_id, created_at::date, COUNT(*)
+        FROM {SCHEMA}.user_actions
+        WHERE id > %(low)s AND id <= %(high)s AND created_at >= %(since)s
+          AND action_type = 'view_offer' AND partner_offer_id IS NOT NULL
+        GROUP BY partner_offer_id, created_at::date
+        ON CONFLICT (partner_offer_id, day) DO UPDATE
+        SET views = {SCHEMA}.offer_views_daily.views + EXCLUDED.views
+    ''', bounds)
+
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.user_actions_daily (user_id, action_type, day, actions, last_action_at)
+        SELECT user_id, action_type, created_at::date, COUNT(*), MAX(created_at)
+        FROM {SCHEMA}.user_actions
+        WHERE id > %(low)s AND id <= %(high)s AND created_at >= %(since)s AND user_id IS NOT NULL
+        GROUP BY user_id, action_type, created_at::date
+        ON CONFLICT (user_id, action_type, day) DO UPDATE
+        SET actions = {SCHEMA}.user_actions_daily.actions + EXCLUDED.actions,
+            last_action_at = GREATEST({SCHEMA}.user_actions_daily.last_action_at, EXCLUDED.last_action_at)
+    ''', bounds)
+
+    cur.execute(f'''
+        INSERT INTO {SCHEMA}.user_item_views (user_id, item_type, item_id, views, last_viewed_at)
+        SELECT user_id, item_type, item_id, COUNT(*), MAX(created_at)
+        FROM (
+            SELECT user_id, 'service' AS item_type, service_id AS item_id, created_at
+            FROM {SCHEMA}.user_actions
+            WHERE id > %(low)s AND id <= %(high)s AND created_at >= %(since)s AND user_id IS NOT NULL
+              AND action_type = 'view_service' AND service_id IS NOT NULL
+            UNION ALL
+            SELECT user_id, 'offer', partner_offer_id, created_at
+            FROM {SCHEMA}.user_actions
+            WHERE id > %(low)s AND id <= %(high)s AND created_at >= %(since)s AND user_id IS NOT NULL
+              AND action_type = 'view_offer' AND partner_offer_id IS NOT NULL
+        ) views
+        GROUP BY user_id, item_type, item_id
+        ON CONFLICT (user_id, item_type, item_id) DO UPDATE
+        SET views = {SCHEMA}.user_item_views.views + EXCLUDED.views,
+            last_viewed_at = GREATEST({SCHEMA}.user_item_views.last_viewed_at, EXCLUDED.last_viewed_at)
+    ''', bounds)
+
+    cur.execute(f'''
+        SELECT DISTINCT service_id, created_at::date, user_id
+        FROM {SCHEMA}.user_actions
+        WHERE id > %(low)s AND id <= %(high)s AND created_at >= %(since)s AND user_id IS NOT NULL
+          AND action_type = 'view_service' AND service_id IS NOT NULL
+    ''', bounds)
+    add_to_sketches(cur, cur.fetchall())
+
+    cur.execute(f'''
+        UPDATE {SCHEMA}.analytics_rollup_state
+        SET last_action_id = %s, last_action_at = %s, updated_at = NOW()
+        WHERE name = 'user_actions'
+    ''', (high, last_action_at))
+
+    conn.commit()
+    cur.close()
+    return {'from_action_id': low, 'last_action_id': high}
+
+
+def add_to_sketches(cur, rows) -> int:
+    """Добавить строки (service_id, day, user_id) в дневные HLL-скетчи, вернуть число изменённых скетчей"""
+    sketches = {}
+    for service_id, day, user_id in rows:
+        sketches.setdefault((service_id, day), hll.HLL()).add(user_id)
+    if not sketches:
+        return 0
+
+    # Скетчи дописываются под блокировкой строки состояния, поэтому чтение-слияние-запись безопасно
+    cur.execute(f'''
+        SELECT service_id, day, sketch
+        FROM {SCHEMA}.service_user_sketches_daily
+        WHERE service_id = ANY(%s) AND day = ANY(%s)
+    ''', (list({key[0] for key in sketches}), list({key[1] for key in sketches})))
+    for service_id, day, sketch in cur.fetchall():
+        if (service_id, day) in sketches:
+            sketches[(service_id, day)].merge(hll.HLL.from_bytes(sketch))
+
+    execute_values(cur, f'''
+        INSERT INTO {SCHEMA}.service_user_sketches_daily (service_id, day, sketch)
+        VALUES %s
+        ON CONFLICT (service_id, day) DO UPDATE SET sketch = EXCLUDED.sketch
+    ''', [(service_id, day, sketch.to_bytes()) for (service_id, day), sketch in sketches.items()])
+    return len(sketches)
+
+
+def rebuild_sketches(conn) -> dict:
+    """Пересобрать скетчи по всем уже свёрнутым событиям (после миграции или для сверки)"""
+    cur = conn.cursor()
+    cur.execute(f'''
+        SELECT last_action_id FROM {SCHEMA}.analytics_rollup_state
+        WHERE name = 'user_actions'
+        FOR UPDATE
+    ''')
+    watermark = cur.fetchone()[0]
+
+    cur.execute(f'DELETE FROM {SCHEMA}.service_user_sketches_daily')
+
+    # Серверный курсор: история читается порциями, скетчи досливаются после каждой
+    events = conn.cursor(name='sketch_rebuild')
+    events.execute(f'''
+        SELECT service_id, created_at::date, user_id
+        FROM {SCHEMA}.user_actions
+        WHERE id <= %s AND user_id IS NOT NULL
+          AND action_type = 'view_service' AND service_id IS NOT NULL
+        ORDER BY created_at::date
+    ''', (watermark,))
+    while True:
+        rows = events.fetchmany(REBUILD_CHUNK_ROWS)
+        if not rows:
+            break
+        add_to_sketches(cur, rows)
+    events.close()
+
+    cur.execute(f'SELECT COUNT(*) FROM {SCHEMA}.service_user_sketches_daily')
+    sketches = cur.fetchone()[0]
+
+    conn.commit()
+    cur.close()
+    return {'last_action_id': watermark, 'sketches': sketches}
@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db_pool
 from psycopg2.extras import RealDictCursor
 
 def handler(event: dict, context) -> dict:
@@ -45,7 +45,7 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Заполните логин и пароль'}, ensure_ascii=False)
             }
         
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db_pool.getconn(os.environ['DATABASE_URL'])
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         cur.execute("""
@@ -55,7 +55,7 @@ def handler(event: dict, context) -> dict:
         
         admin = cur.fetchone()
         cur.close()
-        conn.close()
+        db_pool.putconn(conn)
         
         if not admin:
             return {
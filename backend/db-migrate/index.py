@@ -3,7 +3,7 @@
 """
 import json
 import os
-import psycopg2
+import db_pool
 
 
 def handler(event: dict, context) -> dict:
@@ -73,7 +73,7 @@ def apply_migration():
     """
     
     try:
-        conn = psycopg2.connect(database_url)
+        conn = db_pool.getconn(database_url)
         cursor = conn.cursor()
         
         # Выполняем миграцию
@@ -91,7 +91,7 @@ def apply_migration():
         table_exists = cursor.fetchone()[0] > 0
         
         cursor.close()
-        conn.close()
+        db_pool.putconn(conn)
         
         if table_exists:
             return {
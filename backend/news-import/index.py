@@ -3,11 +3,14 @@ API для импорта новостей с внешних сайтов
 """
 import json
 import os
-import psycopg2
+import db_pool
+import fetch_state
+import html_parser
+import requests
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
+
+SOURCE_URL = 'https://sberanalytics.ru/news'
 
 
 def handler(event: dict, context) -> dict:
@@ -39,46 +42,81 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Database not configured'})
             }
         
-        # Парсинг новостей с сайта sberanalytics.ru
-        response = requests.get('https://sberanalytics.ru/news', timeout=10)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        body_str = event.get('body') or '{}'
+        body = json.loads(body_str) if isinstance(body_str, str) else body_str
+        
+        conn = db_pool.getconn(database_url)
+        
+        # Парсинг новостей с сайта sberanalytics.ru, только если страница изменилась
+        try:
+            fetched = fetch_state.fetch_if_changed(conn, schema, SOURCE_URL, force=bool(body.get('force')))
+        except requests.RequestException as e:
+            db_pool.putconn(conn)
+            return {
+                'statusCode': 502,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': f'Failed to fetch source page: {e}'})
+            }
+        
+        if fetched is None:
+            db_pool.putconn(conn)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({
+                    'success': True,
+                    'imported': 0,
+                    'total_found': 0,
+                    'skipped_unchanged': True,
+                    'message': 'Source page has not changed'
+                })
+            }
+        
+        response, body_hash = fetched
+        doc = html_parser.parse(response.text)
         
         news_items = []
-        articles = soup.find_all('article') or soup.find_all('div', class_='news-item')
+        articles = doc.select('article') or doc.select('div.news-item')
         
         for article in articles[:20]:  # Берем первые 20 новостей
             try:
-                title_elem = article.find('h2') or article.find('h3') or article.find('a')
+                title_elem = article.select_one('h2') or article.select_one('h3') or article.select_one('a')
                 if not title_elem:
                     continue
                     
-                title = title_elem.get_text(strip=True)
+                title = title_elem.text()
                 
-                desc_elem = article.find('p')
-                description = desc_elem.get_text(strip=True) if desc_elem else ''
+                desc_elem = article.select_one('p')
+                description = desc_elem.text() if desc_elem else ''
                 
-                img_elem = article.find('img')
+                img_elem = article.select_one('img')
                 image_url = ''
-                if img_elem and img_elem.get('src'):
-                    img_src = img_elem.get('src')
+                if img_elem and img_elem.attr('src'):
+                    img_src = img_elem.attr('src')
                     if img_src.startswith('http'):
                         image_url = img_src
                     elif img_src.startswith('/'):
                         image_url = f'https://sberanalytics.ru{img_src}'
                 
-                link_elem = article.find('a', href=True)
+                link_elem = article.select_one('a[href]')
                 source_url = ''
                 if link_elem:
-                    href = link_elem.get('href')
+                    href = link_elem.attr('href')
                     if href.startswith('http'):
                         source_url = href
                     elif href.startswith('/'):
                         source_url = f'https://sberanalytics.ru{href}'
                 
-                date_elem = article.find('time') or article.find(class_='date')
+                date_elem = article.select_one('time') or article.select_one('.date')
                 published_date = None
                 if date_elem:
-                    date_text = date_elem.get_text(strip=True)
+                    date_text = date_elem.text()
                     try:
                         published_date = datetime.strptime(date_text, '%d.%m.%Y').date()
                     except:
@@ -97,6 +135,8 @@ def handler(event: dict, context) -> dict:
                 continue
         
         if not news_items:
+            fetch_state.remember(conn, schema, SOURCE_URL, response, body_hash)
+            db_pool.putconn(conn)
             return {
                 'statusCode': 200,
                 'headers': {
@@ -106,12 +146,12 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({
                     'success': True,
                     'imported': 0,
+                    'skipped_unchanged': False,
                     'message': 'No news found on the page'
                 })
             }
         
         # Сохранение в базу данных
-        conn = psycopg2.connect(database_url)
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         imported_count = 0
@@ -138,7 +178,9 @@ def handler(event: dict, context) -> dict:
         
         conn.commit()
         cursor.close()
-        conn.close()
+        
+        fetch_state.remember(conn, schema, SOURCE_URL, response, body_hash)
+        db_pool.putconn(conn)
         
         return {
             'statusCode': 200,
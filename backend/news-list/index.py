@@ -1,14 +1,69 @@
 """
 API для получения списка опубликованных новостей
 """
+import base64
 import json
 import os
-import psycopg2
+import time
+from datetime import datetime
+import db_pool
+import news_fields
+import news_search
+import response_cache
 from psycopg2.extras import RealDictCursor
 
+# Сколько секунд держать закэшированное количество опубликованных новостей
+TOTAL_CACHE_TTL = int(os.environ.get('NEWS_TOTAL_CACHE_TTL', '60'))
+
+_total_cache = {'value': None, 'expires_at': 0.0}
+
+# Колонки элемента ленты, доступные через ?fields= (для поиска к ним добавляются rank и snippet)
+FEED_COLUMNS = ['id', 'title', 'description', 'content', 'source_url', 'image_url', 'badge', 'published_date', 'created_at']
+# Карточка в списке: полный текст отдаёт только ?id=
+FEED_SUMMARY = [column for column in FEED_COLUMNS if column != 'content']
+# Без них не построить курсор ленты
+FEED_CURSOR_COLUMNS = ('id', 'published_date', 'created_at')
+
+
+def encode_cursor(item: dict) -> str:
+    """Курсор на последнюю строку страницы: (published_date, created_at, id)"""
+    raw = json.dumps([item['published_date'], item['created_at'], item['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> tuple:
+    """Разбор курсора из параметра ?after="""
+    padded = token + '=' * (-len(token) % 4)
+    published_date, created_at, news_id = json.loads(base64.urlsafe_b64decode(padded))
+    return (
+        datetime.fromisoformat(published_date) if published_date else None,
+        datetime.fromisoformat(created_at),
+        int(news_id)
+    )
+
+
+def get_published_total(cursor, schema: str) -> int:
+    """Количество опубликованных новостей из кэша тёплого контейнера"""
+    now = time.monotonic()
+    if _total_cache['value'] is None or now >= _total_cache['expires_at']:
+        cursor.execute(f"SELECT COUNT(*) as total FROM {schema}.news_articles WHERE status = 'published'")
+        _total_cache['value'] = cursor.fetchone()['total']
+        _total_cache['expires_at'] = now + TOTAL_CACHE_TTL
+    return _total_cache['value']
+
+
+def get_article(cursor, schema: str, news_id: int):
+    """Одна опубликованная новость целиком, с content"""
+    cursor.execute(f"""
+        SELECT {', '.join(FEED_COLUMNS)}
+        FROM {schema}.news_articles
+        WHERE id = %s AND status = 'published'
+    """, (news_id,))
+    return cursor.fetchone()
+
 
 def handler(event: dict, context) -> dict:
-    """Получение списка опубликованных новостей"""
+    """Получение списка опубликованных новостей (краткие карточки) и одной новости целиком по ?id="""
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -37,39 +92,173 @@ def handler(event: dict, context) -> dict:
                     'body': json.dumps({'error': 'Database not configured'})
                 }
             
-            conn = psycopg2.connect(database_url)
+            cached = response_cache.get(response_cache.make_key(event))
+            if cached:
+                etag, body = cached
+                return response_cache.build_response(event, etag, body, {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                })
+            
+            conn = db_pool.getconn(database_url)
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             
             query_params = event.get('queryStringParameters') or {}
             limit = int(query_params.get('limit', '20'))
             offset = int(query_params.get('offset', '0'))
+            after = query_params.get('after')
+            q = news_search.normalize_query(query_params.get('q'))
+            
+            if query_params.get('id'):
+                # Детальная страница: полный текст одной новости
+                try:
+                    news_id = int(query_params['id'])
+                except ValueError:
+                    db_pool.putconn(conn)
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Invalid id'})
+                    }
+                
+                article = get_article(cursor, schema, news_id)
+                cursor.close()
+                db_pool.putconn(conn)
+                
+                if not article:
+                    return {
+                        'statusCode': 404,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'News not found'})
+                    }
+                
+                if article.get('published_date'):
+                    article['published_date'] = article['published_date'].isoformat()
+                if article.get('created_at'):
+                    article['created_at'] = article['created_at'].isoformat()
+                
+                body = json.dumps({'success': True, 'article': article})
+                etag = response_cache.put(response_cache.make_key(event), body)
+                
+                return response_cache.build_response(event, etag, body, {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                })
+            
+            # Проекция колонок: по умолчанию карточки без content
+            try:
+                columns = news_fields.parse(
+                    query_params.get('fields'), FEED_COLUMNS, FEED_SUMMARY,
+                    required=('id',) if q else FEED_CURSOR_COLUMNS
+                )
+            except ValueError as e:
+                db_pool.putconn(conn)
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
+            
+            if q:
+                # Поиск: порядок по релевантности, курсор (rank, id) вместо позиции в ленте
+                try:
+                    search_after = news_search.decode_cursor(after) if after else None
+                except (ValueError, TypeError, ArithmeticError):
+                    db_pool.putconn(conn)
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Invalid cursor'})
+                    }
+                
+                news, next_cursor = news_search.search(
+                    cursor, schema, q, columns, limit, after=search_after, status='published'
+                )
+                cursor.close()
+                db_pool.putconn(conn)
+                
+                for item in news:
+                    if item.get('published_date'):
+                        item['published_date'] = item['published_date'].isoformat()
+                    if item.get('created_at'):
+                        item['created_at'] = item['created_at'].isoformat()
+                
+                body = json.dumps({
+                    'success': True,
+                    'news': news,
+                    'query': q,
+                    'limit': limit,
+                    'next_cursor': next_cursor
+                })
+                etag = response_cache.put(response_cache.make_key(event), body)
+                
+                return response_cache.build_response(event, etag, body, {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                })
+            
+            seek_clause = ''
+            seek_params = ()
+            if after:
+                try:
+                    after_published, after_created, after_id = decode_cursor(after)
+                except (ValueError, TypeError):
+                    db_pool.putconn(conn)
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Invalid cursor'})
+                    }
+                
+                # Продолжаем с позиции курсора в порядке индекса idx_news_articles_published_feed
+                if after_published is None:
+                    seek_clause = "AND published_date IS NULL AND (created_at, id) < (%s, %s)"
+                    seek_params = (after_created, after_id)
+                else:
+                    seek_clause = """
+                        AND (
+                            published_date < %s
+                            OR (published_date = %s AND (created_at, id) < (%s, %s))
+                            OR published_date IS NULL
+                        )
+                    """
+                    seek_params = (after_published, after_published, after_created, after_id)
+                offset = 0
             
             query = f"""
-                SELECT 
-                    id, 
-                    title, 
-                    description,
-                    content, 
-                    source_url, 
-                    image_url,
-                    badge,
-                    published_date,
-                    created_at
+                SELECT {', '.join(columns)}
                 FROM {schema}.news_articles 
                 WHERE status = 'published'
-                ORDER BY published_date DESC NULLS LAST, created_at DESC
-                LIMIT {limit} OFFSET {offset}
+                {seek_clause}
+                ORDER BY published_date DESC NULLS LAST, created_at DESC, id DESC
+                LIMIT {limit + 1} OFFSET {offset}
             """
             
-            cursor.execute(query)
+            cursor.execute(query, seek_params or None)
             news = cursor.fetchall()
             
-            count_query = f"SELECT COUNT(*) as total FROM {schema}.news_articles WHERE status = 'published'"
-            cursor.execute(count_query)
-            total = cursor.fetchone()['total']
+            has_more = len(news) > limit
+            news = news[:limit]
+            
+            total = get_published_total(cursor, schema)
             
             cursor.close()
-            conn.close()
+            db_pool.putconn(conn)
             
             for item in news:
                 if item.get('published_date'):
@@ -77,20 +266,22 @@ def handler(event: dict, context) -> dict:
                 if item.get('created_at'):
                     item['created_at'] = item['created_at'].isoformat()
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps({
-                    'success': True,
-                    'news': news,
-                    'total': total,
-                    'limit': limit,
-                    'offset': offset
-                })
-            }
+            next_cursor = encode_cursor(news[-1]) if has_more and news else None
+            
+            body = json.dumps({
+                'success': True,
+                'news': news,
+                'total': total,
+                'limit': limit,
+                'offset': offset,
+                'next_cursor': next_cursor
+            })
+            etag = response_cache.put(response_cache.make_key(event), body)
+            
+            return response_cache.build_response(event, etag, body, {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            })
             
         except Exception as e:
             return {
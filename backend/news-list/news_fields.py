@@ -0,0 +1,35 @@
+"""
+Проекция колонок новостей в списках: ?fields= из белого списка, по умолчанию summary — без тяжёлого content
+"""
+from typing import Optional
+
+# Готовые наборы, которые можно смешивать с отдельными полями: ?fields=summary,content
+SUMMARY = 'summary'
+FULL = 'full'
+
+
+def parse(value: Optional[str], allowed: list, summary: list, required: tuple = ('id',)) -> list:
+    """Колонки для SELECT в порядке allowed; ValueError со списком неизвестных полей
+
+    required добавляются всегда: без них не построить курсор следующей страницы.
+    """
+    requested = set()
+    unknown = []
+    for field in (value or SUMMARY).split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field == SUMMARY:
+            requested.update(summary)
+        elif field == FULL:
+            requested.update(allowed)
+        elif field in allowed:
+            requested.add(field)
+        else:
+            unknown.append(field)
+
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    requested.update(required)
+    return [column for column in allowed if column in requested]
@@ -0,0 +1,82 @@
+"""
+Кэш ответов GET в памяти тёплого контейнера с поддержкой ETag / 304
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Сколько секунд ответ живёт в кэше контейнера
+TTL = int(os.environ.get('RESPONSE_CACHE_TTL', '30'))
+# Сколько ответов держать: ключи строятся из произвольных параметров запроса (в том числе ?q=)
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', '256'))
+
+_lock = threading.Lock()
+_entries = OrderedDict()
+
+
+def make_key(event: dict) -> str:
+    """Ключ кэша из метода и параметров запроса"""
+    params = event.get('queryStringParameters') or {}
+    query = '&'.join(f'{k}={params[k]}' for k in sorted(params))
+    return f"{event.get('httpMethod', 'GET')}?{query}"
+
+
+def make_etag(body: str) -> str:
+    """Сильный ETag по сериализованному телу ответа"""
+    return '"' + hashlib.sha256(body.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def get(key: str) -> Optional[tuple]:
+    """(etag, body) из кэша или None, если записи нет или она устарела"""
+    with _lock:
+        entry = _entries.get(key)
+        if not entry:
+            return None
+        expires_at, etag, body = entry
+        if time.monotonic() >= expires_at:
+            del _entries[key]
+            return None
+        _entries.move_to_end(key)
+        return etag, body
+
+
+def put(key: str, body: str) -> str:
+    """Сохранить тело ответа и вернуть его ETag; устаревшие и самые давние записи вытесняются"""
+    etag = make_etag(body)
+    now = time.monotonic()
+    with _lock:
+        for stale in [k for k, entry in _entries.items() if entry[0] <= now]:
+            del _entries[stale]
+        _entries[key] = (now + TTL, etag, body)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return etag
+
+
+def invalidate():
+    """Сбросить кэш после изменения данных (POST/PUT/DELETE)"""
+    with _lock:
+        _entries.clear()
+
+
+def is_not_modified(event: dict, etag: str) -> bool:
+    """Проверка заголовка If-None-Match"""
+    headers = event.get('headers') or {}
+    if_none_match = next((v for k, v in headers.items() if k.lower() == 'if-none-match'), '')
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    return etag in [tag.strip() for tag in if_none_match.split(',')]
+
+
+def build_response(event: dict, etag: str, body: str, headers: dict) -> dict:
+    """Ответ 200 с телом или 304 без тела, если у клиента актуальная версия"""
+    headers = {**headers, 'ETag': etag, 'Cache-Control': 'no-cache'}
+    if is_not_modified(event, etag):
+        return {'statusCode': 304, 'headers': headers, 'body': ''}
+    return {'statusCode': 200, 'headers': headers, 'body': body}
@@ -3,10 +3,22 @@ API для управления новостями (CRUD операции)
 """
 import json
 import os
-import psycopg2
+import db_pool
+import news_fields
+import news_search
 from psycopg2.extras import RealDictCursor
 from datetime import datetime
 
+# Колонки строки в админ-списке, доступные через ?fields= (для поиска к ним добавляются rank и snippet)
+ADMIN_COLUMNS = [
+    'id', 'title', 'description', 'content', 'source_url', 'image_url',
+    'badge', 'status', 'published_date', 'created_at'
+]
+# Строка списка без полного текста: для редактирования он берётся через ?id=
+ADMIN_SUMMARY = [column for column in ADMIN_COLUMNS if column != 'content']
+# Поля, которые меняет PUT (только переданные в теле)
+EDITABLE_COLUMNS = ['title', 'description', 'content', 'source_url', 'image_url', 'badge', 'status', 'published_date']
+
 
 def handler(event: dict, context) -> dict:
     """Управление новостями: создание, редактирование, удаление, публикация"""
@@ -36,7 +48,7 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': 'Database not configured'})
         }
     
-    conn = psycopg2.connect(database_url)
+    conn = db_pool.getconn(database_url)
     cursor = conn.cursor(cursor_factory=RealDictCursor)
     
     try:
@@ -46,20 +58,109 @@ def handler(event: dict, context) -> dict:
             status_filter = query_params.get('status', '')
             limit = int(query_params.get('limit', '100'))
             offset = int(query_params.get('offset', '0'))
+            q = news_search.normalize_query(query_params.get('q'))
+            
+            if query_params.get('id'):
+                # Одна новость целиком, с content — для формы редактирования
+                try:
+                    news_id = int(query_params['id'])
+                except ValueError:
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Invalid id'})
+                    }
+                
+                cursor.execute(f"""
+                    SELECT {', '.join(ADMIN_COLUMNS)}
+                    FROM {schema}.news_articles
+                    WHERE id = %s
+                """, (news_id,))
+                article = cursor.fetchone()
+                
+                if not article:
+                    return {
+                        'statusCode': 404,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'News not found'})
+                    }
+                
+                if article.get('published_date'):
+                    article['published_date'] = article['published_date'].isoformat()
+                if article.get('created_at'):
+                    article['created_at'] = article['created_at'].isoformat()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'success': True, 'article': article})
+                }
+            
+            # Проекция колонок: по умолчанию строки без content
+            try:
+                columns = news_fields.parse(query_params.get('fields'), ADMIN_COLUMNS, ADMIN_SUMMARY)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'error': str(e)})
+                }
             
-            where_clause = f"WHERE status = '{status_filter}'" if status_filter else ""
+            if q:
+                # Поиск по всем статусам (или по выбранному), порядок по релевантности
+                try:
+                    after = news_search.decode_cursor(query_params['after']) if query_params.get('after') else None
+                except (ValueError, TypeError, ArithmeticError):
+                    return {
+                        'statusCode': 400,
+                        'headers': {
+                            'Content-Type': 'application/json',
+                            'Access-Control-Allow-Origin': '*'
+                        },
+                        'body': json.dumps({'error': 'Invalid cursor'})
+                    }
+                
+                news, next_cursor = news_search.search(
+                    cursor, schema, q, columns, limit, after=after, status=status_filter or None
+                )
+                for item in news:
+                    if item.get('published_date'):
+                        item['published_date'] = item['published_date'].isoformat()
+                    if item.get('created_at'):
+                        item['created_at'] = item['created_at'].isoformat()
+                
+                return {
+                    'statusCode': 200,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({'success': True, 'news': news, 'query': q, 'next_cursor': next_cursor})
+                }
+            
+            where_clause = "WHERE status = %s" if status_filter else ""
             
             query = f"""
-                SELECT 
-                    id, title, description, content, source_url, image_url,
-                    badge, status, published_date, created_at
+                SELECT {', '.join(columns)}
                 FROM {schema}.news_articles
                 {where_clause}
                 ORDER BY created_at DESC
                 LIMIT {limit} OFFSET {offset}
             """
             
-            cursor.execute(query)
+            cursor.execute(query, (status_filter,) if status_filter else None)
             news = cursor.fetchall()
             
             for item in news:
@@ -137,31 +238,19 @@ def handler(event: dict, context) -> dict:
             if status == 'published' and not published_date:
                 published_date = datetime.now().date().isoformat()
             
+            # Текстовые поля меняются, только если переданы: строка из списка приходит без content
+            # и не должна его затирать; статус и дата публикации пишутся всегда, как раньше
+            updates = {column: body[column] for column in EDITABLE_COLUMNS if column in body}
+            updates['status'] = status
+            updates['published_date'] = published_date
+            
             query = f"""
                 UPDATE {schema}.news_articles 
-                SET 
-                    title = %s,
-                    description = %s,
-                    content = %s,
-                    source_url = %s,
-                    image_url = %s,
-                    badge = %s,
-                    status = %s,
-                    published_date = %s
+                SET {', '.join(f'{column} = %s' for column in updates)}
                 WHERE id = %s
             """
             
-            cursor.execute(query, (
-                body.get('title', ''),
-                body.get('description', ''),
-                body.get('content', ''),
-                body.get('source_url', ''),
-                body.get('image_url', ''),
-                body.get('badge', ''),
-                status,
-                published_date,
-                news_id
-            ))
+            cursor.execute(query, (*updates.values(), news_id))
             
             conn.commit()
             
@@ -220,7 +309,7 @@ def handler(event: dict, context) -> dict:
         }
     finally:
         cursor.close()
-        conn.close()
+        db_pool.putconn(conn)
     
     return {
         'statusCode': 405,
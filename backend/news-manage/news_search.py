@@ -0,0 +1,78 @@
+"""
+Полнотекстовый поиск по новостям: search_vector (русская морфология, GIN-индекс), ts_rank, сниппеты ts_headline, keyset-страницы
+"""
+import base64
+import json
+from decimal import Decimal
+from typing import Optional
+
+# Длиннее запросы обрезаются: websearch_to_tsquery от мегабайтного текста бесполезен и дорог
+MAX_QUERY_LENGTH = 200
+# Ранг округляется, чтобы курсор (rank, id) точно совпадал со значением в БД
+RANK_SCALE = 6
+HEADLINE_OPTIONS = 'MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter=" … ", StartSel=<mark>, StopSel=</mark>'
+
+
+def normalize_query(q: Optional[str]) -> str:
+    """Поисковая строка без лишних пробелов; пустая — поиск не нужен"""
+    return ' '.join((q or '').split())[:MAX_QUERY_LENGTH]
+
+
+def encode_cursor(item: dict) -> str:
+    """Курсор на последнюю строку страницы результатов: (rank, id)"""
+    raw = json.dumps([str(item['rank']), item['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> tuple:
+    """Разбор курсора результатов поиска; ValueError/TypeError для чужого или испорченного курсора"""
+    padded = token + '=' * (-len(token) % 4)
+    rank, news_id = json.loads(base64.urlsafe_b64decode(padded))
+    return Decimal(rank), int(news_id)
+
+
+def search(cursor, schema: str, q: str, columns: list, limit: int,
+           after: Optional[tuple] = None, status: Optional[str] = None) -> tuple:
+    """Страница результатов по релевантности: (строки, курсор следующей страницы или None)
+
+    Совпадения находит GIN-индекс, ранжирование идёт только по найденным строкам,
+    а сниппеты ts_headline строятся лишь для строк страницы.
+    """
+    select_columns = ', '.join(f'a.{column}' for column in columns)
+    cursor.execute(f"""
+        WITH q AS (
+            SELECT websearch_to_tsquery('russian', %(q)s) AS query
+        ),
+        ranked AS (
+            SELECT n.id, round(ts_rank(n.search_vector, q.query)::numeric, {RANK_SCALE}) AS rank
+            FROM {schema}.news_articles n, q
+            WHERE n.search_vector @@ q.query
+              AND (%(status)s::text IS NULL OR n.status = %(status)s)
+        ),
+        page AS (
+            SELECT id, rank FROM ranked
+            WHERE %(after_rank)s::numeric IS NULL OR (rank, id) < (%(after_rank)s::numeric, %(after_id)s)
+            ORDER BY rank DESC, id DESC
+            LIMIT %(limit)s
+        )
+        SELECT {select_columns}, page.rank,
+               ts_headline('russian', coalesce(nullif(a.content, ''), a.description, ''), q.query, %(headline)s) AS snippet
+        FROM page
+        JOIN {schema}.news_articles a ON a.id = page.id, q
+        ORDER BY page.rank DESC, page.id DESC
+    """, {
+        'q': q,
+        'status': status,
+        'after_rank': after[0] if after else None,
+        'after_id': after[1] if after else None,
+        'limit': limit + 1,
+        'headline': HEADLINE_OPTIONS
+    })
+    rows = cursor.fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]) if has_more and rows else None
+    for row in rows:
+        row['rank'] = float(row['rank'])
+    return rows, next_cursor
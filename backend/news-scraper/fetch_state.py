@@ -0,0 +1,75 @@
+"""
+Условная загрузка страниц-источников (ETag / Last-Modified / хэш тела) с состоянием в таблице source_fetch_state
+"""
+import hashlib
+from typing import Optional
+
+import requests
+
+
+def fetch_if_changed(conn, schema: str, url: str, timeout: int = 10, force: bool = False) -> Optional[tuple]:
+    """(response, body_hash), если страница изменилась с прошлого раза, иначе None
+
+    force=True загружает страницу безусловно (состояние всё равно обновится через remember)
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT etag, last_modified, body_hash
+        FROM {schema}.source_fetch_state
+        WHERE url = %s
+    """, (url,))
+    state = None if force else cursor.fetchone()
+    conn.commit()
+
+    headers = {}
+    if state and state[0]:
+        headers['If-None-Match'] = state[0]
+    if state and state[1]:
+        headers['If-Modified-Since'] = state[1]
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304:
+        _touch(cursor, schema, url)
+        conn.commit()
+        cursor.close()
+        return None
+
+    response.raise_for_status()
+    body_hash = hashlib.sha256(response.content).hexdigest()
+
+    # Сервер не поддерживает условные запросы, но содержимое то же самое
+    if state and state[2] == body_hash:
+        _touch(cursor, schema, url)
+        conn.commit()
+        cursor.close()
+        return None
+
+    cursor.close()
+    return response, body_hash
+
+
+def remember(conn, schema: str, url: str, response, body_hash: str):
+    """Запомнить версию страницы после успешной обработки"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        INSERT INTO {schema}.source_fetch_state
+        (url, etag, last_modified, body_hash, last_checked_at, last_changed_at)
+        VALUES (%s, %s, %s, %s, NOW(), NOW())
+        ON CONFLICT (url) DO UPDATE
+        SET etag = EXCLUDED.etag,
+            last_modified = EXCLUDED.last_modified,
+            body_hash = EXCLUDED.body_hash,
+            last_checked_at = NOW(),
+            last_changed_at = NOW()
+    """, (url, response.headers.get('ETag'), response.headers.get('Last-Modified'), body_hash))
+    conn.commit()
+    cursor.close()
+
+
+def _touch(cursor, schema: str, url: str):
+    cursor.execute(f"""
+        UPDATE {schema}.source_fetch_state
+        SET last_checked_at = NOW()
+        WHERE url = %s
+    """, (url,))
@@ -3,11 +3,8 @@
 """
 import json
 import os
-from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import db_pool
+import sberanalytics
 
 
 def handler(event: dict, context) -> dict:
@@ -26,8 +23,11 @@ def handler(event: dict, context) -> dict:
         }
     
     if method == 'POST':
+        body_str = event.get('body') or '{}'
+        body = json.loads(body_str) if isinstance(body_str, str) else body_str
+        
         # Запускаем парсинг
-        result = scrape_sberanalytics()
+        result = scrape_sberanalytics(force=bool(body.get('force')))
         return {
             'statusCode': 200,
             'headers': {
@@ -47,59 +47,37 @@ def handler(event: dict, context) -> dict:
     }
 
 
-def scrape_sberanalytics():
+def scrape_sberanalytics(force=False):
     """Парсинг продуктов с сberanalytics.ru"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    
     try:
-        # Получаем страницу
-        response = requests.get('https://sberanalytics.ru/products', timeout=10)
-        response.raise_for_status()
+        if not database_url:
+            raise Exception('DATABASE_URL not found')
         
-        soup = BeautifulSoup(response.text, 'html.parser')
+        # Вся работа в общем модуле: тот же код конвейер ai-news-agent вызывает без HTTP
+        conn = db_pool.getconn(database_url)
+        try:
+            result = sberanalytics.scrape(conn, schema, force=force)
+        finally:
+            db_pool.putconn(conn)
         
-        # Ищем карточки продуктов
-        product_cards = soup.select('li.section-card-product__list')
-        
-        products = []
-        for card in product_cards:
-            # Заголовок
-            title_elem = card.select_one('h2')
-            if not title_elem:
-                continue
-            title = title_elem.get_text(strip=True)
-            
-            # Описание
-            desc_elem = card.select_one('p')
-            description = desc_elem.get_text(strip=True) if desc_elem else ''
-            
-            # Ссылка
-            link_elem = card.select_one('a[href]')
-            link = link_elem['href'] if link_elem else ''
-            if link and not link.startswith('http'):
-                link = f"https://sberanalytics.ru{link}"
-            
-            # Изображение
-            img_elem = card.select_one('img.section-card-product__img-product')
-            image_url = ''
-            if img_elem and img_elem.get('src'):
-                image_url = img_elem['src']
-                if image_url and not image_url.startswith('http'):
-                    image_url = f"https://sberanalytics.ru{image_url}"
-            
-            products.append({
-                'title': title,
-                'description': description,
-                'link': link,
-                'image_url': image_url
-            })
-        
-        # Сохраняем в базу данных
-        saved_count = save_to_database(products)
+        if result['skipped_unchanged']:
+            return {
+                'success': True,
+                'skipped_unchanged': True,
+                'scraped': 0,
+                'saved': 0
+            }
         
         return {
             'success': True,
-            'scraped': len(products),
-            'saved': saved_count,
-            'products': products
+            'skipped_unchanged': False,
+            'scraped': len(result['products']),
+            'saved': len(result['drafts']),
+            'skipped': len(result['products']) - len(result['drafts']),
+            'products': result['products']
         }
         
     except Exception as e:
@@ -107,47 +85,3 @@ def scrape_sberanalytics():
             'success': False,
             'error': str(e)
         }
-
-
-def save_to_database(products):
-    """Сохранение продуктов в базу данных как новостей"""
-    database_url = os.environ.get('DATABASE_URL')
-    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-    if not database_url:
-        raise Exception('DATABASE_URL not found')
-    
-    conn = psycopg2.connect(database_url)
-    cursor = conn.cursor(cursor_factory=RealDictCursor)
-    
-    saved_count = 0
-    
-    for product in products:
-        # Проверяем, есть ли уже такая новость
-        query = f"SELECT id FROM {schema}.news_articles WHERE title = %s"
-        cursor.execute(query, (product['title'],))
-        existing = cursor.fetchone()
-        
-        if not existing:
-            # Создаем новую новость
-            # description и content — обязательные поля
-            content = product['description'] or 'Новый продукт'
-            description = product['description'][:200] if product['description'] else 'Описание отсутствует'
-            
-            query = f"INSERT INTO {schema}.news_articles (title, description, content, source_url, image_url, status, created_at, updated_at) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
-            cursor.execute(query, (
-                product['title'],
-                description,
-                content,
-                product['link'],
-                product['image_url'],
-                'draft',
-                datetime.now(),
-                datetime.now()
-            ))
-            saved_count += 1
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
-    return saved_count
\ No newline at end of file
@@ -1,15 +1,13 @@
 import json
 import os
-import psycopg2
-import requests
-from typing import Optional
+import db_pool
+import social_outbox
 
 DATABASE_URL = os.environ['DATABASE_URL']
-TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN', '')
-TELEGRAM_CHANNEL_ID = os.environ.get('TELEGRAM_CHANNEL_ID', '')
+SCHEMA = os.environ.get('MAIN_DB_SCHEMA', 'public')
 
 def handler(event: dict, context) -> dict:
-    '''API для управления новостями и статьями с автопубликацией в Telegram'''
+    '''API для управления новостями и статьями с автопубликацией в Telegram (через очередь social_outbox)'''
     method = event.get('httpMethod', 'GET')
     
     if method == 'OPTIONS':
@@ -24,7 +22,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = db_pool.getconn(DATABASE_URL)
         cur = conn.cursor()
         
         if method == 'GET':
@@ -32,11 +30,15 @@ def handler(event: dict, context) -> dict:
             article_id = query_params.get('id')
             
             if article_id:
-                cur.execute('''
-                    SELECT id, title, description, content, badge, image_url, 
-                           published_date, telegram_message_id, is_published
-                    FROM news_articles 
-                    WHERE id = %s
+                cur.execute(f'''
+                    SELECT a.id, a.title, a.description, a.content, a.badge, a.image_url, 
+                           a.published_date,
+                           COALESCE(a.telegram_message_id::text, o.external_id) as telegram_message_id,
+                           a.is_published
+                    FROM news_articles a
+                    LEFT JOIN {SCHEMA}.social_outbox o
+                      ON o.article_id = a.id AND o.platform = 'telegram' AND o.status = 'sent'
+                    WHERE a.id = %s
                 ''', (article_id,))
                 row = cur.fetchone()
                 if row:
@@ -72,7 +74,7 @@ def handler(event: dict, context) -> dict:
                 } for row in rows]
             
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -97,25 +99,21 @@ def handler(event: dict, context) -> dict:
                     RETURNING id
                 ''', (title, description, content, badge, image_url, is_published))
                 article_id = cur.fetchone()[0]
-                conn.commit()
                 
-                telegram_message_id = None
-                if is_published and TELEGRAM_BOT_TOKEN and TELEGRAM_CHANNEL_ID:
-                    telegram_message_id = publish_to_telegram(title, description, content, image_url, badge)
-                    if telegram_message_id:
-                        cur.execute('''
-                            UPDATE news_articles 
-                            SET telegram_message_id = %s 
-                            WHERE id = %s
-                        ''', (telegram_message_id, article_id))
-                        conn.commit()
+                # Пост в Telegram ставится в очередь в той же транзакции, что и статья
+                queued = {}
+                if is_published:
+                    queued = social_outbox.enqueue(conn, SCHEMA, article_id, {
+                        'telegram': {'text': telegram_message(title, description, content, badge)}
+                    })
+                conn.commit()
                 
                 cur.close()
-                conn.close()
+                db_pool.putconn(conn)
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'id': article_id, 'telegram_message_id': telegram_message_id}, ensure_ascii=False)
+                    'body': json.dumps({'success': True, 'id': article_id, 'telegram_queued': 'telegram' in queued}, ensure_ascii=False)
                 }
             
             elif action == 'publish':
@@ -130,7 +128,7 @@ def handler(event: dict, context) -> dict:
                 
                 if not row:
                     cur.close()
-                    conn.close()
+                    db_pool.putconn(conn)
                     return {
                         'statusCode': 404,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -139,7 +137,7 @@ def handler(event: dict, context) -> dict:
                 
                 if row[5]:
                     cur.close()
-                    conn.close()
+                    db_pool.putconn(conn)
                     return {
                         'statusCode': 400,
                         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -148,23 +146,22 @@ def handler(event: dict, context) -> dict:
                 
                 title, description, content, image_url, badge = row[0], row[1], row[2], row[3], row[4]
                 
-                telegram_message_id = None
-                if TELEGRAM_BOT_TOKEN and TELEGRAM_CHANNEL_ID:
-                    telegram_message_id = publish_to_telegram(title, description, content, image_url, badge)
-                
                 cur.execute('''
                     UPDATE news_articles 
-                    SET is_published = true, published_date = CURRENT_TIMESTAMP, telegram_message_id = %s
+                    SET is_published = true, published_date = CURRENT_TIMESTAMP
                     WHERE id = %s
-                ''', (telegram_message_id, article_id))
+                ''', (article_id,))
+                queued = social_outbox.enqueue(conn, SCHEMA, article_id, {
+                    'telegram': {'text': telegram_message(title, description, content, badge)}
+                })
                 conn.commit()
                 cur.close()
-                conn.close()
+                db_pool.putconn(conn)
                 
                 return {
                     'statusCode': 200,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'success': True, 'telegram_message_id': telegram_message_id}, ensure_ascii=False)
+                    'body': json.dumps({'success': True, 'telegram_queued': 'telegram' in queued}, ensure_ascii=False)
                 }
         
         elif method == 'PUT':
@@ -175,7 +172,7 @@ def handler(event: dict, context) -> dict:
             row = cur.fetchone()
             if row and row[0]:
                 cur.close()
-                conn.close()
+                db_pool.putconn(conn)
                 return {
                     'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -195,7 +192,7 @@ def handler(event: dict, context) -> dict:
             ''', (title, description, content, badge, image_url, article_id))
             conn.commit()
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             
             return {
                 'statusCode': 200,
@@ -210,7 +207,7 @@ def handler(event: dict, context) -> dict:
             cur.execute('DELETE FROM news_articles WHERE id = %s', (article_id,))
             conn.commit()
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             
             return {
                 'statusCode': 200,
@@ -219,7 +216,7 @@ def handler(event: dict, context) -> dict:
             }
         
         cur.close()
-        conn.close()
+        db_pool.putconn(conn)
         return {
             'statusCode': 405,
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
@@ -233,24 +230,6 @@ def handler(event: dict, context) -> dict:
             'body': json.dumps({'error': str(e)}, ensure_ascii=False)
         }
 
-def publish_to_telegram(title: str, description: str, content: str, image_url: Optional[str], badge: str) -> Optional[int]:
-    '''Публикация статьи в Telegram канал'''
-    try:
-        message_text = f"🔔 <b>{badge}</b>\n\n<b>{title}</b>\n\n{description}\n\n{content[:500]}..."
-        
-        url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-        payload = {
-            'chat_id': TELEGRAM_CHANNEL_ID,
-            'text': message_text,
-            'parse_mode': 'HTML'
-        }
-        
-        response = requests.post(url, json=payload, timeout=10)
-        response_data = response.json()
-        
-        if response_data.get('ok'):
-            return response_data['result']['message_id']
-        return None
-    except Exception as e:
-        print(f"Telegram error: {e}")
-        return None
+def telegram_message(title: str, description: str, content: str, badge: str) -> str:
+    '''Текст поста статьи для Telegram канала'''
+    return f"🔔 <b>{badge}</b>\n\n<b>{title}</b>\n\n{description}\n\n{(content or '')[:500]}..."
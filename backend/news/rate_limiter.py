@@ -0,0 +1,77 @@
+"""
+Token bucket на каждую пару (площадка, канал) с состоянием в Postgres: общий для всех экземпляров функций
+"""
+import os
+
+# (ёмкость корзины, токенов в секунду); один токен — одна публикация
+LIMITS = {
+    # Telegram: около 20 сообщений в минуту в один канал
+    'telegram': (
+        int(os.environ.get('RATE_LIMIT_TELEGRAM_BURST', '3')),
+        float(os.environ.get('RATE_LIMIT_TELEGRAM_PER_MINUTE', '20')) / 60
+    ),
+    # VK: пост — до четырёх вызовов API при лимите в несколько запросов в секунду на ключ
+    'vk': (
+        int(os.environ.get('RATE_LIMIT_VK_BURST', '2')),
+        float(os.environ.get('RATE_LIMIT_VK_PER_MINUTE', '30')) / 60
+    )
+}
+DEFAULT_LIMIT = (1, 1.0)
+
+
+def acquire(conn, schema: str, platform: str, channel: str, wanted: int = 1) -> tuple:
+    """Взять до wanted токенов: (выдано, секунд до следующего токена, секунд на один токен)
+
+    Строка корзины блокируется FOR UPDATE, поэтому параллельные воркеры не получат один токен дважды.
+    """
+    capacity, rate = LIMITS.get(platform, DEFAULT_LIMIT)
+    interval = 1 / rate
+    cursor = conn.cursor()
+
+    cursor.execute(f"""
+        INSERT INTO {schema}.rate_limit_buckets (platform, channel, tokens, updated_at)
+        VALUES (%s, %s, %s, clock_timestamp())
+        ON CONFLICT (platform, channel) DO NOTHING
+    """, (platform, channel, capacity))
+    cursor.execute(f"""
+        SELECT tokens,
+               EXTRACT(EPOCH FROM clock_timestamp() - updated_at),
+               COALESCE(EXTRACT(EPOCH FROM blocked_until - clock_timestamp()), 0)
+        FROM {schema}.rate_limit_buckets
+        WHERE platform = %s AND channel = %s
+        FOR UPDATE
+    """, (platform, channel))
+    tokens, elapsed, blocked = (float(value) for value in cursor.fetchone())
+
+    # Площадка вернула 429 с retry_after: до его истечения токены не выдаются
+    if blocked > 0:
+        conn.commit()
+        cursor.close()
+        return 0, blocked, interval
+
+    tokens = min(capacity, tokens + elapsed * rate)
+    granted = min(wanted, int(tokens))
+    tokens -= granted
+
+    cursor.execute(f"""
+        UPDATE {schema}.rate_limit_buckets
+        SET tokens = %s, updated_at = clock_timestamp()
+        WHERE platform = %s AND channel = %s
+    """, (tokens, platform, channel))
+    conn.commit()
+    cursor.close()
+
+    return granted, (1 - tokens) * interval if tokens < 1 else 0, interval
+
+
+def block(conn, schema: str, platform: str, channel: str, seconds: float):
+    """Остановить выдачу токенов на seconds (retry_after из ответа 429); коммит за вызывающим"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {schema}.rate_limit_buckets
+        SET tokens = 0, updated_at = clock_timestamp() + make_interval(secs => %s),
+            blocked_until = GREATEST(COALESCE(blocked_until, clock_timestamp()),
+                                     clock_timestamp() + make_interval(secs => %s))
+        WHERE platform = %s AND channel = %s
+    """, (seconds, seconds, platform, channel))
+    cursor.close()
@@ -1,8 +1,25 @@
+import hashlib
 import json
 import os
-import psycopg2
+import db_pool
 from datetime import datetime
 
+# Сколько часов ключ идемпотентности защищает от повторного создания заявки
+IDEMPOTENCY_TTL_HOURS = int(os.environ.get('ORDER_IDEMPOTENCY_TTL_HOURS', '24'))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+
+def get_idempotency_key(event: dict, body: dict) -> str:
+    """Ключ из заголовка Idempotency-Key или поля idempotencyKey в теле"""
+    headers = event.get('headers') or {}
+    key = next((v for k, v in headers.items() if k.lower() == 'idempotency-key'), None)
+    return str(key or body.get('idempotencyKey') or '').strip()
+
+
+def request_hash(fields: tuple) -> str:
+    return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode()).hexdigest()
+
+
 def handler(event: dict, context) -> dict:
     """API для обработки заявок на услуги"""
     
@@ -14,7 +31,7 @@ def handler(event: dict, context) -> dict:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Headers': 'Content-Type, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -30,6 +47,7 @@ def handler(event: dict, context) -> dict:
         email = body.get('email', '')
         company = body.get('company', '')
         comment = body.get('comment', '')
+        idempotency_key = get_idempotency_key(event, body)
         
         if not all([service, price, name, phone]):
             return {
@@ -41,31 +59,82 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'Заполните обязательные поля'}, ensure_ascii=False)
             }
         
+        if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Слишком длинный ключ идемпотентности'}, ensure_ascii=False)
+            }
+        
+        fields = (service, price, name, phone, email, company, comment)
+        fields_hash = request_hash(fields) if idempotency_key else None
+        
         try:
-            conn = psycopg2.connect(os.environ['DATABASE_URL'])
+            conn = db_pool.getconn(os.environ['DATABASE_URL'])
             cur = conn.cursor()
             
+            if idempotency_key:
+                # Истёкший ключ освобождается, чтобы его можно было использовать снова
+                cur.execute("""
+                    UPDATE t_p81470733_business_helper_app.orders
+                    SET idempotency_key = NULL
+                    WHERE idempotency_key = %s AND idempotency_expires_at < NOW()
+                """, (idempotency_key,))
+            
+            # При повторе с тем же ключом вставка не выполняется и RETURNING ничего не возвращает
             cur.execute("""
                 INSERT INTO t_p81470733_business_helper_app.orders 
-                (service, price, name, phone, email, company, comment, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                (service, price, name, phone, email, company, comment, created_at,
+                 idempotency_key, idempotency_request_hash, idempotency_expires_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                        CASE WHEN %s IS NULL THEN NULL ELSE NOW() + make_interval(hours => %s) END)
+                ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
                 RETURNING id
-            """, (service, price, name, phone, email, company, comment, datetime.now()))
+            """, (*fields, datetime.now(), idempotency_key or None, fields_hash,
+                  idempotency_key or None, IDEMPOTENCY_TTL_HOURS))
+            
+            row = cur.fetchone()
+            replayed = row is None
+            if replayed:
+                cur.execute("""
+                    SELECT id, idempotency_request_hash
+                    FROM t_p81470733_business_helper_app.orders
+                    WHERE idempotency_key = %s
+                """, (idempotency_key,))
+                row = cur.fetchone()
             
-            order_id = cur.fetchone()[0]
+            order_id = row[0]
             conn.commit()
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
+            
+            if replayed and row[1] != fields_hash:
+                return {
+                    'statusCode': 422,
+                    'headers': {
+                        'Content-Type': 'application/json',
+                        'Access-Control-Allow-Origin': '*'
+                    },
+                    'body': json.dumps({
+                        'error': 'Ключ идемпотентности уже использован для другой заявки',
+                        'orderId': order_id
+                    }, ensure_ascii=False)
+                }
             
             return {
-                'statusCode': 201,
+                'statusCode': 200 if replayed else 201,
                 'headers': {
                     'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
+                    'Access-Control-Allow-Origin': '*',
+                    'Idempotent-Replayed': 'true' if replayed else 'false'
                 },
                 'body': json.dumps({
                     'success': True,
                     'orderId': order_id,
+                    'replayed': replayed,
                     'message': 'Заявка успешно отправлена'
                 }, ensure_ascii=False)
             }
@@ -1,8 +1,128 @@
+import base64
+import csv
+import gzip
+import io
 import json
 import os
-import psycopg2
+import db_pool
+from datetime import datetime
 from psycopg2.extras import RealDictCursor
 
+ORDER_COLUMNS = ('id', 'service', 'price', 'name', 'phone', 'email', 'company', 'comment', 'status', 'created_at')
+# Максимальный размер страницы в постраничном режиме
+MAX_PAGE_SIZE = 200
+# Сколько строк выгрузки читается с сервера за один раз
+EXPORT_CHUNK_ROWS = int(os.environ.get('ORDERS_EXPORT_CHUNK_ROWS', '1000'))
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'orders.csv'),
+    'ndjson': ('application/x-ndjson', 'orders.ndjson')
+}
+
+
+def serialize_order(order: dict) -> dict:
+    return {
+        **order,
+        'created_at': order['created_at'].isoformat() if order['created_at'] else None
+    }
+
+
+def encode_cursor(order: dict) -> str:
+    """Курсор на последнюю заявку страницы: (created_at, id); created_at может быть null"""
+    raw = json.dumps([order['created_at'], order['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> tuple:
+    """Разбор курсора из параметра ?after="""
+    padded = token + '=' * (-len(token) % 4)
+    created_at, order_id = json.loads(base64.urlsafe_b64decode(padded))
+    return datetime.fromisoformat(created_at) if created_at is not None else None, int(order_id)
+
+
+def filter_clause(status, after) -> tuple:
+    """WHERE по статусу и позиции курсора (created_at DESC, id DESC)"""
+    conditions = []
+    params = []
+    if status:
+        conditions.append('status = %s')
+        params.append(status)
+    if after:
+        after_created, after_id = after
+        # В ORDER BY created_at DESC заявки без даты идут первыми (NULLS FIRST)
+        if after_created is None:
+            conditions.append('(created_at IS NOT NULL OR id < %s)')
+            params.append(after_id)
+        else:
+            conditions.append('(created_at, id) < (%s, %s)')
+            params.extend(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where, params
+
+
+def iter_export_chunks(conn, export_format: str, status):
+    """Строки выгрузки порциями из именованного (серверного) курсора"""
+    where, params = filter_clause(status, None)
+    cur = conn.cursor(name='orders_export')
+    cur.itersize = EXPORT_CHUNK_ROWS
+    cur.execute(f"""
+        SELECT {', '.join(ORDER_COLUMNS)}
+        FROM t_p81470733_business_helper_app.orders
+        {where}
+        ORDER BY created_at DESC, id DESC
+    """, params)
+    
+    if export_format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ORDER_COLUMNS)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    
+    try:
+        while True:
+            rows = cur.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                break
+            if export_format == 'csv':
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield ''.join(
+                    json.dumps(serialize_order(dict(zip(ORDER_COLUMNS, row))), ensure_ascii=False) + '\n'
+                    for row in rows
+                )
+    finally:
+        cur.close()
+
+
+def export_orders(conn, export_format: str, status) -> dict:
+    """Выгрузка всех заявок: порции сразу сжимаются, в памяти держится только gzip-тело"""
+    content_type, filename = EXPORT_FORMATS[export_format]
+    compressed = io.BytesIO()
+    with gzip.GzipFile(fileobj=compressed, mode='wb') as archive:
+        if export_format == 'csv':
+            # BOM, чтобы Excel открыл кириллицу в UTF-8
+            archive.write('\ufeff'.encode('utf-8'))
+        for chunk in iter_export_chunks(conn, export_format, status):
+            archive.write(chunk.encode('utf-8'))
+    conn.commit()
+    
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': content_type,
+            'Content-Encoding': 'gzip',
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'isBase64Encoded': True,
+        'body': base64.b64encode(compressed.getvalue()).decode()
+    }
+
+
 def handler(event: dict, context) -> dict:
     """API для получения списка заявок"""
     
@@ -21,35 +141,76 @@ def handler(event: dict, context) -> dict:
         }
     
     if method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        status = query_params.get('status')
+        export_format = query_params.get('format')
+        limit = query_params.get('limit')
+        after = query_params.get('after')
+        
+        if export_format and export_format not in EXPORT_FORMATS:
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Формат выгрузки: csv или ndjson'}, ensure_ascii=False)
+            }
+        
         try:
-            conn = psycopg2.connect(os.environ['DATABASE_URL'])
+            if limit is not None:
+                limit = int(limit)
+                if limit < 1:
+                    raise ValueError('limit')
+                limit = min(limit, MAX_PAGE_SIZE)
+            after = decode_cursor(after) if after else None
+        except (ValueError, TypeError):
+            return {
+                'statusCode': 400,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps({'error': 'Некорректный limit или курсор'}, ensure_ascii=False)
+            }
+        
+        try:
+            conn = db_pool.getconn(os.environ['DATABASE_URL'])
+            
+            if export_format:
+                response = export_orders(conn, export_format, status)
+                db_pool.putconn(conn)
+                return response
+            
             cur = conn.cursor(cursor_factory=RealDictCursor)
             
-            cur.execute("""
-                SELECT id, service, price, name, phone, email, company, comment, status, created_at
-                FROM t_p81470733_business_helper_app.orders
-                ORDER BY created_at DESC
-            """)
+            # Постраничный режим: ?limit=N[&after=курсор][&status=...] — ключевая пагинация по (created_at, id)
+            paginated = limit is not None or after is not None
+            where, params = filter_clause(status, after)
+            page_size = limit or MAX_PAGE_SIZE
             
-            orders = cur.fetchall()
+            cur.execute(f"""
+                SELECT {', '.join(ORDER_COLUMNS)}
+                FROM t_p81470733_business_helper_app.orders
+                {where}
+                ORDER BY created_at DESC, id DESC
+                {f'LIMIT {page_size + 1}' if paginated else ''}
+            """, params)
             
-            result = []
-            for order in orders:
-                result.append({
-                    'id': order['id'],
-                    'service': order['service'],
-                    'price': order['price'],
-                    'name': order['name'],
-                    'phone': order['phone'],
-                    'email': order['email'],
-                    'company': order['company'],
-                    'comment': order['comment'],
-                    'status': order['status'],
-                    'created_at': order['created_at'].isoformat() if order['created_at'] else None
-                })
+            result = [serialize_order(order) for order in cur.fetchall()]
             
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
+            
+            if paginated:
+                has_more = len(result) > page_size
+                result = result[:page_size]
+                body = {
+                    'orders': result,
+                    'next_cursor': encode_cursor(result[-1]) if has_more else None
+                }
+            else:
+                body = result
             
             return {
                 'statusCode': 200,
@@ -57,7 +218,7 @@ def handler(event: dict, context) -> dict:
                     'Content-Type': 'application/json',
                     'Access-Control-Allow-Origin': '*'
                 },
-                'body': json.dumps(result, ensure_ascii=False)
+                'body': json.dumps(body, ensure_ascii=False)
             }
             
         except Exception as e:
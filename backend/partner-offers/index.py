@@ -1,6 +1,7 @@
 import json
 import os
-import psycopg2
+import db_pool
+import response_cache
 from datetime import datetime
 
 def handler(event: dict, context) -> dict:
@@ -28,7 +29,16 @@ def handler(event: dict, context) -> dict:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(dsn)
+    if method == 'GET':
+        cached = response_cache.get(response_cache.make_key(event))
+        if cached:
+            etag, body = cached
+            return {
+                **response_cache.build_response(event, etag, body, {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}),
+                'isBase64Encoded': False
+            }
+    
+    conn = db_pool.getconn(dsn)
     cur = conn.cursor()
     
     try:
@@ -71,10 +81,11 @@ def handler(event: dict, context) -> dict:
                     'updatedAt': row[12].isoformat() if row[12] else None
                 })
             
+            body = json.dumps(offers)
+            etag = response_cache.put(response_cache.make_key(event), body)
+            
             return {
-                'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps(offers),
+                **response_cache.build_response(event, etag, body, {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}),
                 'isBase64Encoded': False
             }
         
@@ -109,6 +120,7 @@ def handler(event: dict, context) -> dict:
             
             new_id = cur.fetchone()[0]
             conn.commit()
+            response_cache.invalidate()
             
             return {
                 'statusCode': 201,
@@ -149,6 +161,7 @@ def handler(event: dict, context) -> dict:
             """, (category, partner, partner_logo, title, description, price, old_price, features, rating, reviews, datetime.now(), offer_id))
             
             conn.commit()
+            response_cache.invalidate()
             
             return {
                 'statusCode': 200,
@@ -175,6 +188,7 @@ def handler(event: dict, context) -> dict:
             """, (offer_id,))
             
             conn.commit()
+            response_cache.invalidate()
             
             return {
                 'statusCode': 200,
@@ -193,4 +207,4 @@ def handler(event: dict, context) -> dict:
     
     finally:
         cur.close()
-        conn.close()
+        db_pool.putconn(conn)
@@ -0,0 +1,98 @@
+"""
+Разбор cron-выражений из пяти полей и расчёт следующего времени запуска
+"""
+from datetime import datetime, time, timedelta
+
+# (название, минимум, максимум)
+FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    # Воскресенье — и 0, и 7
+    ('weekday', 0, 7)
+)
+
+ALIASES = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *'
+}
+
+# Дальше этого горизонта совпадений нет (например, 31 февраля)
+SEARCH_DAYS = 366 * 5
+
+
+class CronError(ValueError):
+    """Некорректное cron-выражение"""
+
+
+def _parse_field(value: str, name: str, low: int, high: int) -> set:
+    result = set()
+    for part in value.split(','):
+        base, _, step = part.partition('/')
+        try:
+            step = int(step) if step else 1
+            if base == '*':
+                start, end = low, high
+            elif '-' in base:
+                start, end = (int(x) for x in base.split('-', 1))
+            else:
+                start = int(base)
+                end = high if step > 1 else start
+        except ValueError:
+            raise CronError(f'invalid {name} field: {value}')
+
+        if step < 1 or start < low or end > high or start > end:
+            raise CronError(f'invalid {name} field: {value}')
+        result.update(range(start, end + 1, step))
+    return result
+
+
+def parse(expr: str) -> dict:
+    """Множества допустимых значений по полям и признаки «любой день» для day/weekday"""
+    expr = ALIASES.get(expr.strip(), expr.strip())
+    values = expr.split()
+    if len(values) != len(FIELDS):
+        raise CronError(f'expected {len(FIELDS)} fields: {expr}')
+
+    schedule = {
+        name: _parse_field(value, name, low, high)
+        for value, (name, low, high) in zip(values, FIELDS)
+    }
+    schedule['weekday'] = {value % 7 for value in schedule['weekday']}
+    schedule['any_day'] = values[2].startswith('*')
+    schedule['any_weekday'] = values[4].startswith('*')
+    return schedule
+
+
+def _day_matches(schedule: dict, day) -> bool:
+    in_month = day.day in schedule['day']
+    in_week = day.isoweekday() % 7 in schedule['weekday']
+    # Как в cron: если ограничены оба поля, достаточно совпадения любого
+    if schedule['any_day']:
+        return in_week
+    if schedule['any_weekday']:
+        return in_month
+    return in_month or in_week
+
+
+def next_after(expr: str, after: datetime) -> datetime:
+    """Ближайший момент строго позже after, подходящий под выражение"""
+    schedule = parse(expr)
+    start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    hours = sorted(schedule['hour'])
+    minutes = sorted(schedule['minute'])
+
+    day = start.date()
+    for _ in range(SEARCH_DAYS):
+        if day.month in schedule['month'] and _day_matches(schedule, day):
+            first = (start.hour, start.minute) if day == start.date() else (0, 0)
+            for hour in hours:
+                for minute in minutes:
+                    if (hour, minute) >= first:
+                        return datetime.combine(day, time(hour, minute))
+        day += timedelta(days=1)
+
+    raise CronError(f'no matching time: {expr}')
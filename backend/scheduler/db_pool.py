@@ -0,0 +1,110 @@
+"""
+Пул соединений с PostgreSQL, который живёт между тёплыми вызовами контейнера
+"""
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+
+# Сколько свободных соединений на один DSN держать между вызовами
+MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+# Как долго соединение может простаивать без проверки через SELECT 1
+PING_INTERVAL = float(os.environ.get('DB_POOL_PING_INTERVAL', '30'))
+
+_lock = threading.Lock()
+_idle = {}
+_owner = weakref.WeakKeyDictionary()
+_stats = {'hits': 0, 'misses': 0, 'reconnects': 0}
+
+
+def _is_alive(conn, idle_for: float) -> bool:
+    """Проверка, что соединение ещё живое (после failover старые соединения мертвы)"""
+    if conn.closed:
+        return False
+    if idle_for < PING_INTERVAL:
+        return True
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.close()
+        conn.rollback()
+        return True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        return False
+
+
+def _discard(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def getconn(dsn: Optional[str] = None):
+    """Взять соединение из пула или открыть новое"""
+    dsn = dsn or os.environ['DATABASE_URL']
+
+    with _lock:
+        idle = _idle.setdefault(dsn, [])
+
+        while idle:
+            conn, last_used = idle.pop()
+            idle_for = time.monotonic() - last_used
+
+            if _is_alive(conn, idle_for):
+                _stats['hits'] += 1
+                _owner[conn] = dsn
+                return conn
+
+            # Соединение умерло — вероятно, был failover, остальные свободные тоже сбрасываем
+            _discard(conn)
+            for stale, _ in idle:
+                _discard(stale)
+            idle.clear()
+            _stats['reconnects'] += 1
+
+    conn = psycopg2.connect(dsn)
+
+    with _lock:
+        _stats['misses'] += 1
+        _owner[conn] = dsn
+    # Логируем только новые соединения (промах или переподключение после failover), не каждый вызов
+    print(f'[DB pool] new connection: {pool_stats()}')
+    return conn
+
+
+def putconn(conn):
+    """Вернуть соединение в пул (вместо conn.close())"""
+    with _lock:
+        dsn = _owner.pop(conn, None)
+
+    keep = dsn is not None and not conn.closed
+    if keep:
+        try:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                keep = False
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            keep = False
+
+    with _lock:
+        if keep and len(_idle[dsn]) < MAX_SIZE:
+            _idle[dsn].append((conn, time.monotonic()))
+        else:
+            _discard(conn)
+
+
+def pool_stats() -> dict:
+    """Счётчики попаданий/промахов пула для текущего контейнера"""
+    with _lock:
+        return {
+            **_stats,
+            'idle': sum(len(conns) for conns in _idle.values()),
+            'in_use': len(_owner)
+        }
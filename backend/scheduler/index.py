@@ -1,54 +1,87 @@
 """
-Планировщик для автоматического запуска ИИ-агента по расписанию
+Планировщик задач по cron-расписанию из таблицы scheduled_jobs
 """
 import json
 import os
+import time
 from datetime import datetime
-import requests
+import background_jobs
+import db_pool
+import jobs
+import news_agent
+
+# Адрес этой же функции: фоновый tick выполняет отдельный её вызов
+SELF_URL = os.environ.get('SCHEDULER_URL', 'https://functions.poehali.dev/38107b77-1b0c-4bb7-b18b-f5164553c08b')
 
 
 def handler(event: dict, context) -> dict:
-    """Автоматический запуск ИИ-агента по расписанию"""
+    """Срабатывание внешнего таймера запускает наступившие задачи; GET — расписание и история запусков"""
     method = event.get('httpMethod', 'GET')
-    
+
     if method == 'OPTIONS':
         return {
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
+                'Access-Control-Allow-Headers': 'Content-Type, Prefer'
             },
             'body': ''
         }
-    
-    if method == 'POST':
-        # Запускаем полный цикл агента
-        result = run_scheduled_job()
+
+    # Таймер Yandex Cloud присылает событие без httpMethod, со списком messages
+    if method == 'POST' or event.get('messages'):
+        body_str = event.get('body') or '{}'
+        body = json.loads(body_str) if isinstance(body_str, str) else body_str
+
+        if body.get('action') == 'work':
+            # Вызов-исполнитель фонового tick
+            result = run_background_job(body.get('job_id'), context)
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/json',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': json.dumps(result, ensure_ascii=False, default=str)
+            }
+
+        # {"action": "run", "job": "<name>"} запускает задачу сейчас, не дожидаясь расписания
+        only = body.get('job') if body.get('action') == 'run' else None
+        if wants_async(event, body):
+            return start_background_job('scheduler_tick', {'job': only})
+        result = run_scheduled_job(context, only)
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps(result, ensure_ascii=False)
+            'body': json.dumps(result, ensure_ascii=False, default=str)
         }
-    
+
     if method == 'GET':
-        # Информация о планировщике
+        params = event.get('queryStringParameters') or {}
+        if params.get('job_id'):
+            return get_background_job(params, context)
+
+        # Реальные последний и следующий запуски из таблицы расписания
+        database_url = os.environ.get('DATABASE_URL')
+        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+        conn = db_pool.getconn(database_url)
+        stats = jobs.get_stats(conn, schema)
+        db_pool.putconn(conn)
+
         return {
             'statusCode': 200,
             'headers': {
                 'Content-Type': 'application/json',
                 'Access-Control-Allow-Origin': '*'
             },
-            'body': json.dumps({
-                'status': 'active',
-                'last_run': datetime.now().isoformat(),
-                'schedule': 'Manual trigger via webhook'
-            }, ensure_ascii=False)
+            'body': json.dumps({'status': 'active', **stats}, ensure_ascii=False, default=str)
         }
-    
+
     return {
         'statusCode': 405,
         'headers': {
@@ -59,35 +92,106 @@ def handler(event: dict, context) -> dict:
     }
 
 
-def run_scheduled_job():
-    """Запуск полного цикла ИИ-агента"""
-    ai_agent_url = 'https://functions.poehali.dev/c42f2362-0697-4b7f-acd6-202c45772cba'
-    
+def run_scheduled_job(context=None, only=None):
+    """Один tick: наступившие задачи выполняются в этом же процессе с ограничением параллельности"""
     try:
-        response = requests.post(
-            ai_agent_url,
-            headers={'Content-Type': 'application/json'},
-            json={'action': 'auto'},
-            timeout=120
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return {
-                'success': True,
-                'timestamp': datetime.now().isoformat(),
-                'result': result
-            }
-        else:
-            return {
-                'success': False,
-                'error': f'Agent returned status {response.status_code}',
-                'timestamp': datetime.now().isoformat()
-            }
-            
+        result = jobs.tick(context, only)
+        return {
+            'success': all(run['status'] == 'success' for run in result['runs']),
+            'timestamp': datetime.now().isoformat(),
+            **result
+        }
+
     except Exception as e:
         return {
             'success': False,
             'error': str(e),
             'timestamp': datetime.now().isoformat()
         }
+
+
+def wants_async(event: dict, body: dict) -> bool:
+    """Клиент просит фоновый запуск: {"async": true} или заголовок Prefer: respond-async"""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    return bool(body.get('async')) or 'respond-async' in headers.get('prefer', '')
+
+
+def start_background_job(kind: str, params: dict) -> dict:
+    """Поставить фоновый запуск, разбудить исполнителя и сразу ответить 202"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    conn = db_pool.getconn(database_url)
+    job_id = background_jobs.create(conn, schema, kind, params)
+    db_pool.putconn(conn)
+
+    background_jobs.trigger(SELF_URL, job_id)
+
+    status_url = f'{SELF_URL}?job_id={job_id}'
+    return {
+        'statusCode': 202,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Location': status_url
+        },
+        'body': json.dumps({'success': True, 'job_id': job_id, 'status': 'queued', 'status_url': status_url})
+    }
+
+
+def run_background_job(job_id, context):
+    """Выполнить поставленный фоновый запуск в этом вызове"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    lease_seconds = max(60, int(news_agent.run_deadline(context) - time.monotonic()) + news_agent.DEADLINE_MARGIN_SECONDS)
+    conn = db_pool.getconn(database_url)
+    job = background_jobs.claim(conn, schema, list(jobs.BACKGROUND_RUNNERS), lease_seconds, job_id)
+    db_pool.putconn(conn)
+
+    if job is None:
+        return {'success': False, 'error': 'Job not found or already running'}
+
+    return background_jobs.execute(database_url, schema, job, jobs.BACKGROUND_RUNNERS, context)
+
+
+def get_background_job(params: dict, context) -> dict:
+    """Статус фонового запуска; wait=N держит запрос до N секунд, пока не появится версия новее version"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    try:
+        wait_seconds = float(params.get('wait') or 0)
+        version = int(params['version']) if params.get('version') not in (None, '') else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'wait and version must be numbers'})
+        }
+
+    # Ожидание не переживает таймаут самого вызова
+    wait_seconds = min(wait_seconds, news_agent.run_deadline(context) - time.monotonic())
+    job = background_jobs.wait_for(database_url, schema, params['job_id'], version, wait_seconds)
+
+    if job is None:
+        return {
+            'statusCode': 404,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            },
+            'body': json.dumps({'error': 'Job not found'})
+        }
+
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps(job, ensure_ascii=False, default=str)
+    }
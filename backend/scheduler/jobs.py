@@ -0,0 +1,291 @@
+"""
+Задачи по расписанию: захват наступивших задач с арендой, запуск с ограничением параллельности, история запусков
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from psycopg2.extras import RealDictCursor, execute_values
+
+import background_jobs
+import cron
+import db_pool
+import news_agent
+import partitions
+import recommendations
+import rollups
+import social_outbox
+
+# Сколько задач может выполняться одновременно во всех экземплярах планировщика
+MAX_CONCURRENT_JOBS = int(os.environ.get('SCHEDULER_MAX_CONCURRENT_JOBS', '2'))
+# Аренда задачи не короче этого, даже если вызову осталось меньше времени
+MIN_LEASE_SECONDS = 60
+# Сколько дней хранить историю запусков
+HISTORY_DAYS = int(os.environ.get('SCHEDULER_HISTORY_DAYS', '30'))
+RECENT_RUNS = 20
+
+WORKER_ID = social_outbox.WORKER_ID
+
+
+def run_news_pipeline(params: dict, context) -> dict:
+    """Полный цикл новостей в этом же процессе"""
+    return news_agent.auto_pipeline(context, force=bool(params.get('force')))
+
+
+def run_outbox_drain(params: dict, context) -> dict:
+    """Дослать сообщения social_outbox, отложенные лимитами или ошибками площадок"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    conn = db_pool.getconn(database_url)
+    try:
+        summary = social_outbox.drain(
+            conn, schema, limit=int(params.get('limit', 20)), deadline=news_agent.run_deadline(context)
+        )
+    finally:
+        db_pool.putconn(conn)
+    summary.pop('results', None)
+    return {'success': True, **summary}
+
+
+def run_background_jobs(params: dict, context) -> dict:
+    """Выполнить фоновые запуски, которые не подхватил вызов-исполнитель (или бросил по таймауту)"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    deadline = news_agent.run_deadline(context)
+
+    executed = []
+    while time.monotonic() < deadline:
+        lease_seconds = max(MIN_LEASE_SECONDS, int(deadline - time.monotonic()) + news_agent.DEADLINE_MARGIN_SECONDS)
+        conn = db_pool.getconn(database_url)
+        job = background_jobs.claim(conn, schema, list(BACKGROUND_RUNNERS), lease_seconds)
+        db_pool.putconn(conn)
+        if job is None:
+            break
+        result = background_jobs.execute(database_url, schema, job, BACKGROUND_RUNNERS, context)
+        executed.append({'id': job['id'], 'kind': job['kind'], 'success': result.get('success', True)})
+    return {'success': True, 'executed': executed}
+
+
+def analytics_task(task):
+    """Задача аналитики task(conn) из модулей analytics как тип задачи планировщика"""
+    def run(params: dict, context) -> dict:
+        conn = db_pool.getconn(os.environ.get('DATABASE_URL'))
+        try:
+            result = task(conn)
+        finally:
+            db_pool.putconn(conn)
+        return {'success': True, **result}
+    return run
+
+
+def run_tick_job(params: dict, context, on_progress) -> dict:
+    """Исполнитель фонового запуска вида scheduler_tick"""
+    result = tick(context, params.get('job'))
+    return {'success': all(run['status'] == 'success' for run in result['runs']), **result}
+
+
+# Типы задач: job_type → функция(params, context), возвращающая словарь результата
+JOB_TYPES = {
+    'news_pipeline': run_news_pipeline,
+    'outbox_drain': run_outbox_drain,
+    'background_jobs': run_background_jobs,
+    # Партиции user_actions на месяцы вперёд и политика хранения старых
+    'analytics_partitions': analytics_task(partitions.maintain),
+    # Свёртка новых событий в агрегаты отчётов и HLL-скетчи
+    'analytics_rollup': analytics_task(rollups.compact),
+    # Полная пересборка скетчей по свёрнутым событиям (сверка и первичное заполнение)
+    'analytics_sketches': analytics_task(rollups.rebuild_sketches),
+    # Пересчёт item_similarities для рекомендаций
+    'analytics_recommendations': analytics_task(recommendations.rebuild)
+}
+
+# Фоновые запуски (background_jobs.kind), которые умеет выполнять планировщик
+BACKGROUND_RUNNERS = {
+    'scheduler_tick': run_tick_job,
+    'auto_pipeline': news_agent.run_pipeline_job
+}
+
+
+def claim(conn, schema: str, lease_seconds: int, only: str = None) -> list:
+    """Захватить наступившие задачи в пределах MAX_CONCURRENT_JOBS и сразу сдвинуть их next_run_at
+
+    Задача с неистёкшей арендой не берётся, поэтому долгий запуск не перекрывается следующим.
+    only — запустить одну задачу сейчас, не дожидаясь её расписания.
+    """
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"""
+        UPDATE {schema}.scheduled_jobs
+        SET locked_by = %(worker)s, locked_until = NOW() + make_interval(secs => %(lease)s), updated_at = NOW()
+        WHERE name IN (
+            SELECT name FROM {schema}.scheduled_jobs
+            WHERE enabled
+              AND (%(only)s::text IS NULL AND next_run_at <= NOW() OR name = %(only)s)
+              AND (locked_until IS NULL OR locked_until < NOW())
+            ORDER BY next_run_at
+            LIMIT GREATEST(%(cap)s - (
+                SELECT COUNT(*) FROM {schema}.scheduled_jobs WHERE locked_until >= NOW()
+            ), 0)
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING name, job_type, cron, params, LOCALTIMESTAMP AS claimed_at
+    """, {'worker': WORKER_ID, 'lease': lease_seconds, 'only': only, 'cap': MAX_CONCURRENT_JOBS})
+    claimed = cursor.fetchall()
+    cursor.close()
+
+    # Пропущенные запуски не догоняются: следующий считается от текущего момента
+    schedule, invalid = [], []
+    for job in claimed:
+        try:
+            schedule.append((job['name'], cron.next_after(job['cron'], job['claimed_at'])))
+        except cron.CronError as e:
+            invalid.append(job['name'])
+            print(f"[Scheduler] {job['name']} disabled: {e}")
+
+    cursor = conn.cursor()
+    if schedule:
+        execute_values(cursor, f"""
+            UPDATE {schema}.scheduled_jobs AS j
+            SET next_run_at = v.next_run_at
+            FROM (VALUES %s) AS v(name, next_run_at)
+            WHERE j.name = v.name
+        """, schedule)
+    if invalid:
+        cursor.execute(f"""
+            UPDATE {schema}.scheduled_jobs
+            SET enabled = FALSE, locked_by = NULL, locked_until = NULL, last_status = 'invalid_cron'
+            WHERE name = ANY(%s)
+        """, (invalid,))
+    conn.commit()
+    cursor.close()
+
+    jobs = [job for job in claimed if job['name'] not in invalid]
+    for job in jobs:
+        if isinstance(job['params'], str):
+            job['params'] = json.loads(job['params'])
+    return jobs
+
+
+def run_job(job: dict, context) -> dict:
+    """Выполнить задачу и вернуть запись о запуске: статус, результат, ошибка, длительность"""
+    started = time.monotonic()
+    runner = JOB_TYPES.get(job['job_type'])
+    result, error = None, None
+    try:
+        if runner is None:
+            raise ValueError(f"Unknown job type: {job['job_type']}")
+        result = runner(job['params'] or {}, context)
+        status = 'success' if result.get('success', True) else 'failed'
+        error = result.get('error')
+    except Exception as e:
+        status, error = 'failed', str(e)
+    return {
+        'job': job['name'],
+        'status': status,
+        'duration_ms': round((time.monotonic() - started) * 1000),
+        'result': result,
+        'error': error
+    }
+
+
+def finish(conn, schema: str, runs: list, release: bool = True):
+    """Записать запуски в историю и обновить last_* задач; release=False оставляет аренду до истечения"""
+    cursor = conn.cursor()
+    for run in runs:
+        result = json.dumps(run['result'], ensure_ascii=False, default=str) if run['result'] is not None else None
+        cursor.execute(f"""
+            INSERT INTO {schema}.scheduled_job_runs (job_name, status, started_at, duration_ms, worker, result, error)
+            VALUES (%s, %s, NOW() - make_interval(secs => %s / 1000.0), %s, %s, %s, %s)
+        """, (run['job'], run['status'], run['duration_ms'], run['duration_ms'], WORKER_ID, result, run['error']))
+        cursor.execute(f"""
+            UPDATE {schema}.scheduled_jobs
+            SET last_run_at = NOW() - make_interval(secs => %s / 1000.0),
+                last_status = %s,
+                last_duration_ms = %s,
+                locked_by = CASE WHEN %s THEN NULL ELSE locked_by END,
+                locked_until = CASE WHEN %s THEN NULL ELSE locked_until END,
+                updated_at = NOW()
+            WHERE name = %s AND locked_by = %s
+        """, (run['duration_ms'], run['status'], run['duration_ms'], release, release, run['job'], WORKER_ID))
+    conn.commit()
+    cursor.close()
+
+
+def tick(context, only: str = None) -> dict:
+    """Одно срабатывание таймера: захватить наступившие задачи, выполнить параллельно, записать итоги"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    deadline = news_agent.run_deadline(context)
+    lease_seconds = max(MIN_LEASE_SECONDS, int(deadline - time.monotonic()) + news_agent.DEADLINE_MARGIN_SECONDS)
+
+    conn = db_pool.getconn(database_url)
+    jobs = claim(conn, schema, lease_seconds, only)
+    db_pool.putconn(conn)
+    if not jobs:
+        return {'claimed': 0, 'runs': []}
+
+    started = time.monotonic()
+    executor = ThreadPoolExecutor(max_workers=len(jobs))
+    futures = {executor.submit(run_job, job, context): job for job in jobs}
+    done, not_done = wait(futures, timeout=max(0, deadline - time.monotonic()))
+    executor.shutdown(wait=False)
+
+    runs = [future.result() for future in done]
+    # Не успевшие к дедлайну задачи записываются как timeout; их аренда истечёт сама
+    timed_out = [
+        {'job': futures[future]['name'], 'status': 'timeout', 'result': None, 'error': 'Deadline exceeded',
+         'duration_ms': round((time.monotonic() - started) * 1000)}
+        for future in not_done
+    ]
+
+    conn = db_pool.getconn(database_url)
+    finish(conn, schema, runs)
+    if timed_out:
+        finish(conn, schema, timed_out, release=False)
+    cleanup_history(conn, schema)
+    db_pool.putconn(conn)
+
+    for run in runs + timed_out:
+        print(f"[Scheduler] {run['job']}: {run['status']} in {run['duration_ms']}ms")
+    return {'claimed': len(jobs), 'runs': runs + timed_out}
+
+
+def cleanup_history(conn, schema: str):
+    """Удалить историю запусков старше HISTORY_DAYS"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        DELETE FROM {schema}.scheduled_job_runs
+        WHERE started_at < NOW() - make_interval(days => %s)
+    """, (HISTORY_DAYS,))
+    conn.commit()
+    cursor.close()
+
+
+def get_stats(conn, schema: str) -> dict:
+    """Реальные последний и следующий запуски по каждой задаче и недавняя история"""
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"""
+        SELECT name, job_type, cron, enabled, next_run_at, last_run_at, last_status, last_duration_ms,
+               COALESCE(locked_until >= NOW(), FALSE) AS running
+        FROM {schema}.scheduled_jobs
+        ORDER BY name
+    """)
+    jobs = cursor.fetchall()
+    cursor.execute(f"""
+        SELECT job_name, status, started_at, finished_at, duration_ms, error
+        FROM {schema}.scheduled_job_runs
+        ORDER BY started_at DESC
+        LIMIT %s
+    """, (RECENT_RUNS,))
+    recent = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+
+    last_runs = [job['last_run_at'] for job in jobs if job['last_run_at']]
+    next_runs = [job['next_run_at'] for job in jobs if job['enabled']]
+    return {
+        'last_run': max(last_runs) if last_runs else None,
+        'next_run': min(next_runs) if next_runs else None,
+        'jobs': jobs,
+        'recent_runs': recent
+    }
@@ -0,0 +1,474 @@
+"""
+Стадии новостного конвейера как библиотечный код: парсинг, обработка через ИИ, публикация
+
+Стадии — генераторы для pipeline.Pipeline: новые черновики уходят на переписывание, а готовые
+статьи на публикацию сразу, не дожидаясь конца предыдущей стадии. HTTP-обработчики ai-news-agent,
+news-scraper и scheduler — тонкие обёртки над этими функциями.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from psycopg2.extras import RealDictCursor, execute_values
+
+import ai_cache
+import db_pool
+import pipeline
+import sberanalytics
+import social_outbox
+
+# Сколько черновиков обрабатывать за один запуск
+DRAFT_BATCH_SIZE = int(os.environ.get('AI_DRAFT_BATCH_SIZE', '50'))
+# Сколько запросов к polza.ai выполнять одновременно (и размер пачки, передаваемой дальше по конвейеру)
+AI_MAX_IN_FLIGHT = int(os.environ.get('AI_MAX_IN_FLIGHT', '8'))
+# Сколько готовых новостей публиковать за один запуск
+PUBLISH_BATCH_SIZE = int(os.environ.get('AI_PUBLISH_BATCH_SIZE', '3'))
+# Запас времени до таймаута функции на запись результатов в БД
+DEADLINE_MARGIN_SECONDS = 5
+# Дедлайн, если среда не сообщает оставшееся время
+DEFAULT_RUN_SECONDS = 60
+
+AI_MODEL = 'openai/gpt-4o-mini'
+AI_TEMPERATURE = 0.7
+AI_SYSTEM_PROMPT = 'Ты - редактор новостного канала для бизнеса. Перепиши короткое описание продукта в интересную новость для Telegram-канала. Добавь эмодзи, сделай текст живым и привлекательным. Максимум 3-4 предложения.'
+
+WORKER_ID = social_outbox.WORKER_ID
+
+# Общая сессия с keep-alive к api.polza.ai, переживает тёплые вызовы
+_ai_session = requests.Session()
+_ai_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=AI_MAX_IN_FLIGHT))
+
+
+def run_deadline(context) -> float:
+    """Момент (time.monotonic), к которому нужно успеть закончить запуск"""
+    remaining = DEFAULT_RUN_SECONDS
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining = context.get_remaining_time_in_millis() / 1000
+    return time.monotonic() + remaining - DEADLINE_MARGIN_SECONDS
+
+
+def scrape_drafts(report: dict, database_url: str, schema: str, force: bool = False):
+    """Стадия парсинга: отдаёт черновики, вставленные в этом запуске
+
+    Ошибка источника не останавливает конвейер: дальше обрабатываются накопленные черновики.
+    """
+    conn = db_pool.getconn(database_url)
+    try:
+        result = sberanalytics.scrape(conn, schema, force=force)
+    except Exception as e:
+        report['error'] = str(e)
+        return
+    finally:
+        db_pool.putconn(conn)
+
+    report.update({
+        'skipped_unchanged': result['skipped_unchanged'],
+        'scraped': len(result['products']),
+        'saved': len(result['drafts'])
+    })
+    yield from result['drafts']
+
+
+def lease_seconds(deadline: float) -> int:
+    """Аренда захваченных статей: до конца запуска с запасом, после чего их может забрать другой воркер"""
+    return max(60, int(deadline - time.monotonic()) + DEADLINE_MARGIN_SECONDS)
+
+
+def claim_articles(database_url: str, schema: str, status: str, claimed_status: str, limit: int,
+                   deadline: float, ids: list = None, exclude: list = None) -> list:
+    """Захватить до limit статей в статусе status, переведя их в claimed_status под аренду этого воркера
+
+    Параллельные воркеры пропускают чужие строки (SKIP LOCKED), а статьи с истёкшей арендой
+    (воркер упал посреди работы) забираются заново. ids — захватывать только эти статьи,
+    exclude — не брать эти (уже побывавшие в текущем запуске).
+    """
+    conn = db_pool.getconn(database_url)
+    cursor = conn.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"""
+        UPDATE {schema}.news_articles
+        SET status = %(claimed_status)s, claimed_by = %(worker)s,
+            claimed_until = NOW() + make_interval(secs => %(lease)s), updated_at = NOW()
+        WHERE id IN (
+            SELECT id FROM {schema}.news_articles
+            WHERE (status = %(status)s OR (status = %(claimed_status)s AND claimed_until < NOW()))
+              AND (%(ids)s::int[] IS NULL OR id = ANY(%(ids)s::int[]))
+              AND NOT (id = ANY(%(exclude)s::int[]))
+            ORDER BY created_at DESC
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, title, content, source_url, image_url
+    """, {
+        'status': status,
+        'claimed_status': claimed_status,
+        'worker': WORKER_ID,
+        'lease': lease_seconds(deadline),
+        'ids': ids,
+        'exclude': exclude or [],
+        'limit': limit
+    })
+    claimed = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+    db_pool.putconn(conn)
+    return claimed
+
+
+def release_articles(cursor, schema: str, ids: list, status: str):
+    """Вернуть незавершённые статьи в очередь со статусом status; коммит за вызывающим"""
+    if not ids:
+        return
+    cursor.execute(f"""
+        UPDATE {schema}.news_articles
+        SET status = %s, claimed_by = NULL, claimed_until = NULL
+        WHERE id = ANY(%s) AND claimed_by = %s
+    """, (status, ids, WORKER_ID))
+
+
+def process_drafts(drafts, report: dict, database_url: str, schema: str, api_key: str, deadline: float):
+    """Стадия обработки: захватывает черновики пачками по AI_MAX_IN_FLIGHT, переписывает и сразу отдаёт готовые
+
+    Сначала берутся черновики с предыдущей стадии, затем накопленные в БД, всего не больше
+    DRAFT_BATCH_SIZE. Черновики, захваченные другим воркером, пропускаются.
+    """
+    report.update({'processed': 0, 'total_drafts': 0, 'cache_hits': 0, 'deferred': 0})
+    if not api_key:
+        report['error'] = 'Missing credentials'
+        # Парсинг всё равно доводится до конца, новые черновики обработает следующий запуск
+        for _ in drafts:
+            pass
+        return
+
+    seen = []
+
+    def rewrite(ids=None) -> tuple:
+        """(сколько черновиков захвачено, готовые статьи)"""
+        limit = min(AI_MAX_IN_FLIGHT, DRAFT_BATCH_SIZE - report['total_drafts'])
+        if limit <= 0:
+            return 0, []
+        # Не переписанные в этом запуске черновики возвращаются в очередь и повторно не берутся
+        batch = claim_articles(database_url, schema, 'draft', 'processing', limit, deadline, ids, seen)
+        seen.extend(draft['id'] for draft in batch)
+        if not batch:
+            return 0, []
+        return len(batch), rewrite_drafts(batch, report, database_url, schema, api_key, deadline)
+
+    ids = []
+    for draft in drafts:
+        ids.append(draft['id'])
+        if len(ids) >= AI_MAX_IN_FLIGHT:
+            yield from rewrite(ids)[1]
+            ids = []
+    if ids:
+        yield from rewrite(ids)[1]
+
+    # Накопленные черновики: пачками, чтобы параллельные воркеры делили очередь
+    while time.monotonic() < deadline:
+        claimed, ready = rewrite()
+        if not claimed:
+            break
+        yield from ready
+
+
+def rewrite_drafts(drafts: list, report: dict, database_url: str, schema: str, api_key: str, deadline: float) -> list:
+    """Переписать пачку черновиков (с кэшем ответов LLM) и перевести их в ready; вернуть готовые статьи"""
+    conn = db_pool.getconn(database_url)
+
+    # Одинаковые промпты не отправляем в LLM повторно
+    keys = {
+        draft['id']: ai_cache.make_key(
+            AI_MODEL, AI_SYSTEM_PROMPT, draft['title'], draft['content'], draft['source_url'], AI_TEMPERATURE
+        )
+        for draft in drafts
+    }
+    cached = ai_cache.lookup(conn, schema, list(set(keys.values())))
+    conn.commit()
+    db_pool.putconn(conn)
+
+    # Дубликаты одного промпта (одна новость из разных источников) генерируем один раз
+    to_generate = {}
+    for draft in drafts:
+        if keys[draft['id']] not in cached:
+            to_generate.setdefault(keys[draft['id']], draft)
+
+    # Улучшаем контент через ИИ параллельно, не дольше дедлайна запуска
+    executor = ThreadPoolExecutor(max_workers=AI_MAX_IN_FLIGHT)
+    futures = {
+        executor.submit(
+            improve_content_with_ai,
+            draft['title'],
+            draft['content'],
+            draft['source_url'],
+            api_key,
+            deadline
+        ): key
+        for key, draft in to_generate.items()
+    }
+    done, not_done = wait(futures, timeout=max(0, deadline - time.monotonic()))
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    new_entries = []
+    for future in done:
+        improved = future.result()
+        if improved:
+            key = futures[future]
+            cached[key] = improved['content']
+            new_entries.append((key, AI_MODEL, improved['content'], improved['usage']))
+
+    now = datetime.now()
+    ready = [
+        {**draft, 'content': cached[keys[draft['id']]]}
+        for draft in drafts
+        if keys[draft['id']] in cached
+    ]
+
+    conn = db_pool.getconn(database_url)
+    cursor = conn.cursor()
+
+    if ready:
+        # Один UPDATE на всю пачку; статьи, чью аренду уже перехватил другой воркер, не трогаем
+        updated = execute_values(
+            cursor,
+            f"""
+                UPDATE {schema}.news_articles AS n
+                SET content = v.content, status = 'ready', updated_at = v.updated_at,
+                    claimed_by = NULL, claimed_until = NULL
+                FROM (VALUES %s) AS v(id, content, updated_at, worker)
+                WHERE n.id = v.id AND n.status = 'processing' AND n.claimed_by = v.worker
+                RETURNING n.id
+            """,
+            [(article['id'], article['content'], now, WORKER_ID) for article in ready],
+            fetch=True
+        )
+        owned = {row[0] for row in updated}
+        ready = [article for article in ready if article['id'] in owned]
+
+    # Не успевшие к дедлайну или не переписанные ИИ — обратно в черновики для других воркеров
+    ready_ids = {article['id'] for article in ready}
+    release_articles(cursor, schema, [draft['id'] for draft in drafts if draft['id'] not in ready_ids], 'draft')
+
+    ai_cache.store(conn, schema, new_entries)
+    ai_cache.record_run(conn, schema, hits=len(drafts) - len(to_generate), misses=len(to_generate))
+
+    conn.commit()
+    cursor.close()
+    db_pool.putconn(conn)
+
+    report['processed'] += len(ready)
+    report['total_drafts'] += len(drafts)
+    report['cache_hits'] += len(drafts) - len(to_generate)
+    report['deferred'] += len(not_done)
+    return ready
+
+
+def publish_articles(articles, report: dict, database_url: str, schema: str, deadline: float):
+    """Стадия публикации: каждая готовая статья захватывается, ставится в outbox и отправляется, как только пришла
+
+    Публикуется не больше PUBLISH_BATCH_SIZE статей; если свежих не хватило, захватываются
+    накопленные ready из БД. Остальные статьи остаются ready до следующего запуска.
+    """
+    report.update({'published_telegram': 0, 'published_vk': 0, 'queued': 0, 'pending_delivery': 0, 'total_ready': 0})
+    can_publish = 'telegram' in social_outbox.configured_channels()
+    if not can_publish:
+        report['error'] = 'Missing Telegram credentials'
+
+    for article in articles:
+        report['total_ready'] += 1
+        if not can_publish or report['queued'] >= PUBLISH_BATCH_SIZE:
+            continue
+        # Статью мог уже захватить параллельный запуск
+        claimed = claim_articles(database_url, schema, 'ready', 'publishing', 1, deadline, ids=[article['id']])
+        delivery = publish_article(claimed[0], report, database_url, schema, deadline) if claimed else None
+        if delivery is not None:
+            yield delivery
+
+    limit = PUBLISH_BATCH_SIZE - report['queued']
+    if can_publish and limit > 0:
+        backlog = claim_articles(database_url, schema, 'ready', 'publishing', limit, deadline)
+        report['total_ready'] += len(backlog)
+        for article in backlog:
+            delivery = publish_article(article, report, database_url, schema, deadline)
+            if delivery is not None:
+                yield delivery
+
+
+def publish_article(article: dict, report: dict, database_url: str, schema: str, deadline: float):
+    """Перевести захваченную статью в published и поставить посты в outbox одной транзакцией, затем сразу разобрать их
+
+    Неотправленное до дедлайна дошлёт воркер news-publish. None — аренду перехватил другой
+    воркер, и статья пропускается: одна статья не публикуется дважды.
+    """
+    conn = db_pool.getconn(database_url)
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {schema}.news_articles
+        SET status = 'published', published_at = %s, updated_at = %s, claimed_by = NULL, claimed_until = NULL
+        WHERE id = %s AND status = 'publishing' AND claimed_by = %s
+    """, (datetime.now(), datetime.now(), article['id'], WORKER_ID))
+    if cursor.rowcount == 0:
+        conn.rollback()
+        cursor.close()
+        db_pool.putconn(conn)
+        return None
+
+    social_outbox.enqueue(conn, schema, article['id'], {
+        'telegram': {
+            'text': telegram_message(article['title'], article['content'], article['source_url']),
+            'image_url': article['image_url']
+        },
+        'vk': {
+            'text': vk_message(article['title'], article['content'], article['source_url']),
+            'image_url': article['image_url']
+        }
+    })
+    conn.commit()
+    cursor.close()
+
+    delivery = social_outbox.drain(conn, schema, limit=2, deadline=deadline, article_ids=[article['id']])
+    db_pool.putconn(conn)
+
+    sent = [r for r in delivery['results'] if r['status'] == 'sent']
+    report['queued'] += 1
+    report['published_telegram'] += sum(1 for r in sent if r['platform'] == 'telegram')
+    report['published_vk'] += sum(1 for r in sent if r['platform'] == 'vk')
+    report['pending_delivery'] += len(delivery['results']) - len(sent) + delivery.get('unfinished', 0)
+    return {'id': article['id'], 'results': delivery['results']}
+
+
+def improve_content_with_ai(title, content, source_url, api_key, deadline=None):
+    """Улучшение контента через ChatGPT"""
+    timeout = 30
+    if deadline is not None:
+        timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            return None
+
+    try:
+        response = _ai_session.post(
+            'https://api.polza.ai/chat/completions',
+            headers={
+                'Authorization': f'Bearer {api_key}',
+                'Content-Type': 'application/json'
+            },
+            json={
+                'model': AI_MODEL,
+                'messages': [
+                    {
+                        'role': 'system',
+                        'content': AI_SYSTEM_PROMPT
+                    },
+                    {
+                        'role': 'user',
+                        'content': f"Заголовок: {title}\n\nОписание: {content}\n\nСсылка: {source_url}"
+                    }
+                ],
+                'temperature': AI_TEMPERATURE,
+                'max_tokens': 300
+            },
+            timeout=timeout
+        )
+
+        if response.status_code == 200:
+            data = response.json()
+            return {
+                'content': data['choices'][0]['message']['content'],
+                'usage': data.get('usage') or {}
+            }
+
+        return None
+
+    except Exception:
+        return None
+
+
+def telegram_message(title, content, source_url):
+    """Текст поста для Telegram-канала (HTML)"""
+    message = f"<b>{title}</b>\n\n{content}"
+
+    if source_url:
+        message += f"\n\n🔗 <a href='{source_url}'>Подробнее</a>"
+
+    return message
+
+
+def vk_message(title, content, source_url):
+    """Текст поста для VK-сообщества"""
+    message = f"{title}\n\n{content}"
+
+    if source_url:
+        message += f"\n\n🔗 Подробнее: {source_url}"
+
+    return message
+
+
+def process_draft_news(context=None):
+    """Обработка накопленных черновиков через ИИ (стадия process без парсинга)"""
+    database_url = os.environ.get('DATABASE_URL')
+    api_key = os.environ.get('POLZA_AI_API_KEY')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    if not database_url or not api_key:
+        return {'success': False, 'error': 'Missing credentials'}
+
+    deadline = run_deadline(context)
+    runner = pipeline.Pipeline().stage(
+        'process', lambda upstream, report: process_drafts(upstream, report, database_url, schema, api_key, deadline)
+    )
+    result = runner.run()
+    return {'success': runner.error is None, **result['process'], **({'error': runner.error} if runner.error else {})}
+
+
+def publish_news(context=None):
+    """Публикация готовых новостей в Telegram и VK (стадия publish без предыдущих)"""
+    database_url = os.environ.get('DATABASE_URL')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    if not database_url or 'telegram' not in social_outbox.configured_channels():
+        return {'success': False, 'error': 'Missing Telegram credentials'}
+
+    deadline = run_deadline(context)
+    runner = pipeline.Pipeline().stage(
+        'publish', lambda upstream, report: publish_articles(upstream, report, database_url, schema, deadline)
+    )
+    result = runner.run()
+    return {'success': runner.error is None, **result['publish'], **({'error': runner.error} if runner.error else {})}
+
+
+def auto_pipeline(context=None, force=False, on_progress=None):
+    """Полный цикл в одном процессе: парсинг → обработка → публикация, с замером каждой стадии
+
+    on_progress(stage, report) получает промежуточные отчёты стадий (для фоновых запусков).
+    """
+    database_url = os.environ.get('DATABASE_URL')
+    api_key = os.environ.get('POLZA_AI_API_KEY')
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+    if not database_url:
+        return {'success': False, 'error': 'DATABASE_URL not configured'}
+
+    started = time.monotonic()
+    deadline = run_deadline(context)
+    runner = (
+        pipeline.Pipeline(on_progress)
+        .stage('scrape', lambda upstream, report: scrape_drafts(report, database_url, schema, force))
+        .stage('process', lambda upstream, report: process_drafts(upstream, report, database_url, schema, api_key, deadline))
+        .stage('publish', lambda upstream, report: publish_articles(upstream, report, database_url, schema, deadline))
+    )
+    results = runner.run()
+    duration_ms = round((time.monotonic() - started) * 1000)
+    print('[Pipeline] ' + ', '.join(f"{name} {stage['items']} in {stage['duration_ms']}ms"
+                                      for name, stage in results.items() if name != 'error'))
+
+    return {
+        'success': runner.error is None,
+        'duration_ms': duration_ms,
+        'pipeline': results
+    }
+
+
+def run_pipeline_job(params: dict, context, on_progress) -> dict:
+    """Исполнитель фонового запуска вида auto_pipeline (см. background_jobs.execute)"""
+    return auto_pipeline(context, force=bool(params.get('force')), on_progress=on_progress)
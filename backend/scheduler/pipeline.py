@@ -0,0 +1,83 @@
+"""
+Потоковый конвейер в одном процессе: стадии — генераторы, каждая отдаёт элементы следующей по мере готовности
+"""
+import time
+
+
+class Pipeline:
+    """Цепочка стадий с замером времени и числа элементов на каждой
+
+    Стадия создаётся функцией make(upstream, report): upstream — итератор элементов предыдущей
+    стадии (пустой для первой), report — словарь, куда стадия пишет свои счётчики.
+    on_progress(stage, report) вызывается после каждого элемента и по завершении стадии;
+    stage — имя работающей стадии.
+    """
+
+    def __init__(self, on_progress=None):
+        self.stages = []
+        self.error = None
+        self.on_progress = on_progress
+
+    def stage(self, name: str, make):
+        upstream = self._timed(self.stages[-1]) if self.stages else iter(())
+        report = {}
+        self.stages.append({'name': name, 'report': report, 'items': 0, 'seconds': 0.0, 'iterator': None})
+        self.stages[-1]['iterator'] = make(upstream, report)
+        return self
+
+    def run(self) -> dict:
+        """Прогнать все элементы через цепочку и вернуть отчёт по стадиям"""
+        try:
+            for _ in self._timed(self.stages[-1]):
+                pass
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            print(f'[Pipeline] failed: {self.error}')
+        return self.report()
+
+    def report(self) -> dict:
+        """Время стадии — её собственное: из замера вычитается ожидание элементов от предыдущей"""
+        result = {}
+        upstream_seconds = 0.0
+        for stage in self.stages:
+            own_seconds = max(0.0, stage['seconds'] - upstream_seconds)
+            upstream_seconds = stage['seconds']
+            result[stage['name']] = {
+                'success': 'error' not in stage['report'],
+                **stage['report'],
+                'items': stage['items'],
+                'duration_ms': round(own_seconds * 1000)
+            }
+        if self.error:
+            result['error'] = self.error
+        return result
+
+    def _timed(self, stage: dict):
+        iterator = stage['iterator']
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                stage['seconds'] += time.monotonic() - started
+                # Стадия исчерпана: дальше работает только следующая за ней (None — конвейер завершён)
+                position = self.stages.index(stage)
+                following = self.stages[position + 1]['name'] if position + 1 < len(self.stages) else None
+                self._progress(following)
+                return
+            except Exception:
+                stage['seconds'] += time.monotonic() - started
+                raise
+            stage['seconds'] += time.monotonic() - started
+            stage['items'] += 1
+            self._progress(stage['name'])
+            yield item
+
+    def _progress(self, stage_name):
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(stage_name, self.report())
+        except Exception as e:
+            # Сбой записи прогресса не должен останавливать сам конвейер
+            print(f'[Pipeline] progress callback failed: {e}')
@@ -0,0 +1,117 @@
+"""
+Парсинг продуктов sberanalytics.ru в черновики новостей: общий код news-scraper и конвейера ai-news-agent
+"""
+from datetime import datetime
+
+import fetch_state
+import html_parser
+from psycopg2.extras import execute_values
+
+SOURCE_URL = 'https://sberanalytics.ru/products'
+SITE_URL = 'https://sberanalytics.ru'
+# Метка строк парсера: уникальность заголовка проверяется только среди них
+ORIGIN = 'sberanalytics'
+
+
+def parse_products(markup: str) -> list:
+    """Карточки продуктов со страницы в виде словарей title/description/link/image_url"""
+    doc = html_parser.parse(markup)
+
+    products = []
+    for card in doc.select('li.section-card-product__list'):
+        # Заголовок
+        title_elem = card.select_one('h2')
+        if not title_elem:
+            continue
+        title = title_elem.text()
+
+        # Описание
+        desc_elem = card.select_one('p')
+        description = desc_elem.text() if desc_elem else ''
+
+        # Ссылка
+        link_elem = card.select_one('a[href]')
+        link = link_elem.attr('href') if link_elem else ''
+        if link and not link.startswith('http'):
+            link = f"{SITE_URL}{link}"
+
+        # Изображение
+        img_elem = card.select_one('img.section-card-product__img-product')
+        image_url = ''
+        if img_elem and img_elem.attr('src'):
+            image_url = img_elem.attr('src')
+            if image_url and not image_url.startswith('http'):
+                image_url = f"{SITE_URL}{image_url}"
+
+        products.append({
+            'title': title,
+            'description': description,
+            'link': link,
+            'image_url': image_url
+        })
+
+    return products
+
+
+def save_products(conn, schema: str, products: list) -> list:
+    """Сохранить продукты черновиками одним запросом, вернуть только новые строки; коммит за вызывающим"""
+    if not products:
+        return []
+
+    now = datetime.now()
+    rows = []
+    for product in products:
+        # description и content — обязательные поля
+        content = product['description'] or 'Новый продукт'
+        description = product['description'][:200] if product['description'] else 'Описание отсутствует'
+        rows.append((
+            product['title'],
+            description,
+            content,
+            product['link'],
+            product['image_url'],
+            'draft',
+            ORIGIN,
+            now,
+            now
+        ))
+
+    cursor = conn.cursor()
+
+    # Дубликаты отсекает частичный уникальный индекс по нормализованному заголовку строк парсера
+    inserted = execute_values(
+        cursor,
+        f"""
+            INSERT INTO {schema}.news_articles
+            (title, description, content, source_url, image_url, status, origin, created_at, updated_at)
+            VALUES %s
+            ON CONFLICT (title_hash) WHERE origin = 'sberanalytics' DO NOTHING
+            RETURNING id, title, content, source_url, image_url
+        """,
+        rows,
+        page_size=len(rows),
+        fetch=True
+    )
+    cursor.close()
+
+    columns = ('id', 'title', 'content', 'source_url', 'image_url')
+    return [dict(zip(columns, row)) for row in inserted]
+
+
+def scrape(conn, schema: str, force: bool = False) -> dict:
+    """Загрузить страницу (если она изменилась), сохранить новые продукты и запомнить версию страницы
+
+    В ответе drafts — вставленные черновики, их можно сразу передавать на обработку.
+    """
+    fetched = fetch_state.fetch_if_changed(conn, schema, SOURCE_URL, force=force)
+    if fetched is None:
+        return {'skipped_unchanged': True, 'products': [], 'drafts': []}
+
+    response, body_hash = fetched
+    products = parse_products(response.text)
+    drafts = save_products(conn, schema, products)
+    conn.commit()
+
+    fetch_state.remember(conn, schema, SOURCE_URL, response, body_hash)
+
+    return {'skipped_unchanged': False, 'products': products, 'drafts': drafts}
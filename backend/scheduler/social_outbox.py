@@ -0,0 +1,440 @@
+"""
+Транзакционный outbox публикаций в Telegram и ВКонтакте: постановка в очередь вместе со сменой статуса и разбор очереди воркером
+"""
+import json
+import os
+import random
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional
+
+import requests
+from psycopg2.extras import execute_values
+
+import rate_limiter
+import vk_media_cache
+
+# Попыток отправки до перевода сообщения в failed
+MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '6'))
+# Задержка перед повтором: BASE * 2^(попытка-1), не больше BACKOFF_MAX_SECONDS
+BACKOFF_BASE_SECONDS = int(os.environ.get('OUTBOX_BACKOFF_BASE_SECONDS', '30'))
+BACKOFF_MAX_SECONDS = 3600
+# Сколько отправок выполняется одновременно
+MAX_IN_FLIGHT = int(os.environ.get('OUTBOX_MAX_IN_FLIGHT', '4'))
+# Время аренды захваченного сообщения; по истечении его заберёт другой воркер
+LEASE_SECONDS = 120
+# Худшее время одной отправки (VK: загрузка фото и пост, до 10 с на запрос); должно быть меньше аренды.
+# Отправка начинается, только если до дедлайна drain остаётся не меньше этого
+SEND_MAX_SECONDS = int(os.environ.get('OUTBOX_SEND_MAX_SECONDS', '60'))
+
+VK_API_VERSION = '5.131'
+VK_TOO_MANY_REQUESTS = 6
+VK_RETRY_AFTER_SECONDS = 2.0
+# Коды VK, которыми отклоняется само вложение: 15 — нет доступа, 200 — нет доступа к альбому,
+# 100 — неверный параметр (для вложения в тексте ошибки есть attachments/photo)
+VK_ACCESS_DENIED = (15, 200)
+VK_INVALID_PARAM = 100
+
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+class PublishError(Exception):
+    """Ошибка отправки; retryable=False — повтор бессмысленен, retry_after — площадка просит подождать,
+    code — код ошибки API площадки (None для сетевых ошибок)"""
+
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None,
+                 code: Optional[int] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self.code = code
+
+
+def configured_channels() -> dict:
+    """Площадки, для которых заданы ключи: {platform: channel}"""
+    channels = {}
+    if os.environ.get('TELEGRAM_BOT_TOKEN') and os.environ.get('TELEGRAM_CHANNEL_ID'):
+        channels['telegram'] = os.environ['TELEGRAM_CHANNEL_ID']
+    if os.environ.get('VK_ACCESS_TOKEN') and os.environ.get('VK_GROUP_ID'):
+        channels['vk'] = os.environ['VK_GROUP_ID']
+    return channels
+
+
+def enqueue(conn, schema: str, article_id: int, messages: dict) -> dict:
+    """Поставить сообщения {platform: payload} в очередь в текущей транзакции соединения
+
+    Коммит делает вызывающий вместе со сменой статуса статьи. Уже отправленное сообщение
+    повторно не ставится; упавшее окончательно — ставится заново с нуля.
+    Возвращает {platform: id в outbox} для поставленных сообщений.
+    """
+    channels = configured_channels()
+    rows = [
+        (article_id, platform, channels[platform], json.dumps(payload, ensure_ascii=False))
+        for platform, payload in messages.items()
+        if platform in channels
+    ]
+    if not rows:
+        return {}
+
+    cursor = conn.cursor()
+    queued = execute_values(cursor, f"""
+        INSERT INTO {schema}.social_outbox (article_id, platform, channel, payload)
+        VALUES %s
+        ON CONFLICT (article_id, platform, channel) DO UPDATE
+        SET payload = EXCLUDED.payload, status = 'pending', attempts = 0,
+            next_attempt_at = NOW(), last_error = NULL
+        WHERE {schema}.social_outbox.status = 'failed'
+        RETURNING platform, id
+    """, rows, fetch=True)
+    cursor.close()
+    return dict(queued)
+
+
+def claim(conn, schema: str, limit: int, article_ids: Optional[list] = None) -> list:
+    """Захватить готовые к отправке сообщения; параллельные воркеры пропускают чужие строки"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        UPDATE {schema}.social_outbox
+        SET status = 'sending', attempts = attempts + 1,
+            locked_by = %s, locked_until = NOW() + make_interval(secs => %s)
+        WHERE id IN (
+            SELECT id FROM {schema}.social_outbox
+            WHERE ((status = 'pending' AND next_attempt_at <= NOW())
+                   OR (status = 'sending' AND locked_until < NOW()))
+              AND (%s::int[] IS NULL OR article_id = ANY(%s::int[]))
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, article_id, platform, channel, payload, attempts
+    """, (WORKER_ID, LEASE_SECONDS, article_ids, article_ids, limit))
+    claimed = [
+        dict(zip(('id', 'article_id', 'platform', 'channel', 'payload', 'attempts'), row))
+        for row in cursor.fetchall()
+    ]
+    for message in claimed:
+        if isinstance(message['payload'], str):
+            message['payload'] = json.loads(message['payload'])
+    conn.commit()
+    cursor.close()
+    return claimed
+
+
+def backoff_seconds(attempts: int) -> int:
+    """Экспоненциальная задержка с джиттером, чтобы повторы не шли пачкой"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return int(delay * random.uniform(0.5, 1.0))
+
+
+def mark_sent(cursor, schema: str, message_id: int, external_id: str):
+    cursor.execute(f"""
+        UPDATE {schema}.social_outbox
+        SET status = 'sent', external_id = %s, sent_at = NOW(), last_error = NULL,
+            locked_by = NULL, locked_until = NULL
+        WHERE id = %s AND locked_by = %s
+    """, (external_id, message_id, WORKER_ID))
+
+
+def mark_failed(cursor, schema: str, message: dict, error: PublishError) -> str:
+    """Повтор с задержкой или окончательный failed; возвращает новый статус"""
+    final = not error.retryable or message['attempts'] >= MAX_ATTEMPTS
+    status = 'failed' if final else 'pending'
+    cursor.execute(f"""
+        UPDATE {schema}.social_outbox
+        SET status = %s, last_error = %s,
+            next_attempt_at = NOW() + make_interval(secs => %s),
+            locked_by = NULL, locked_until = NULL
+        WHERE id = %s AND locked_by = %s
+    """, (status, str(error)[:1000], 0 if final else backoff_seconds(message['attempts']),
+          message['id'], WORKER_ID))
+    return status
+
+
+def defer(cursor, schema: str, message_ids: list, seconds: list):
+    """Вернуть сообщения в очередь на указанное время без траты попытки"""
+    for message_id, delay in zip(message_ids, seconds):
+        cursor.execute(f"""
+            UPDATE {schema}.social_outbox
+            SET status = 'pending', attempts = attempts - 1,
+                next_attempt_at = NOW() + make_interval(secs => %s),
+                locked_by = NULL, locked_until = NULL
+            WHERE id = %s AND locked_by = %s
+        """, (delay, message_id, WORKER_ID))
+
+
+def take_tokens(conn, schema: str, messages: list) -> tuple:
+    """Разделить сообщения на отправляемые сейчас и отложенные по лимитам площадок
+
+    Отложенным назначается момент появления их токена, чтобы они не захватывались впустую.
+    """
+    buckets = {}
+    for message in messages:
+        buckets.setdefault((message['platform'], message['channel']), []).append(message)
+
+    ready, deferred = [], []
+    for (platform, channel), items in buckets.items():
+        granted, wait_seconds, interval = rate_limiter.acquire(conn, schema, platform, channel, len(items))
+        ready.extend(items[:granted])
+        deferred.extend(
+            (message, wait_seconds + i * interval)
+            for i, message in enumerate(items[granted:])
+        )
+    return ready, deferred
+
+
+def send(message: dict) -> str:
+    """Отправка одного сообщения, возвращает id поста на площадке"""
+    payload = message['payload']
+    if message['platform'] == 'telegram':
+        return send_telegram(message['channel'], payload)
+    if message['platform'] == 'vk':
+        return send_vk(message['channel'], payload, message)
+    raise PublishError(f"Unknown platform {message['platform']}", retryable=False)
+
+
+def timed_send(message: dict, start_by: Optional[float] = None) -> tuple:
+    """(id поста, ошибка, длительность в мс); длительность None — отправка не начиналась, не успевая до дедлайна"""
+    started = time.monotonic()
+    if start_by is not None and started >= start_by:
+        return None, None, None
+    try:
+        external_id, error = send(message), None
+    except PublishError as e:
+        external_id, error = None, e
+    except Exception as e:
+        external_id, error = None, PublishError(str(e))
+    return external_id, error, int((time.monotonic() - started) * 1000)
+
+
+def drain(conn, schema: str, limit: int = 20, deadline: Optional[float] = None,
+          article_ids: Optional[list] = None) -> dict:
+    """Разобрать очередь: захват, параллельная отправка, запись результатов
+
+    deadline — момент time.monotonic(), к которому drain должен вернуться. Отправки, которые не успели
+    начаться за SEND_MAX_SECONDS до него, сразу возвращаются в очередь. Начатые всегда дожидаются и
+    записываются: брошенная отправка могла уже дойти до площадки, и повтор после истечения аренды
+    опубликовал бы пост дважды.
+    """
+    claimed = claim(conn, schema, limit, article_ids)
+    summary = {'claimed': len(claimed), 'sent': 0, 'retry': 0, 'failed': 0, 'deferred': 0, 'results': []}
+    if not claimed:
+        return summary
+
+    messages, deferred = take_tokens(conn, schema, claimed)
+    if deferred:
+        cursor = conn.cursor()
+        defer(cursor, schema, [m['id'] for m, _ in deferred], [delay for _, delay in deferred])
+        conn.commit()
+        cursor.close()
+        summary['deferred'] += len(deferred)
+    if not messages:
+        return summary
+
+    # Картинки, уже загруженные во ВКонтакте, берутся из кэша без четырёх запросов загрузки
+    vk_messages = [m for m in messages if m['platform'] == 'vk' and m['payload'].get('image_url')]
+    attachments = vk_media_cache.lookup(conn, schema, [(m['channel'], m['payload']['image_url']) for m in vk_messages])
+    for message in vk_messages:
+        message['cached_attachment'] = attachments.get((message['channel'], message['payload']['image_url']))
+
+    executor = ThreadPoolExecutor(max_workers=min(MAX_IN_FLIGHT, len(messages)))
+    start_by = deadline - SEND_MAX_SECONDS if deadline is not None else None
+    futures = {executor.submit(timed_send, message, start_by): message for message in messages}
+    wait(futures)
+    executor.shutdown()
+
+    cursor = conn.cursor()
+    not_started = []
+    for future in futures:
+        message = futures[future]
+        external_id, error, duration_ms = future.result()
+        if duration_ms is None:
+            not_started.append(message['id'])
+            continue
+        result = {
+            'id': message['id'],
+            'article_id': message['article_id'],
+            'platform': message['platform'],
+            'duration_ms': duration_ms
+        }
+        # Из кэша убирается только вложение, которое VK отклонил; сетевые и прочие ошибки его не трогают
+        if message.get('attachment_rejected'):
+            vk_media_cache.evict(cursor, schema, message['channel'], message['payload']['image_url'])
+        if message.get('uploaded_attachment'):
+            vk_media_cache.store(cursor, schema, [message['uploaded_attachment']])
+
+        if error is None:
+            mark_sent(cursor, schema, message['id'], external_id)
+            summary['sent'] += 1
+            result.update({'status': 'sent', 'external_id': external_id})
+        elif error.retry_after is not None:
+            # Превышен лимит площадки: корзина канала блокируется для всех воркеров, сообщение ждёт
+            rate_limiter.block(conn, schema, message['platform'], message['channel'], error.retry_after)
+            defer(cursor, schema, [message['id']], [error.retry_after])
+            summary['deferred'] += 1
+            result.update({'status': 'deferred', 'retry_after': error.retry_after})
+            print(f"[Outbox] {message['platform']} rate limited, retry after {error.retry_after}s")
+        else:
+            status = mark_failed(cursor, schema, message, error)
+            summary['retry' if status == 'pending' else 'failed'] += 1
+            result.update({'status': status, 'error': str(error)})
+            print(f"[Outbox] {message['platform']} #{message['article_id']} attempt {message['attempts']}: {error}")
+        summary['results'].append(result)
+
+    # Не начатые до дедлайна отправки сразу возвращаются в очередь, не дожидаясь конца аренды
+    if not_started:
+        cursor.execute(f"""
+            UPDATE {schema}.social_outbox
+            SET status = 'pending', attempts = attempts - 1, locked_by = NULL, locked_until = NULL
+            WHERE id = ANY(%s) AND locked_by = %s
+        """, (not_started, WORKER_ID))
+    conn.commit()
+    cursor.close()
+
+    summary['unfinished'] = len(not_started)
+    return summary
+
+
+def send_telegram(channel_id: str, payload: dict) -> str:
+    """sendPhoto с подписью, если есть картинка, иначе sendMessage"""
+    api_url = f"https://api.telegram.org/bot{os.environ['TELEGRAM_BOT_TOKEN']}"
+    if payload.get('image_url'):
+        response = requests.post(f'{api_url}/sendPhoto', json={
+            'chat_id': channel_id,
+            'photo': payload['image_url'],
+            'caption': payload['text'],
+            'parse_mode': 'HTML'
+        }, timeout=10)
+    else:
+        response = requests.post(f'{api_url}/sendMessage', json={
+            'chat_id': channel_id,
+            'text': payload['text'],
+            'parse_mode': 'HTML',
+            'disable_web_page_preview': False
+        }, timeout=10)
+
+    try:
+        result = response.json()
+    except ValueError:
+        raise PublishError(f'Telegram HTTP {response.status_code}')
+    if not result.get('ok'):
+        description = f"Telegram: {result.get('description', 'Unknown error')}"
+        if response.status_code == 429:
+            retry_after = (result.get('parameters') or {}).get('retry_after', BACKOFF_BASE_SECONDS)
+            raise PublishError(description, retry_after=float(retry_after))
+        # 400/403 — ошибка в сообщении или правах бота, повтор не поможет
+        raise PublishError(description, retryable=response.status_code >= 500)
+    return str(result['result']['message_id'])
+
+
+def vk_owner_id(group_id: str) -> int:
+    """Числовой owner_id сообщества (префиксы club/public/event убираются)"""
+    clean_id = group_id.replace('club', '').replace('public', '').replace('event', '').rstrip('.')
+    try:
+        return -int(clean_id)
+    except ValueError:
+        raise PublishError(f'Invalid VK group_id: {group_id}', retryable=False)
+
+
+def vk_call(method: str, params: dict) -> dict:
+    response = requests.post(
+        f'https://api.vk.com/method/{method}',
+        data={**params, 'access_token': os.environ['VK_ACCESS_TOKEN'], 'v': VK_API_VERSION},
+        timeout=10
+    )
+    result = response.json()
+    if 'error' in result:
+        error = result['error']
+        message = f"VK {method}: {error.get('error_msg', 'Unknown error')}"
+        # 6 — слишком много запросов в секунду
+        if error.get('error_code') == VK_TOO_MANY_REQUESTS:
+            raise PublishError(message, retry_after=VK_RETRY_AFTER_SECONDS, code=VK_TOO_MANY_REQUESTS)
+        raise PublishError(message, code=error.get('error_code'))
+    return result['response']
+
+
+def download_image(image_url: str) -> bytes:
+    response = requests.get(image_url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+
+def upload_vk_photo(group_id: str, image_url: str) -> str:
+    """Загрузка картинки на стену сообщества, возвращает вложение photo{owner}_{id}"""
+    # Картинка скачивается параллельно с получением адреса upload-сервера (или берётся из кэша)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        image_future = executor.submit(download_image, image_url)
+        fetch_upload_url = lambda: vk_call('photos.getWallUploadServer', {'group_id': group_id})['upload_url']
+        upload_url = vk_media_cache.get_upload_server(group_id, fetch_upload_url)
+        image_data = image_future.result()
+
+    upload_data = {}
+    for _ in range(2):
+        try:
+            upload_data = requests.post(
+                upload_url,
+                files={'photo': ('image.jpg', image_data, 'image/jpeg')},
+                timeout=10
+            ).json()
+        except (requests.RequestException, ValueError):
+            upload_data = {}
+        if upload_data.get('photo') and upload_data['photo'] != '[]':
+            break
+        # Адрес из кэша мог устареть — одна повторная попытка со свежим
+        vk_media_cache.forget_upload_server(group_id)
+        upload_url = vk_media_cache.get_upload_server(group_id, fetch_upload_url)
+    else:
+        raise PublishError('VK photo upload failed')
+
+    photo = vk_call('photos.saveWallPhoto', {
+        'group_id': group_id,
+        'photo': upload_data.get('photo'),
+        'server': upload_data.get('server'),
+        'hash': upload_data.get('hash')
+    })[0]
+    return f"photo{photo['owner_id']}_{photo['id']}"
+
+
+def send_vk(group_id: str, payload: dict, message: Optional[dict] = None) -> str:
+    """wall.post от имени сообщества; без картинки, если её не удалось загрузить
+
+    message['cached_attachment'] — ранее загруженное фото; новое загруженное
+    возвращается в message['uploaded_attachment'] для сохранения в кэш.
+    """
+    message = message if message is not None else {}
+    owner_id = vk_owner_id(group_id)
+    params = {'owner_id': owner_id, 'from_group': 1, 'message': payload['text']}
+    image_url = payload.get('image_url')
+
+    if image_url and message.get('cached_attachment'):
+        params['attachments'] = message['cached_attachment']
+    elif image_url:
+        try:
+            params['attachments'] = upload_vk_photo(str(-owner_id), image_url)
+            message['uploaded_attachment'] = (group_id, image_url, params['attachments'])
+        except Exception as e:
+            print(f'[Outbox] VK photo upload error: {e}')
+
+    try:
+        return str(vk_call('wall.post', params)['post_id'])
+    except PublishError as e:
+        if not (message.get('cached_attachment') and vk_rejects_attachment(e)):
+            raise
+    # Фото из кэша удалено или недоступно: кэш сбросит drain, пост уходит со свежезагруженным фото
+    message['attachment_rejected'] = True
+    params.pop('attachments', None)
+    try:
+        params['attachments'] = upload_vk_photo(str(-owner_id), image_url)
+        message['uploaded_attachment'] = (group_id, image_url, params['attachments'])
+    except Exception as e:
+        print(f'[Outbox] VK photo upload error: {e}')
+    return str(vk_call('wall.post', params)['post_id'])
+
+
+def vk_rejects_attachment(error: PublishError) -> bool:
+    """Ошибка относится к самому вложению, а не к сети, лимитам или тексту поста"""
+    if error.code in VK_ACCESS_DENIED:
+        return True
+    text = str(error).lower()
+    return error.code == VK_INVALID_PARAM and ('attachment' in text or 'photo' in text)
@@ -0,0 +1,71 @@
+"""
+Кэш загрузок фото во ВКонтакте: image_url → вложение photo{owner}_{id} в Postgres, адрес upload-сервера — в памяти
+"""
+import os
+import threading
+import time
+from typing import Callable
+
+from psycopg2.extras import execute_values
+
+# Сколько секунд тёплый контейнер переиспользует адрес из photos.getWallUploadServer
+UPLOAD_SERVER_TTL = int(os.environ.get('VK_UPLOAD_SERVER_TTL', '300'))
+
+_lock = threading.Lock()
+_upload_servers = {}
+
+
+def get_upload_server(group_id: str, fetch: Callable[[], str]) -> str:
+    """Адрес upload-сервера сообщества из кэша или через fetch()"""
+    now = time.monotonic()
+    with _lock:
+        cached = _upload_servers.get(group_id)
+        if cached and cached[1] > now:
+            return cached[0]
+    upload_url = fetch()
+    with _lock:
+        _upload_servers[group_id] = (upload_url, now + UPLOAD_SERVER_TTL)
+    return upload_url
+
+
+def forget_upload_server(group_id: str):
+    """Сбросить адрес после неудачной загрузки: он мог устареть"""
+    with _lock:
+        _upload_servers.pop(group_id, None)
+
+
+def lookup(conn, schema: str, keys: list) -> dict:
+    """Сохранённые вложения для пар (group_id, image_url): {(group_id, image_url): attachment}"""
+    if not keys:
+        return {}
+    cursor = conn.cursor()
+    found = execute_values(cursor, f"""
+        UPDATE {schema}.vk_photo_attachments a
+        SET use_count = a.use_count + 1, last_used_at = NOW()
+        FROM (VALUES %s) AS k(group_id, image_url)
+        WHERE a.group_id = k.group_id AND a.image_url_hash = md5(k.image_url)
+        RETURNING a.group_id, a.image_url, a.attachment
+    """, list(set(keys)), fetch=True)
+    conn.commit()
+    cursor.close()
+    return {(group_id, image_url): attachment for group_id, image_url, attachment in found}
+
+
+def store(cursor, schema: str, rows: list):
+    """Запомнить загруженные вложения [(group_id, image_url, attachment)]"""
+    if not rows:
+        return
+    execute_values(cursor, f"""
+        INSERT INTO {schema}.vk_photo_attachments (group_id, image_url, attachment)
+        VALUES %s
+        ON CONFLICT (group_id, image_url_hash) DO UPDATE
+        SET attachment = EXCLUDED.attachment, last_used_at = NOW()
+    """, rows)
+
+
+def evict(cursor, schema: str, group_id: str, image_url: str):
+    """Удалить вложение, с которым пост не прошёл (фото могли удалить из альбома)"""
+    cursor.execute(f"""
+        DELETE FROM {schema}.vk_photo_attachments
+        WHERE group_id = %s AND image_url_hash = md5(%s)
+    """, (group_id, image_url))
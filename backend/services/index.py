@@ -1,6 +1,7 @@
 import json
 import os
-import psycopg2
+import db_pool
+import response_cache
 from psycopg2.extras import RealDictCursor
 
 def handler(event: dict, context) -> dict:
@@ -20,8 +21,17 @@ def handler(event: dict, context) -> dict:
             'body': ''
         }
     
+    if method == 'GET':
+        cached = response_cache.get(response_cache.make_key(event))
+        if cached:
+            etag, body = cached
+            return response_cache.build_response(event, etag, body, {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            })
+    
     try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        conn = db_pool.getconn(os.environ['DATABASE_URL'])
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
@@ -48,16 +58,15 @@ def handler(event: dict, context) -> dict:
                 })
             
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(result, ensure_ascii=False)
-            }
+            body = json.dumps(result, ensure_ascii=False)
+            etag = response_cache.put(response_cache.make_key(event), body)
+            
+            return response_cache.build_response(event, etag, body, {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*'
+            })
         
         elif method == 'POST':
             body = json.loads(event.get('body', '{}'))
@@ -87,8 +96,9 @@ def handler(event: dict, context) -> dict:
             
             new_service = cur.fetchone()
             conn.commit()
+            response_cache.invalidate()
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             
             return {
                 'statusCode': 201,
@@ -141,7 +151,7 @@ def handler(event: dict, context) -> dict:
             
             if not updated_service:
                 cur.close()
-                conn.close()
+                db_pool.putconn(conn)
                 return {
                     'statusCode': 404,
                     'headers': {
@@ -152,8 +162,9 @@ def handler(event: dict, context) -> dict:
                 }
             
             conn.commit()
+            response_cache.invalidate()
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             
             return {
                 'statusCode': 200,
@@ -198,7 +209,7 @@ def handler(event: dict, context) -> dict:
             
             if not deleted:
                 cur.close()
-                conn.close()
+                db_pool.putconn(conn)
                 return {
                     'statusCode': 404,
                     'headers': {
@@ -209,8 +220,9 @@ def handler(event: dict, context) -> dict:
                 }
             
             conn.commit()
+            response_cache.invalidate()
             cur.close()
-            conn.close()
+            db_pool.putconn(conn)
             
             return {
                 'statusCode': 200,
@@ -1,6 +1,6 @@
 import json
 import os
-import psycopg2
+import db_pool
 from psycopg2.extras import RealDictCursor
 import hashlib
 
@@ -25,7 +25,7 @@ def handler(event: dict, context) -> dict:
         }
     
     try:
-        conn = psycopg2.connect(DSN)
+        conn = db_pool.getconn(DSN)
         cur = conn.cursor(cursor_factory=RealDictCursor)
         
         if method == 'GET':
@@ -210,4 +210,4 @@ def handler(event: dict, context) -> dict:
         if 'cur' in locals():
             cur.close()
         if 'conn' in locals():
-            conn.close()
+            db_pool.putconn(conn)
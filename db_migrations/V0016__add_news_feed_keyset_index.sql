@@ -0,0 +1,5 @@
+-- Составной индекс для keyset-пагинации ленты опубликованных новостей (news-list ?after=)
+-- Порядок колонок совпадает с ORDER BY published_date DESC NULLS LAST, created_at DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_news_articles_published_feed
+ON t_p81470733_business_helper_app.news_articles(published_date DESC NULLS LAST, created_at DESC, id DESC)
+WHERE status = 'published';
@@ -0,0 +1,21 @@
+-- Кэш ответов LLM для ИИ-агента: ключ — SHA-256 от (модель, системный промпт, заголовок, текст, ссылка, temperature)
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.ai_completion_cache (
+    prompt_hash CHAR(64) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    completion TEXT NOT NULL,
+    prompt_tokens INTEGER DEFAULT 0,
+    completion_tokens INTEGER DEFAULT 0,
+    hit_count INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_hit_at TIMESTAMP
+);
+
+-- Индекс для удаления устаревших ответов по TTL
+CREATE INDEX IF NOT EXISTS idx_ai_completion_cache_created_at
+ON t_p81470733_business_helper_app.ai_completion_cache(created_at);
+
+-- Накопительные счётчики попаданий/промахов кэша
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.ai_cache_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0
+);
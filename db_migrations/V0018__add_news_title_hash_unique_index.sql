@@ -0,0 +1,39 @@
+-- Нормализованный хэш заголовка для дедупликации новостей при массовой вставке парсером
+ALTER TABLE t_p81470733_business_helper_app.news_articles
+ADD COLUMN IF NOT EXISTS title_hash CHAR(32)
+GENERATED ALWAYS AS (md5(lower(btrim(title)))) STORED;
+
+-- Откуда строку вставил парсер; NULL — ручные, импортированные и прочие новости
+ALTER TABLE t_p81470733_business_helper_app.news_articles
+ADD COLUMN IF NOT EXISTS origin VARCHAR(50);
+
+-- Уже сохранённые парсером продукты sberanalytics.ru: по одной строке на заголовок (опубликованная, иначе самая ранняя),
+-- чтобы парсер не вставил их заново. Остальные дубли не трогаем — данные не удаляются.
+-- Строки парсера узнаём по ссылке на карточку из /products и по тому, как он заполнял поля:
+-- content = описание (или 'Новый продукт'), description = первые 200 символов (или 'Описание отсутствует').
+-- news-import тоже пишет ссылки sberanalytics.ru, но со страницы /news и без content — его строки не попадают
+UPDATE t_p81470733_business_helper_app.news_articles
+SET origin = 'sberanalytics'
+WHERE id IN (
+    SELECT id FROM (
+        SELECT
+            id,
+            ROW_NUMBER() OVER (
+                PARTITION BY title_hash
+                ORDER BY (status = 'published') DESC, id
+            ) AS rn
+        FROM t_p81470733_business_helper_app.news_articles
+        WHERE source_url LIKE 'https://sberanalytics.ru/products/%'
+          AND (
+              description = left(content, 200)
+              OR (content = 'Новый продукт' AND description = 'Описание отсутствует')
+          )
+    ) ranked
+    WHERE rn = 1
+);
+
+-- Уникальность только среди строк парсера: для INSERT ... ON CONFLICT (title_hash) WHERE origin = 'sberanalytics' DO NOTHING.
+-- Другие писатели (news-import, news-manage, ai-news-agent) вставляют origin = NULL и в индекс не попадают
+CREATE UNIQUE INDEX IF NOT EXISTS idx_news_articles_title_hash
+ON t_p81470733_business_helper_app.news_articles(title_hash)
+WHERE origin = 'sberanalytics';
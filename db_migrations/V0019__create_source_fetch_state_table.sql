@@ -0,0 +1,9 @@
+-- Состояние загрузки страниц-источников для условных запросов парсеров (ETag / Last-Modified / хэш тела)
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.source_fetch_state (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash CHAR(64),
+    last_checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
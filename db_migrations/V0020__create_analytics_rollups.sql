@@ -0,0 +1,126 @@
+-- Агрегаты по журналу user_actions для отчётов аналитики
+
+-- Просмотры услуг по дням
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.service_views_daily (
+    service_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (service_id, day)
+);
+
+-- Просмотры партнёрских предложений по дням
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.offer_views_daily (
+    partner_offer_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (partner_offer_id, day)
+);
+
+-- Действия клиентов по типам и дням
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.user_actions_daily (
+    user_id INTEGER NOT NULL,
+    action_type VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    actions INTEGER NOT NULL DEFAULT 0,
+    last_action_at TIMESTAMP,
+    PRIMARY KEY (user_id, action_type, day)
+);
+
+-- Какие услуги/предложения смотрел клиент (уникальные пары клиент-объект)
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.user_item_views (
+    user_id INTEGER NOT NULL,
+    item_type VARCHAR(20) NOT NULL,
+    item_id INTEGER NOT NULL,
+    views INTEGER NOT NULL DEFAULT 0,
+    last_viewed_at TIMESTAMP,
+    PRIMARY KEY (user_id, item_type, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_item_views_item
+ON t_p81470733_business_helper_app.user_item_views(item_type, item_id);
+
+-- Последнее событие user_actions, уже учтённое в агрегатах
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.analytics_rollup_state (
+    name VARCHAR(50) PRIMARY KEY,
+    last_action_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO t_p81470733_business_helper_app.analytics_rollup_state (name, last_action_id)
+VALUES ('user_actions', 0)
+ON CONFLICT (name) DO NOTHING;
+
+-- Перенос уже накопленной истории: отчёты читают только агрегаты и без этого после деплоя пусты.
+-- Границы те же, что у rollups.compact: события старше минуты с id выше учтённого; повторный запуск ничего не удвоит
+DO $$
+DECLARE
+    low_id BIGINT;
+    high_id BIGINT;
+BEGIN
+    SELECT last_action_id INTO low_id
+    FROM t_p81470733_business_helper_app.analytics_rollup_state
+    WHERE name = 'user_actions'
+    FOR UPDATE;
+
+    SELECT COALESCE(MAX(id), low_id) INTO high_id
+    FROM t_p81470733_business_helper_app.user_actions
+    WHERE id > low_id AND (created_at IS NULL OR created_at < NOW() - INTERVAL '60 seconds');
+
+    IF high_id <= low_id THEN
+        RETURN;
+    END IF;
+
+    -- События без created_at получат текущее время при переходе на партиции (V0021), здесь — так же
+    CREATE TEMP TABLE rollup_backfill ON COMMIT DROP AS
+    SELECT user_id, action_type, service_id, partner_offer_id, COALESCE(created_at, CURRENT_TIMESTAMP) AS created_at
+    FROM t_p81470733_business_helper_app.user_actions
+    WHERE id > low_id AND id <= high_id;
+
+    INSERT INTO t_p81470733_business_helper_app.service_views_daily (service_id, day, views)
+    SELECT service_id, created_at::date, COUNT(*)
+    FROM rollup_backfill
+    WHERE action_type = 'view_service' AND service_id IS NOT NULL
+    GROUP BY service_id, created_at::date
+    ON CONFLICT (service_id, day) DO UPDATE
+    SET views = t_p81470733_business_helper_app.service_views_daily.views + EXCLUDED.views;
+
+    INSERT INTO t_p81470733_business_helper_app.offer_views_daily (partner_offer_id, day, views)
+    SELECT partner_offer_id, created_at::date, COUNT(*)
+    FROM rollup_backfill
+    WHERE action_type = 'view_offer' AND partner_offer_id IS NOT NULL
+    GROUP BY partner_offer_id, created_at::date
+    ON CONFLICT (partner_offer_id, day) DO UPDATE
+    SET views = t_p81470733_business_helper_app.offer_views_daily.views + EXCLUDED.views;
+
+    INSERT INTO t_p81470733_business_helper_app.user_actions_daily (user_id, action_type, day, actions, last_action_at)
+    SELECT user_id, action_type, created_at::date, COUNT(*), MAX(created_at)
+    FROM rollup_backfill
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id, action_type, created_at::date
+    ON CONFLICT (user_id, action_type, day) DO UPDATE
+    SET actions = t_p81470733_business_helper_app.user_actions_daily.actions + EXCLUDED.actions,
+        last_action_at = GREATEST(t_p81470733_business_helper_app.user_actions_daily.last_action_at, EXCLUDED.last_action_at);
+
+    INSERT INTO t_p81470733_business_helper_app.user_item_views (user_id, item_type, item_id, views, last_viewed_at)
+    SELECT user_id, item_type, item_id, COUNT(*), MAX(created_at)
+    FROM (
+        SELECT user_id, 'service' AS item_type, service_id AS item_id, created_at
+        FROM rollup_backfill
+        WHERE user_id IS NOT NULL AND action_type = 'view_service' AND service_id IS NOT NULL
+        UNION ALL
+        SELECT user_id, 'offer', partner_offer_id, created_at
+        FROM rollup_backfill
+        WHERE user_id IS NOT NULL AND action_type = 'view_offer' AND partner_offer_id IS NOT NULL
+    ) views
+    GROUP BY user_id, item_type, item_id
+    ON CONFLICT (user_id, item_type, item_id) DO UPDATE
+    SET views = t_p81470733_business_helper_app.user_item_views.views + EXCLUDED.views,
+        last_viewed_at = GREATEST(t_p81470733_business_helper_app.user_item_views.last_viewed_at, EXCLUDED.last_viewed_at);
+
+    UPDATE t_p81470733_business_helper_app.analytics_rollup_state
+    SET last_action_id = high_id, updated_at = NOW()
+    WHERE name = 'user_actions';
+
+    DROP TABLE rollup_backfill;
+END;
+$$;
@@ -0,0 +1,92 @@
+-- Перевод журнала user_actions на помесячные партиции по created_at
+
+-- Создание партиций на месяцы вперёд (вызывается миграцией и периодическим обслуживанием аналитики)
+CREATE OR REPLACE FUNCTION t_p81470733_business_helper_app.ensure_user_actions_partitions(
+    from_month DATE,
+    months_ahead INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'user_actions_' || to_char(month_start, 'YYYYMM');
+        IF to_regclass('t_p81470733_business_helper_app.' || partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE t_p81470733_business_helper_app.%I PARTITION OF t_p81470733_business_helper_app.user_actions FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start,
+                (month_start + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        month_start := (month_start + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    id_sequence TEXT;
+    first_month DATE;
+BEGIN
+    -- Повторный запуск: таблица уже партиционирована
+    IF EXISTS (
+        SELECT 1 FROM pg_partitioned_table
+        WHERE partrelid = to_regclass('t_p81470733_business_helper_app.user_actions')
+    ) THEN
+        RETURN;
+    END IF;
+
+    id_sequence := pg_get_serial_sequence('t_p81470733_business_helper_app.user_actions', 'id');
+
+    ALTER TABLE t_p81470733_business_helper_app.user_actions RENAME TO user_actions_legacy;
+
+    -- Та же структура и значения по умолчанию (включая nextval для id), ключ партиционирования входит в PK
+    CREATE TABLE t_p81470733_business_helper_app.user_actions (
+        LIKE t_p81470733_business_helper_app.user_actions_legacy INCLUDING DEFAULTS
+    ) PARTITION BY RANGE (created_at);
+
+    ALTER TABLE t_p81470733_business_helper_app.user_actions ALTER COLUMN created_at SET NOT NULL;
+    ALTER TABLE t_p81470733_business_helper_app.user_actions
+    ADD CONSTRAINT user_actions_partitioned_pkey PRIMARY KEY (id, created_at);
+
+    -- Последовательность id переходит к новой таблице, чтобы пережить удаление legacy
+    IF id_sequence IS NOT NULL THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY t_p81470733_business_helper_app.user_actions.id', id_sequence);
+    END IF;
+
+    -- Ключ партиционирования не может быть пустым
+    UPDATE t_p81470733_business_helper_app.user_actions_legacy
+    SET created_at = CURRENT_TIMESTAMP
+    WHERE created_at IS NULL;
+
+    SELECT COALESCE(date_trunc('month', MIN(created_at))::date, date_trunc('month', CURRENT_DATE)::date)
+    INTO first_month
+    FROM t_p81470733_business_helper_app.user_actions_legacy;
+
+    PERFORM t_p81470733_business_helper_app.ensure_user_actions_partitions(first_month, 3);
+
+    -- Страховка: события вне созданных месяцев не теряются, пока обслуживание не создаст партицию
+    CREATE TABLE t_p81470733_business_helper_app.user_actions_default
+    PARTITION OF t_p81470733_business_helper_app.user_actions DEFAULT;
+
+    -- Старая таблица остаётся как user_actions_legacy до ручной проверки переноса
+    INSERT INTO t_p81470733_business_helper_app.user_actions
+    SELECT * FROM t_p81470733_business_helper_app.user_actions_legacy;
+END;
+$$;
+
+-- Индексы создаются на родительской таблице и наследуются всеми партициями
+CREATE INDEX IF NOT EXISTS idx_user_actions_user_created
+ON t_p81470733_business_helper_app.user_actions(user_id, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_user_actions_created
+ON t_p81470733_business_helper_app.user_actions(created_at DESC);
+
+-- Время последнего свёрнутого события, чтобы хвост читался только из свежих партиций
+ALTER TABLE t_p81470733_business_helper_app.analytics_rollup_state
+ADD COLUMN IF NOT EXISTS last_action_at TIMESTAMP;
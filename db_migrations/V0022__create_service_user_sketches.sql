@@ -0,0 +1,11 @@
+-- HyperLogLog-скетчи уникальных пользователей, просматривавших услугу, по дням
+-- Формат скетча задаётся backend/analytics/hll.py; скетчи за разные дни объединяются поэлементным максимумом
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.service_user_sketches_daily (
+    service_id INTEGER NOT NULL,
+    day DATE NOT NULL,
+    sketch BYTEA NOT NULL,
+    PRIMARY KEY (service_id, day)
+);
+
+CREATE INDEX IF NOT EXISTS idx_service_user_sketches_day
+ON t_p81470733_business_helper_app.service_user_sketches_daily(day);
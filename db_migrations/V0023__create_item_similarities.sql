@@ -0,0 +1,11 @@
+-- Предрассчитанные похожие элементы (услуги и партнёрские предложения) по совместным просмотрам
+-- Таблица целиком пересчитывается пакетной задачей аналитики (action=recommendations)
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.item_similarities (
+    item_type VARCHAR(20) NOT NULL,
+    item_id INTEGER NOT NULL,
+    similar_type VARCHAR(20) NOT NULL,
+    similar_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    co_users INTEGER NOT NULL,
+    PRIMARY KEY (item_type, item_id, similar_type, similar_id)
+);
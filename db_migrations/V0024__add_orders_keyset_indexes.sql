@@ -0,0 +1,7 @@
+-- Индексы для ключевой пагинации и выгрузки заявок по (created_at DESC, id DESC)
+CREATE INDEX IF NOT EXISTS idx_orders_created_id
+ON t_p81470733_business_helper_app.orders(created_at DESC, id DESC);
+
+-- Фильтр по статусу с тем же порядком сортировки, без отдельной сортировки результата
+CREATE INDEX IF NOT EXISTS idx_orders_status_created_id
+ON t_p81470733_business_helper_app.orders(status, created_at DESC, id DESC);
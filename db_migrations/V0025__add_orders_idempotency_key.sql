@@ -0,0 +1,10 @@
+-- Ключ идемпотентности заявки: повторная отправка с тем же ключом возвращает исходную заявку
+ALTER TABLE t_p81470733_business_helper_app.orders
+ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(255),
+ADD COLUMN IF NOT EXISTS idempotency_request_hash CHAR(64),
+ADD COLUMN IF NOT EXISTS idempotency_expires_at TIMESTAMP;
+
+-- Уникальность только среди заявок с ключом; заявки без ключа не ограничиваются
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency_key
+ON t_p81470733_business_helper_app.orders(idempotency_key)
+WHERE idempotency_key IS NOT NULL;
@@ -0,0 +1,31 @@
+-- Очередь публикаций в соцсети (transactional outbox)
+-- Строка пишется в той же транзакции, что и смена статуса статьи; отправляет воркер news-publish (action=drain)
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.social_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    article_id INTEGER NOT NULL,
+    platform VARCHAR(20) NOT NULL,
+    channel VARCHAR(100) NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100),
+    locked_until TIMESTAMP,
+    external_id VARCHAR(100),
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP,
+    UNIQUE (article_id, platform, channel)
+);
+
+COMMENT ON COLUMN t_p81470733_business_helper_app.social_outbox.status IS 'Статус: pending, sending, sent, failed';
+COMMENT ON COLUMN t_p81470733_business_helper_app.social_outbox.external_id IS 'message_id в Telegram или post_id во ВКонтакте';
+
+-- Выборка готовых к отправке и зависших после падения воркера
+CREATE INDEX IF NOT EXISTS idx_social_outbox_pending
+ON t_p81470733_business_helper_app.social_outbox(next_attempt_at)
+WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS idx_social_outbox_sending
+ON t_p81470733_business_helper_app.social_outbox(locked_until)
+WHERE status = 'sending';
@@ -0,0 +1,11 @@
+-- Состояние token bucket для вызовов API Telegram и ВКонтакте, общее для всех экземпляров функций
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.rate_limit_buckets (
+    platform VARCHAR(20) NOT NULL,
+    channel VARCHAR(100) NOT NULL,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    blocked_until TIMESTAMP,
+    PRIMARY KEY (platform, channel)
+);
+
+COMMENT ON COLUMN t_p81470733_business_helper_app.rate_limit_buckets.blocked_until IS 'До этого момента отправка запрещена (retry_after из ответа 429)';
@@ -0,0 +1,13 @@
+-- Уже загруженные во ВКонтакте картинки: повторная публикация той же image_url обходится без загрузки
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.vk_photo_attachments (
+    group_id VARCHAR(100) NOT NULL,
+    image_url TEXT NOT NULL,
+    image_url_hash CHAR(32) GENERATED ALWAYS AS (md5(image_url)) STORED,
+    attachment VARCHAR(100) NOT NULL,
+    use_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, image_url_hash)
+);
+
+COMMENT ON COLUMN t_p81470733_business_helper_app.vk_photo_attachments.attachment IS 'Вложение для wall.post: photo{owner_id}_{id}';
@@ -0,0 +1,51 @@
+-- Расписание задач планировщика: один внешний таймер вызывает tick, tick запускает наступившие задачи
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.scheduled_jobs (
+    name VARCHAR(100) PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    cron VARCHAR(100) NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}',
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,
+    next_run_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(100),
+    locked_until TIMESTAMP,
+    last_run_at TIMESTAMP,
+    last_status VARCHAR(20),
+    last_duration_ms INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN t_p81470733_business_helper_app.scheduled_jobs.cron IS 'Cron-выражение из пяти полей (минута час день месяц день_недели) или @hourly/@daily/@weekly/@monthly';
+COMMENT ON COLUMN t_p81470733_business_helper_app.scheduled_jobs.locked_until IS 'Аренда выполняющейся задачи; по истечении задачу может взять другой экземпляр';
+COMMENT ON COLUMN t_p81470733_business_helper_app.scheduled_jobs.last_status IS 'Итог последнего запуска: success, failed, timeout';
+
+-- Выборка наступивших задач на каждом tick
+CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_due
+ON t_p81470733_business_helper_app.scheduled_jobs(next_run_at)
+WHERE enabled;
+
+-- История запусков: длительность и результат каждого выполнения
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.scheduled_job_runs (
+    id BIGSERIAL PRIMARY KEY,
+    job_name VARCHAR(100) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INTEGER NOT NULL,
+    worker VARCHAR(100),
+    result JSONB,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_job_runs_job
+ON t_p81470733_business_helper_app.scheduled_job_runs(job_name, started_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_scheduled_job_runs_started
+ON t_p81470733_business_helper_app.scheduled_job_runs(started_at);
+
+-- Задачи, которые раньше запускались вручную через POST планировщика
+INSERT INTO t_p81470733_business_helper_app.scheduled_jobs (name, job_type, cron)
+VALUES
+    ('news_pipeline', 'news_pipeline', '0 * * * *'),
+    ('social_outbox_drain', 'outbox_drain', '*/5 * * * *')
+ON CONFLICT (name) DO NOTHING;
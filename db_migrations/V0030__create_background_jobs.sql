@@ -0,0 +1,37 @@
+-- Фоновые запуски долгих задач (fire-and-poll): POST сразу отвечает 202 с id, статус и прогресс читаются через GET
+CREATE TABLE IF NOT EXISTS t_p81470733_business_helper_app.background_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    kind VARCHAR(50) NOT NULL,
+    params JSONB NOT NULL DEFAULT '{}',
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    stage VARCHAR(50),
+    progress JSONB NOT NULL DEFAULT '{}',
+    result JSONB,
+    error TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    locked_by VARCHAR(100),
+    locked_until TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+COMMENT ON COLUMN t_p81470733_business_helper_app.background_jobs.status IS 'Статус: queued, running, succeeded, failed';
+COMMENT ON COLUMN t_p81470733_business_helper_app.background_jobs.progress IS 'Отчёты стадий конвейера по мере выполнения';
+COMMENT ON COLUMN t_p81470733_business_helper_app.background_jobs.version IS 'Растёт при каждом изменении; long-poll ждёт версию новее известной клиенту';
+
+-- Выборка ожидающих и брошенных (истекла аренда) запусков
+CREATE INDEX IF NOT EXISTS idx_background_jobs_queued
+ON t_p81470733_business_helper_app.background_jobs(created_at)
+WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_background_jobs_running
+ON t_p81470733_business_helper_app.background_jobs(locked_until)
+WHERE status = 'running';
+
+-- Страховка: запуск, который не подхватил вызов-исполнитель, заберёт планировщик
+INSERT INTO t_p81470733_business_helper_app.scheduled_jobs (name, job_type, cron)
+VALUES ('background_jobs', 'background_jobs', '* * * * *')
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,14 @@
+-- Захват статей воркерами конвейера: draft → processing → ready → publishing → published
+-- Пока аренда (claimed_until) не истекла, статью не возьмёт другой воркер; истёкшую забирают заново
+ALTER TABLE t_p81470733_business_helper_app.news_articles
+ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(100);
+
+ALTER TABLE t_p81470733_business_helper_app.news_articles
+ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
+
+COMMENT ON COLUMN t_p81470733_business_helper_app.news_articles.claimed_by IS 'Воркер, захвативший статью на обработку или публикацию';
+
+-- Очереди захвата: ожидающие и брошенные статьи в порядке ORDER BY created_at DESC
+CREATE INDEX IF NOT EXISTS idx_news_articles_claim_queue
+ON t_p81470733_business_helper_app.news_articles(status, created_at DESC)
+WHERE status IN ('draft', 'processing', 'ready', 'publishing');
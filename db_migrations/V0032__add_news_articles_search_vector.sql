@@ -0,0 +1,12 @@
+-- Полнотекстовый поиск по новостям (?q= в news-list и news-manage) с русской морфологией
+-- Вес: заголовок важнее описания, описание важнее текста
+ALTER TABLE t_p81470733_business_helper_app.news_articles
+ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+GENERATED ALWAYS AS (
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+    setweight(to_tsvector('russian', coalesce(content, '')), 'C')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_news_articles_search
+ON t_p81470733_business_helper_app.news_articles USING GIN (search_vector);
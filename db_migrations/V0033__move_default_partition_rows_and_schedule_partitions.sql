@@ -0,0 +1,65 @@
+-- Создание партиций на месяцы вперёд с переносом строк из user_actions_default.
+-- Если событие месяца уже попало в default-партицию, PostgreSQL не даёт создать партицию этого месяца:
+-- default отсоединяется, партиция создаётся, строки месяца переносятся, default подключается обратно
+CREATE OR REPLACE FUNCTION t_p81470733_business_helper_app.ensure_user_actions_partitions(
+    from_month DATE,
+    months_ahead INTEGER
+) RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE := date_trunc('month', from_month)::date;
+    month_end DATE;
+    last_month DATE := (date_trunc('month', CURRENT_DATE) + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    has_stray_rows BOOLEAN;
+    created INTEGER := 0;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        partition_name := 'user_actions_' || to_char(month_start, 'YYYYMM');
+        month_end := (month_start + INTERVAL '1 month')::date;
+        IF to_regclass('t_p81470733_business_helper_app.' || partition_name) IS NULL THEN
+            has_stray_rows := FALSE;
+            IF to_regclass('t_p81470733_business_helper_app.user_actions_default') IS NOT NULL THEN
+                EXECUTE 'SELECT EXISTS (
+                    SELECT 1 FROM t_p81470733_business_helper_app.user_actions_default
+                    WHERE created_at >= $1 AND created_at < $2
+                )' INTO has_stray_rows USING month_start, month_end;
+            END IF;
+
+            IF has_stray_rows THEN
+                ALTER TABLE t_p81470733_business_helper_app.user_actions
+                DETACH PARTITION t_p81470733_business_helper_app.user_actions_default;
+            END IF;
+
+            EXECUTE format(
+                'CREATE TABLE t_p81470733_business_helper_app.%I PARTITION OF t_p81470733_business_helper_app.user_actions FOR VALUES FROM (%L) TO (%L)',
+                partition_name,
+                month_start,
+                month_end
+            );
+
+            IF has_stray_rows THEN
+                EXECUTE format(
+                    'INSERT INTO t_p81470733_business_helper_app.%I SELECT * FROM t_p81470733_business_helper_app.user_actions_default WHERE created_at >= %L AND created_at < %L',
+                    partition_name,
+                    month_start,
+                    month_end
+                );
+                DELETE FROM t_p81470733_business_helper_app.user_actions_default
+                WHERE created_at >= month_start AND created_at < month_end;
+
+                ALTER TABLE t_p81470733_business_helper_app.user_actions
+                ATTACH PARTITION t_p81470733_business_helper_app.user_actions_default DEFAULT;
+            END IF;
+
+            created := created + 1;
+        END IF;
+        month_start := month_end;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Партиции на месяцы вперёд создаются по расписанию, а не только ручным POST {"action": "partitions"}
+INSERT INTO t_p81470733_business_helper_app.scheduled_jobs (name, job_type, cron)
+VALUES ('analytics_partitions', 'analytics_partitions', '15 3 * * *')
+ON CONFLICT (name) DO NOTHING;
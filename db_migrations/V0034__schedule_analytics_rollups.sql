@@ -0,0 +1,8 @@
+-- Свёртка аналитики по расписанию: отчёты читают агрегаты, без регулярной свёртки они отстают от user_actions.
+-- next_run_at по умолчанию — сейчас, поэтому analytics_sketches на первом tick заполнит скетчи по уже свёрнутой истории
+INSERT INTO t_p81470733_business_helper_app.scheduled_jobs (name, job_type, cron)
+VALUES
+    ('analytics_rollup', 'analytics_rollup', '*/5 * * * *'),
+    ('analytics_sketches', 'analytics_sketches', '30 3 * * 0'),
+    ('analytics_recommendations', 'analytics_recommendations', '0 4 * * *')
+ON CONFLICT (name) DO NOTHING;
@@ -0,0 +1,118 @@
+"""
+Бенчмарк движков разбора HTML для парсеров news-scraper и news-import.
+
+В scripts/fixtures лежат снимки страниц-источников той же структуры, что разбирают парсеры
+(карточки, шапка, подвал, стили и JSON-данные страницы), поэтому бенчмарк работает без сети.
+
+Заменить фикстуры свежими страницами-источниками:
+    python scripts/benchmark-html-parsers.py --save
+
+Сравнить движки на сохранённых фикстурах:
+    python scripts/benchmark-html-parsers.py [--runs 20]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, 'scripts', 'fixtures')
+
+sys.path.insert(0, os.path.join(ROOT, 'backend', 'news-scraper'))
+import html_parser  # noqa: E402
+
+PAGES = {
+    'products': {
+        'url': 'https://sberanalytics.ru/products',
+        'fixture': 'sberanalytics-products.html',
+        'cards': 'li.section-card-product__list',
+        'fields': ['h2', 'p', 'a[href]', 'img.section-card-product__img-product']
+    },
+    'news': {
+        'url': 'https://sberanalytics.ru/news',
+        'fixture': 'sberanalytics-news.html',
+        'cards': 'article',
+        'fields': ['h2', 'h3', 'p', 'img', 'a[href]', 'time', '.date']
+    }
+}
+
+
+def save_fixtures():
+    import requests
+
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for name, page in PAGES.items():
+        response = requests.get(page['url'], timeout=10)
+        response.raise_for_status()
+        path = os.path.join(FIXTURES_DIR, page['fixture'])
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f'{name}: saved {len(response.text)} chars to {path}')
+
+
+def extract(markup: str, page: dict, backend: str) -> int:
+    """Тот же объём работы, что и в парсерах: разбор страницы и выборка полей карточек"""
+    doc = html_parser.parse(markup, backend)
+    cards = doc.select(page['cards'])
+    for card in cards:
+        for css in page['fields']:
+            node = card.select_one(css)
+            if node is not None:
+                node.text()
+                node.attr('href')
+                node.attr('src')
+    return len(cards)
+
+
+def measure(markup: str, page: dict, backend: str, runs: int) -> dict:
+    extract(markup, page, backend)
+
+    started = time.perf_counter()
+    for _ in range(runs):
+        cards = extract(markup, page, backend)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / runs
+
+    tracemalloc.start()
+    extract(markup, page, backend)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'cards': cards, 'ms': elapsed_ms, 'peak_kb': peak / 1024, 'retained_kb': current / 1024}
+
+
+def run_benchmark(runs: int):
+    backends = [b for b in html_parser.BACKENDS if html_parser.is_available(b)]
+    missing = [b for b in html_parser.BACKENDS if b not in backends]
+    if missing:
+        print(f'not installed, skipped: {", ".join(missing)}')
+
+    for name, page in PAGES.items():
+        path = os.path.join(FIXTURES_DIR, page['fixture'])
+        if not os.path.exists(path):
+            print(f'{name}: fixture {path} not found, run with --save first')
+            continue
+
+        with open(path, encoding='utf-8') as f:
+            markup = f.read()
+
+        print(f'\n{name} ({len(markup)} chars, {runs} runs)')
+        print(f'{"backend":<12} {"cards":>6} {"ms/parse":>10} {"peak KB":>10} {"retained KB":>12}')
+        for backend in backends:
+            result = measure(markup, page, backend, runs)
+            print(
+                f'{backend:<12} {result["cards"]:>6} {result["ms"]:>10.2f} '
+                f'{result["peak_kb"]:>10.0f} {result["retained_kb"]:>12.0f}'
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', action='store_true', help='download the source pages into scripts/fixtures')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    if args.save:
+        save_fixtures()
+    else:
+        run_benchmark(args.runs)
@@ -1,4 +1,4 @@
-import { useState } from 'react';
+import { useRef, useState } from 'react';
 import { Dialog, DialogContent, DialogDescription, DialogHeader, DialogTitle } from '@/components/ui/dialog';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -23,25 +23,36 @@ const ServiceOrderDialog = ({ open, onOpenChange, serviceName, servicePrice }: S
   const [loading, setLoading] = useState(false);
   const [success, setSuccess] = useState(false);
   const [error, setError] = useState('');
+  // Повторная отправка той же заявки (двойной клик, повтор после сбоя сети) идёт с тем же ключом
+  const pendingOrder = useRef<{ payload: string; key: string } | null>(null);
 
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     setLoading(true);
     setError('');
 
+    const payload = JSON.stringify({
+      service: serviceName,
+      price: servicePrice,
+      ...formData
+    });
+    if (pendingOrder.current?.payload !== payload) {
+      pendingOrder.current = { payload, key: crypto.randomUUID() };
+    }
+
     try {
       const response = await fetch('https://functions.poehali.dev/e7ab9bac-69a3-4640-9e54-e1a6e1636f06', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          service: serviceName,
-          price: servicePrice,
-          ...formData
-        })
+        headers: {
+          'Content-Type': 'application/json',
+          'Idempotency-Key': pendingOrder.current.key
+        },
+        body: payload
       });
 
       if (!response.ok) throw new Error('Ошибка отправки заявки');
 
+      pendingOrder.current = null;
       setSuccess(true);
       setTimeout(() => {
         setSuccess(false);
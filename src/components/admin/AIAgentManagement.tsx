@@ -142,17 +142,49 @@ export default function AIAgentManagement() {
     }
   };
 
+  const waitForJob = async (jobId: string) => {
+    let version: number | undefined;
+    let stage: string | null = null;
+    for (;;) {
+      const params = new URLSearchParams({ job_id: jobId, wait: '20' });
+      if (version !== undefined) {
+        params.set('version', String(version));
+      }
+      const response = await fetch(`${AI_AGENT_URL}?${params}`);
+      const job = await response.json();
+      if (!response.ok) {
+        throw new Error(job.error || `HTTP ${response.status}`);
+      }
+      if (job.status === 'succeeded' || job.status === 'failed') {
+        return job;
+      }
+      if (job.stage && job.stage !== stage) {
+        addLog(`⏳ Стадия: ${job.stage}`);
+      }
+      stage = job.stage;
+      version = job.version;
+    }
+  };
+
   const runAutoPipeline = async () => {
     setLoading(true);
     addLog('⚡ Запуск полного автоматического цикла...');
     
     try {
+      // Фоновый запуск: функция сразу отвечает 202, результат ждём long-poll запросами
       const response = await fetch(AI_AGENT_URL, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ action: 'auto' })
+        body: JSON.stringify({ action: 'auto', async: true })
       });
-      const result = await response.json();
+      const started = await response.json();
+      if (!started.job_id) {
+        throw new Error(started.error || `HTTP ${response.status}`);
+      }
+      addLog(`🕒 Задача ${started.job_id} поставлена в очередь`);
+      
+      const job = await waitForJob(started.job_id);
+      const result = job.result || { success: false, error: job.error };
       
       if (result.success) {
         const { pipeline } = result;
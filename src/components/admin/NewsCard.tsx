@@ -6,7 +6,7 @@ interface NewsItem {
   id: number;
   title: string;
   description: string;
-  content: string;
+  content?: string;
   badge?: string;
   source_url: string;
   image_url: string;
@@ -16,7 +16,7 @@ interface NewsItem {
   id: number;
   title: string;
   description: string;
-  content: string;
+  content?: string;
   badge?: string;
   source_url: string;
   image_url: string;
@@ -79,7 +79,7 @@ export default function NewsEditDialog({
               <Label htmlFor="content">Полный текст</Label>
               <Textarea
                 id="content"
-                value={selectedNews.content}
+                value={selectedNews.content || ''}
                 onChange={(e) => onNewsChange({ ...selectedNews, content: e.target.value })}
                 placeholder="Полный текст новости"
                 rows={6}
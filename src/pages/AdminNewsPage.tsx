@@ -13,7 +13,7 @@ interface NewsItem {
   id: number;
   title: string;
   description: string;
-  content: string;
+  content?: string;
   badge?: string;
   source_url: string;
   image_url: string;
@@ -87,15 +87,17 @@ export default function AdminNewsPage() {
       const data = await response.json();
       if (data.success) {
         const results = data.results || {};
-        const platforms = [];
+        const names: Record<string, string> = { telegram: 'Telegram', vk: 'ВКонтакте' };
+        const sent = Object.keys(names).filter((p) => results[p]?.status === 'sent').map((p) => names[p]);
+        const queued = Object.keys(names).filter((p) => results[p]?.queued && results[p]?.status !== 'sent').map((p) => names[p]);
         
-        if (results.telegram?.success) platforms.push('Telegram');
-        if (results.vk?.success) platforms.push('ВКонтакте');
-        
-        if (platforms.length > 0) {
-          alert(`✅ Новость опубликована в: ${platforms.join(', ')}`);
+        if (sent.length > 0 || queued.length > 0) {
+          const parts = [];
+          if (sent.length > 0) parts.push(`отправлено: ${sent.join(', ')}`);
+          if (queued.length > 0) parts.push(`в очереди: ${queued.join(', ')}`);
+          alert(`✅ Новость опубликована, посты ${parts.join('; ')}`);
         } else {
-          alert('⚠️ Не удалось опубликовать ни на одной платформе');
+          alert('✅ Новость опубликована (посты в соцсети уже были отправлены ранее)');
         }
         
         loadNews();
@@ -196,9 +198,22 @@ export default function AdminNewsPage() {
     setEditDialog(true);
   };
 
-  const handleEditNews = (item: NewsItem) => {
-    setSelectedNews(item);
-    setEditDialog(true);
+  const handleEditNews = async (item: NewsItem) => {
+    // В списке нет полного текста — для формы берём новость целиком
+    try {
+      const response = await fetch(`${MANAGE_API}?id=${item.id}`);
+      const data = await response.json();
+
+      if (data.success) {
+        setSelectedNews(data.article);
+        setEditDialog(true);
+      } else {
+        alert(`Ошибка: ${data.error || 'Не удалось загрузить новость'}`);
+      }
+    } catch (error) {
+      console.error('Error loading news:', error);
+      alert('Ошибка загрузки новости');
+    }
   };
 
   const filteredNews = news;